@@ -0,0 +1,40 @@
+'''This package fetches documents from other sites, such as the markdown of posts and the policy documents.
+
+The documents are stored by the refresh_external command, which requests them with :func:`~communication.documents.fetch_document`, see :mod:`communication.external`.
+A document which is already stored is requested with a conditional request (If-None-Match and If-Modified-Since), so a 304 response does not download it again.
+The timeout of each request is DOCUMENT_FETCH_TIMEOUT seconds (five by default).
+Requests are made with :func:`~lab_website.outbound.urlopen`, so a host which keeps failing is not contacted until its circuit breaker resets.
+'''
+
+import httplib
+import urllib2
+
+from django.conf import settings
+
+from lab_website import outbound
+
+def fetch_document(url, entry=None):
+    '''Requests a document, returning a dictionary of its content, etag and last_modified, or None if it could not be fetched.
+
+    If a stored entry (a dictionary of the same keys) is given the request is conditional, and a 304 response returns that entry.
+    '''
+    request = urllib2.Request(url)
+    if entry is not None:
+        if entry['etag']:
+            request.add_header('If-None-Match', entry['etag'])
+        if entry['last_modified']:
+            request.add_header('If-Modified-Since', entry['last_modified'])
+    try:
+        response = outbound.urlopen(request, timeout=getattr(settings, 'DOCUMENT_FETCH_TIMEOUT', 5))
+        content = response.read()
+    except urllib2.HTTPError, e:
+        if e.code == 304 and entry is not None:
+            return entry
+        return None
+    except (IOError, ValueError, httplib.HTTPException):
+        return None
+    return {
+        'content': content,
+        'etag': response.info().getheader('ETag'),
+        'last_modified': response.info().getheader('Last-Modified'),
+        }
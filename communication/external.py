@@ -0,0 +1,199 @@
+'''This package keeps a local copy of the content which the site shows from other sites, so that no page waits for them.
+
+The sources are the Twitter timeline, the Facebook posts, links, photos and page data, the Wikipedia edits, the lab rules, the publication and data sharing policies and the markdown of each :class:`~communication.models.Post`.
+They are fetched by a worker, run from cron (every minute or so) or kept running with --loop::
+
+    python manage.py refresh_external [--loop] [--force] [--source <name>]
+
+Each source is refreshed once it was last requested more than its interval ago.
+The intervals in seconds are set for each source in the EXTERNAL_REFRESH_INTERVALS setting, or are taken from SOURCE_INTERVALS, and the markdown of all posts shares the post interval.
+The due sources are requested concurrently (EXTERNAL_REFRESH_THREADS at a time, 8 by default) and stored as :class:`~communication.models.ExternalContent`.
+Documents are requested with the validators of the stored copy, so an unchanged document is not downloaded again.
+A source which fails, or does not answer within EXTERNAL_REFRESH_DEADLINE seconds (a minute by default), keeps its previous content and is tried again at its next interval.
+Sources which are not configured, such as Twitter without an access token, are skipped.
+
+The views read the stored content with :func:`~communication.external.read`, and show their fallback text for sources which have not been fetched yet.
+'''
+
+import json
+import logging
+import urllib
+import urllib2
+
+import tweepy
+from django.conf import settings
+from django.utils import timezone
+
+from communication.documents import fetch_document
+from communication.models import ExternalContent, Post
+from communication.utilities import fetch_concurrently
+from lab_website import outbound
+
+logger = logging.getLogger(__name__)
+
+#these are the default refresh intervals in seconds, post is used for the markdown of every post
+SOURCE_INTERVALS = {
+    'twitter': 60 * 5,
+    'facebook-general': 60 * 60,
+    'facebook-posts': 60 * 10,
+    'facebook-links': 60 * 10,
+    'facebook-photos': 60 * 30,
+    'wikipedia': 60 * 60,
+    'lab-rules': 60 * 60,
+    'publication-policy': 60 * 60,
+    'data-sharing-policy': 60 * 60,
+    'post': 60 * 15,
+}
+
+#these sources are stored as json, the others are stored as the fetched document
+DATA_SOURCES = frozenset(['twitter', 'facebook-general', 'facebook-posts', 'facebook-links', 'facebook-photos', 'wikipedia'])
+
+def post_source(post_id):
+    '''Returns the name of the source of the markdown of a post.'''
+    return 'post:%i' % post_id
+
+def source_interval(name):
+    '''Returns the number of seconds between refreshes of a source.'''
+    key = name.split(':')[0]
+    return getattr(settings, 'EXTERNAL_REFRESH_INTERVALS', {}).get(key, SOURCE_INTERVALS[key])
+
+def twitter_timeline(count):
+    '''Returns the latest tweets of the laboratory as a list of dictionaries, or None if Twitter is not available.'''
+    from communication.views import generate_twitter_timeline
+    try:
+        return [status._json for status in generate_twitter_timeline(count)]
+    except tweepy.TweepError, error:
+        logger.warning('The Twitter timeline could not be fetched: %s', error)
+        return None
+
+def facebook_general_data():
+    '''Returns the general data of the laboratory Facebook page (such as the about text and cover photo), or None if Facebook is not available.'''
+    request_url = getattr(settings, 'FACEBOOK_GRAPH_URL', 'https://graph.facebook.com/v2.3/') + settings.FACEBOOK_ID + '?' + urllib.urlencode({'access_token': settings.FACEBOOK_ACCESS_TOKEN})
+    try:
+        return json.loads(outbound.urlopen(request_url).read())
+    except (urllib2.URLError, ValueError):
+        return None
+
+def facebook_section(type, max):
+    '''Returns a section of the laboratory Facebook page, see :func:`~communication.views.facebook_status_request`.'''
+    from communication.views import facebook_status_request
+    return facebook_status_request(type, max)
+
+def wikipedia_edits(count):
+    '''Returns the latest Wikipedia edits of WIKIPEDIA_USERNAME, or None if Wikipedia is not available.'''
+    from communication.views import get_wikipedia_edits
+    try:
+        return get_wikipedia_edits(settings.WIKIPEDIA_USERNAME, count)
+    except (urllib2.URLError, ValueError):
+        return None
+
+def data_source(function, *args):
+    '''Returns the fetch function of a source whose data is returned by function, which returns None when it fails.'''
+    def fetch(entry):
+        data = function(*args)
+        if data is None:
+            return None
+        return {'content': json.dumps(data)}
+    return fetch
+
+def document_source(url):
+    '''Returns the fetch function of a document, which is requested conditionally if the stored copy is of the same url.'''
+    def fetch(entry):
+        stored = None
+        if entry.fetched is not None and entry.url == url:
+            stored = {'content': entry.content, 'etag': entry.etag or None, 'last_modified': entry.last_modified or None}
+        document = fetch_document(url, stored)
+        if document is None:
+            return None
+        content = document['content']
+        return {
+            'url': url,
+            'content': content if isinstance(content, unicode) else content.decode('utf-8', 'replace'),
+            'etag': document['etag'] or '',
+            'last_modified': document['last_modified'] or '',
+            }
+    return fetch
+
+def sources():
+    '''Returns a dictionary of the name of each configured source and a tuple of its fetch function and url (None for data sources).
+
+    Posts without a markdown url have no source.
+
+    A fetch function is called with the stored :class:`~communication.models.ExternalContent` (which is unsaved for a new source).
+    It returns a dictionary of the fields to update, or None if the source could not be fetched.
+    '''
+    available = {}
+    if getattr(settings, 'TWITTER_ACCESS_TOKEN', ''):
+        available['twitter'] = (data_source(twitter_timeline, 50), None)
+    if getattr(settings, 'FACEBOOK_ACCESS_TOKEN', ''):
+        available['facebook-general'] = (data_source(facebook_general_data), None)
+        available['facebook-posts'] = (data_source(facebook_section, '/?fields=posts', 100), None)
+        available['facebook-links'] = (data_source(facebook_section, '/?fields=links', 5), None)
+        available['facebook-photos'] = (data_source(facebook_section, '/photos/?type=uploaded', 100), None)
+    if getattr(settings, 'WIKIPEDIA_USERNAME', ''):
+        available['wikipedia'] = (data_source(wikipedia_edits, 50), None)
+    for name, setting in (('lab-rules', 'LAB_RULES_FILE'), ('publication-policy', 'PUBLICATION_POLICY_FILE'), ('data-sharing-policy', 'DATA_SHARING_FILE')):
+        url = getattr(settings, setting, '')
+        if url:
+            available[name] = (document_source(url), url)
+    for post_id, markdown_url in Post.objects.exclude(markdown_url='').values_list('pk', 'markdown_url'):
+        available[post_source(post_id)] = (document_source(markdown_url), markdown_url)
+    return available
+
+def is_due(entry, url, now):
+    '''Returns whether a source is due to be refreshed: it has never been requested, its url has changed or its interval has passed.'''
+    if entry.checked is None or (url is not None and entry.url != url):
+        return True
+    return (now - entry.checked).total_seconds() >= source_interval(entry.name)
+
+def refresh(names=None, force=False):
+    '''Fetches the sources which are due and stores them, returning a dictionary of the names requested and whether each succeeded.
+
+    If names are given only those sources are refreshed, whether or not they are due, and a ValueError is raised for unknown names.
+    If force is True every source is refreshed.
+    The stored markdown of deleted posts is removed.
+    '''
+    available = sources()
+    if names is not None:
+        unknown = set(names) - set(available)
+        if unknown:
+            raise ValueError('Unknown or unconfigured sources: %s.' % ', '.join(sorted(unknown)))
+    now = timezone.now()
+    stored = dict((entry.name, entry) for entry in ExternalContent.objects.all())
+    due = {}
+    for name, (fetch, url) in available.items():
+        if names is not None and name not in names:
+            continue
+        entry = stored.get(name) or ExternalContent(name=name)
+        if force or names is not None or is_due(entry, url, now):
+            due[name] = entry
+    calls = dict((name, (available[name][0], (entry,))) for name, entry in due.items())
+    results = fetch_concurrently(calls, getattr(settings, 'EXTERNAL_REFRESH_DEADLINE', 60), processes=getattr(settings, 'EXTERNAL_REFRESH_THREADS', 8))
+    succeeded = {}
+    for name, entry in due.items():
+        update = results.get(name)
+        entry.checked = now
+        if update is None:
+            entry.failures += 1
+            logger.warning('The %s source could not be refreshed (%i failures).', name, entry.failures)
+        else:
+            for field, value in update.items():
+                setattr(entry, field, value)
+            entry.fetched = now
+            entry.failures = 0
+        entry.save()
+        succeeded[name] = update is not None
+    if names is None:
+        removed = [name for name in stored if name.startswith('post:') and name not in available]
+        ExternalContent.objects.filter(name__in=removed).delete()
+    return succeeded
+
+def read(*names):
+    '''Returns a dictionary of the stored content of each named source, from a single query.
+
+    The json of data sources is decoded, and sources which have not been fetched are None.
+    '''
+    contents = dict.fromkeys(names)
+    for name, content in ExternalContent.objects.filter(name__in=names, fetched__isnull=False).values_list('name', 'content'):
+        contents[name] = json.loads(content) if name in DATA_SOURCES else content
+    return contents
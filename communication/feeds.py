@@ -10,27 +10,32 @@ The available feeds are as follows:
 
 
 A main page describing all feeds is available at **/feeds**.
+The feed answers conditional requests, is cached and contains the latest posts, with older posts in archives at **/feeds/posts/archive/<page>**, see :class:`~lab_website.feeds.ConditionalFeed`.
 '''
 
 from datetime import datetime, time
 
-from django.contrib.syndication.views import Feed
 from django.core.urlresolvers import reverse
 from django.conf import settings
 
+from lab_website.feeds import ConditionalFeed
 from communication.models import Post
 
 
-class PostsFeed(Feed):
+class PostsFeed(ConditionalFeed):
     '''This class defines the feed for posts.'''
 
+    depends_on = ('communication.Post', 'personnel.Person')
+    modified_fields = ('created', 'modified')
+
     title = "Posts by the %s" % settings.LAB_NAME
     link = "/feeds/posts"
     description = "Blog posts, about papers or interesting topics to our group."
+    url_name = 'posts-feed'
 
-    def items(self):
-        '''The items returned by this feed are all Post objects.'''
-        return Post.objects.all()
+    def source_queryset(self):
+        '''The items returned by this feed are all Post objects, loaded with their authors in the same query.'''
+        return Post.objects.select_related('author')
 
     def item_title(self, item):
         '''The title of each item will be the unicode representation''' 
@@ -49,8 +54,8 @@ class PostsFeed(Feed):
         return datetime.combine(item.created, time())
 
     def item_updateddate(self, item):
-        '''The date when this commentary was updated.'''
-        return datetime.combine(item.modified, time())
+        '''The date when this commentary was updated, or when it was created if it has not been modified.'''
+        return datetime.combine(item.modified or item.created, time())
 
     def item_copyright(self, item):
         '''The copyright is always CC-BY for posts.'''
@@ -0,0 +1,23 @@
+'''This command shows the hits and misses of the markdown and reStructuredText rendering cache, see :mod:`communication.markup`.
+
+It is run as::
+
+    python manage.py markup_stats
+
+The counts are those added to the shared cache by every process, which each process does every MARKUP_STATS_BATCH renderings.
+'''
+
+from django.core.management.base import BaseCommand
+
+from communication.markup import shared_markup_cache_stats
+
+class Command(BaseCommand):
+    help = 'Shows the local hits, shared hits, misses and hit ratio of the markup rendering cache.'
+
+    def handle(self, *args, **options):
+        stats = shared_markup_cache_stats()
+        if stats['hit_ratio'] is None:
+            self.stdout.write('No renderings have been recorded.')
+            return
+        self.stdout.write('%10s %11s %7s %9s' % ('local hits', 'shared hits', 'misses', 'hit ratio'))
+        self.stdout.write('%10i %11i %7i %9.2f' % (stats['local_hits'], stats['shared_hits'], stats['misses'], stats['hit_ratio']))
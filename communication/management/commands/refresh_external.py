@@ -0,0 +1,60 @@
+'''This command fetches the content shown from other sites which is due to be refreshed, see :mod:`communication.external`.
+
+It is run on a schedule (for example every minute from cron), or kept running as a worker, as::
+
+    python manage.py refresh_external [--loop] [--poll 60] [--force] [--source <name>]
+
+Only the sources whose refresh interval has passed are requested, unless --force or --source is given.
+'''
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from communication.external import refresh
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Fetches the Twitter, Facebook, Wikipedia, policy and post content which is due to be refreshed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', default=False,
+            help='Refresh every source, even if it is not due.')
+        parser.add_argument('--source', action='append', dest='sources', default=None,
+            help='Refresh only this source (such as twitter or post:3), which can be given more than once.')
+        parser.add_argument('--loop', action='store_true', default=False,
+            help='Keep running, checking for due sources every --poll seconds.')
+        parser.add_argument('--poll', type=float, default=60,
+            help='The number of seconds between checks with --loop (default 60).')
+
+    def refresh(self, options):
+        try:
+            succeeded = refresh(names=options['sources'], force=options['force'])
+        except ValueError, error:
+            raise CommandError(error)
+        if not succeeded:
+            self.stdout.write('No sources were due.')
+            return
+        refreshed = sorted(name for name in succeeded if succeeded[name])
+        failed = sorted(name for name in succeeded if not succeeded[name])
+        if refreshed:
+            self.stdout.write('Refreshed %s.' % ', '.join(refreshed))
+        if failed:
+            self.stdout.write('Could not refresh %s.' % ', '.join(failed))
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.refresh(options)
+            return
+        while True:
+            close_old_connections()
+            try:
+                self.refresh(options)
+            except CommandError:
+                raise
+            except Exception:
+                logger.exception('The external content could not be refreshed.')
+            time.sleep(options['poll'])
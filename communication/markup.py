@@ -0,0 +1,118 @@
+'''This package converts markdown and reStructuredText into HTML, keeping each rendering by a hash of its source.
+
+The same posts, lab rules and policies are converted on every view, and docutils takes tens of milliseconds for a policy document.
+Instead each rendering is kept in a bounded in-process LRU of MARKUP_CACHE_SIZE entries (128 by default), and in the shared cache for MARKUP_CACHE_TIMEOUT seconds (a week by default).
+The key is the format and the sha1 of the source, so a changed document is converted again and an unchanged one is never converted twice.
+The hits of each level and the misses in this process are counted by :func:`~communication.markup.markup_cache_stats`.
+Every MARKUP_STATS_BATCH renderings (100 by default) each process adds its counts to counters in the shared cache, which are returned by :func:`~communication.markup.shared_markup_cache_stats` and shown with::
+
+    python manage.py markup_stats
+'''
+
+import collections
+import hashlib
+import threading
+
+from docutils.core import publish_parts
+from markdown import markdown
+
+from django.conf import settings
+from django.core.cache import cache
+
+from lab_website.outbound import increment
+
+MARKUP_KEY = 'communication:markup:%s:%s'
+MARKUP_STATS_KEY = 'communication:markup-stats:%s'
+MARKUP_OUTCOMES = ('local_hits', 'shared_hits', 'misses')
+
+CONVERTERS = {
+    'md': lambda source: markdown(source),
+    'rst': lambda source: publish_parts(source, writer_name='html')['html_body'],
+}
+
+class RenderingCache(object):
+    '''This is a bounded, thread safe LRU of renderings, which counts its hits and misses.
+
+    The counts not yet added to the shared counters are kept in pending.
+    '''
+
+    def __init__(self):
+        self.renderings = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(MARKUP_OUTCOMES, 0)
+        self.pending = dict.fromkeys(MARKUP_OUTCOMES, 0)
+
+    def get(self, key):
+        with self.lock:
+            html = self.renderings.pop(key, None)
+            if html is not None:
+                self.renderings[key] = html
+            return html
+
+    def set(self, key, html):
+        with self.lock:
+            self.renderings.pop(key, None)
+            self.renderings[key] = html
+            while len(self.renderings) > getattr(settings, 'MARKUP_CACHE_SIZE', 128):
+                self.renderings.popitem(last=False)
+
+    def count(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+            self.pending[outcome] += 1
+            if sum(self.pending.values()) < getattr(settings, 'MARKUP_STATS_BATCH', 100):
+                return
+        self.flush()
+
+    def flush(self):
+        '''Adds the pending counts to the shared counters.'''
+        with self.lock:
+            pending, self.pending = self.pending, dict.fromkeys(MARKUP_OUTCOMES, 0)
+        for outcome, delta in pending.items():
+            if delta:
+                increment(MARKUP_STATS_KEY % outcome, delta)
+
+    def stats(self):
+        '''Returns a copy of the counts and the number of renderings kept.'''
+        with self.lock:
+            return dict(self.counts, size=len(self.renderings))
+
+    def clear(self):
+        with self.lock:
+            self.renderings.clear()
+            self.counts = dict.fromkeys(MARKUP_OUTCOMES, 0)
+            self.pending = dict.fromkeys(MARKUP_OUTCOMES, 0)
+
+renderings = RenderingCache()
+
+def render_markup(format, source):
+    '''Returns the HTML of a markdown (md) or reStructuredText (rst) source, from the cache if it has been rendered before.'''
+    key = MARKUP_KEY % (format, hashlib.sha1(source.encode('utf-8')).hexdigest())
+    html = renderings.get(key)
+    if html is not None:
+        renderings.count('local_hits')
+        return html
+    html = cache.get(key)
+    if html is not None:
+        renderings.count('shared_hits')
+    else:
+        renderings.count('misses')
+        html = CONVERTERS[format](source)
+        cache.set(key, html, getattr(settings, 'MARKUP_CACHE_TIMEOUT', 60 * 60 * 24 * 7))
+    renderings.set(key, html)
+    return html
+
+def add_hit_ratio(stats):
+    '''Adds the hit ratio to a dictionary of counts, which is None if nothing was rendered.'''
+    total = sum(stats[outcome] for outcome in MARKUP_OUTCOMES)
+    stats['hit_ratio'] = float(stats['local_hits'] + stats['shared_hits']) / total if total else None
+    return stats
+
+def markup_cache_stats():
+    '''Returns the hits and misses of the rendering cache in this process and the number of renderings it keeps, with the hit ratio.'''
+    return add_hit_ratio(renderings.stats())
+
+def shared_markup_cache_stats():
+    '''Returns the hits and misses of the rendering cache added to the shared counters by all processes, with the hit ratio.'''
+    values = cache.get_many([MARKUP_STATS_KEY % outcome for outcome in MARKUP_OUTCOMES])
+    return add_hit_ratio(dict((outcome, values.get(MARKUP_STATS_KEY % outcome, 0)) for outcome in MARKUP_OUTCOMES))
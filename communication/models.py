@@ -1,6 +1,6 @@
 '''This module contains the models relevant to the :mod:`communication` app.
 
-Currently there is just one model, for laboratory addresses.
+This includes laboratory addresses and locations, posts and the content fetched from other sites by :mod:`communication.external`.
 '''
 
 from django.db import models
@@ -113,4 +113,32 @@ class Post(models.Model):
         if not self.id:
             self.post_slug = slugify(self.post_title)
         super(Post, self).save(*args, **kwargs)         
-       
\ No newline at end of file
+       
+class ExternalContent(models.Model):
+    '''This is the stored copy of some content from another site, such as the Twitter timeline or the lab rules.
+
+    These are written by the refresh_external command (see :mod:`communication.external`) and read by the views, which therefore never wait for other sites.
+    The name identifies the source, and the url is the document which was fetched, if there is one.
+    The content is the raw document, or json for data from an API.
+    The etag and last_modified are the validators of the last response, which are sent with the next request so an unchanged document is not downloaded again.
+    '''
+
+    name = models.CharField(max_length=100, unique=True)
+    url = models.CharField(max_length=255, blank=True)
+    content = models.TextField(blank=True)
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=100, blank=True)
+    fetched = models.DateTimeField(blank=True, null=True,
+        help_text="When was this content last fetched successfully?")
+    checked = models.DateTimeField(blank=True, null=True,
+        help_text="When was this source last requested?")
+    failures = models.IntegerField(default=0,
+        help_text="How many requests have failed since the last successful one?")
+
+    def __unicode__(self):
+        '''The unicode representation is the name of the source.'''
+        return "%s" % self.name
+
+    class Meta:
+        '''These are ordered by name.'''
+        ordering = ['name',]
@@ -14,6 +14,7 @@ class PostsSitemap(Sitemap):
 
     changefreq = 'monthly'
     priority = '0.9'
+    modified_fields = ('created', 'modified')
     
     def items(self):
         '''Shows all :class:`~communication.models.Post` objects.'''
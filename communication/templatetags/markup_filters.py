@@ -1,26 +1,25 @@
 '''This package has the template filters for the communication app.
 
-Currently there is just a markdown filter for converting RST into HTML files.'''
-
-from docutils.core import publish_parts
-
-from markdown import markdown
+Currently there are filters for converting RST and markdown into HTML.
+The renderings are cached by the hash of their source, see :mod:`communication.markup`.'''
 
 from django import template
 from django.template.defaultfilters import stringfilter
 
+from communication.markup import render_markup
+
 register = template.Library()
 
 @register.filter(is_safe=True)
 @stringfilter
 def markdown_rst(value):
-    return publish_parts(value, writer_name='html')['html_body']
+    return render_markup('rst', value)
 
 register.filter('markdown_rst', markdown_rst)
 
 @register.filter(is_safe=True)
 @stringfilter
 def markdown_md(value):
-    return markdown(value)
+    return render_markup('md', value)
 
 register.filter('markdown_md', markdown_md)
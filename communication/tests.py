@@ -8,9 +8,25 @@ Since this app has no models there is model and view tests:
 
 """
 
+import json
+import threading
+import time
+from StringIO import StringIO
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from lab_website.tests import BasicTests
 
-from communication.models import LabAddress,LabLocation,Post
+from communication.models import LabAddress,LabLocation,Post,ExternalContent
+from communication.external import refresh, read, post_source
+from communication.markup import CONVERTERS, renderings, render_markup, markup_cache_stats, shared_markup_cache_stats
+from communication.templatetags.markup_filters import markdown_md, markdown_rst
 
 from personnel.models import Address, Person
 from papers.models import Publication
@@ -246,6 +262,20 @@ class PostViewTests(BasicTests):
         test_response = self.client.get('/posts/not-a-fixture-post') 
         self.assertEqual(test_response.status_code, 404)          
         
+    def test_posts_feed_query_count(self):
+        '''This tests that the number of queries to render the posts feed does not depend on the number of posts.'''
+        self.client.get('/feeds/posts/')
+        cache.clear()
+        with CaptureQueriesContext(connection) as initial_queries:
+            self.assertContains(self.client.get('/feeds/posts/'), 'Fixture Post')
+        for number in range(5):
+            Post.objects.create(post_title='Feed Post %i' % number, author=Person.objects.get(pk=1), markdown_url='http://example.com/post.md')
+        cache.clear()
+        with CaptureQueriesContext(connection) as final_queries:
+            response = self.client.get('/feeds/posts/')
+        self.assertEqual(response.content.count('<item>'), 6)
+        self.assertEqual(len(initial_queries), len(final_queries))
+
     def test_post_list(self):
         """This tests the post-list view, ensuring that templates are loaded correctly.  
 
@@ -295,4 +325,277 @@ class PostViewTests(BasicTests):
         self.assertTemplateUsed(test_response, 'analytics_tracking.html')                                                              
 
         test_response = self.client.get('/posts/not-a-fixture-post/delete') 
-        self.assertEqual(test_response.status_code, 404)  
\ No newline at end of file
+        self.assertEqual(test_response.status_code, 404)
+
+class MarkdownStandInHandler(BaseHTTPRequestHandler):
+    '''This is a stand-in for a raw markdown host, which answers conditional requests with a 304 if the version is unchanged.'''
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(self.headers.getheader('If-None-Match'))
+        etag = '"%s"' % self.server.version
+        if self.headers.getheader('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = '# Stand-in Post\n\nThis is version %s.' % self.server.version
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class MarkdownStandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class PostDocumentTests(BasicTests):
+    '''This class tests fetching the markdown of posts with :mod:`communication.documents`, which the refresh worker stores.'''
+
+    fixtures = ['test_post', 'test_personnel']
+
+    def setUp(self):
+        '''Starts the stand-in markdown host.'''
+        super(PostDocumentTests, self).setUp()
+        self.server = MarkdownStandInServer(('127.0.0.1', 0), MarkdownStandInHandler)
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        self.server.version = 1
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.url = 'http://127.0.0.1:%i/post.md' % self.server.server_address[1]
+        cache.clear()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(PostDocumentTests, self).tearDown()
+
+    def test_post_markdown_cached(self):
+        '''This tests that the markdown of a post is fetched once by the worker, and then served from the stored copy.'''
+        post = Post.objects.create(post_title='Cached Post', author=Person.objects.get(pk=1), markdown_url=self.url)
+        refresh(names=[post_source(post.pk)])
+        for attempt in range(3):
+            response = self.client.get(post.get_absolute_url())
+            self.assertContains(response, 'This is version 1.')
+        self.assertEqual(self.server.requests, [None])
+
+    def test_stored_document_revalidated(self):
+        '''This tests that a stored document is refreshed with a conditional request, and is replaced only when it has changed.'''
+        post = Post.objects.create(post_title='Changing Post', author=Person.objects.get(pk=1), markdown_url=self.url)
+        source = post_source(post.pk)
+        refresh(names=[source])
+        self.assertEqual(refresh(names=[source]), {source: True})
+        self.assertEqual(self.server.requests, [None, '"1"'])
+        self.assertEqual(read(source)[source], '# Stand-in Post\n\nThis is version 1.')
+        self.server.version = 2
+        refresh(names=[source])
+        self.assertTrue(read(source)[source].endswith('version 2.'))
+
+    def test_unavailable_document(self):
+        '''This tests that an unreachable document is not available, and that a stored copy is kept when its host fails.'''
+        post = Post.objects.create(post_title='Stored Post', author=Person.objects.get(pk=1), markdown_url=self.url)
+        refresh(names=[post_source(post.pk)])
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertEqual(refresh(names=[post_source(post.pk)]), {post_source(post.pk): False})
+        self.assertContains(self.client.get(post.get_absolute_url()), 'This is version 1.')
+        post = Post.objects.create(post_title='Missing Post', author=Person.objects.get(pk=1), markdown_url='http://127.0.0.1:%i/missing.md' % self.server.server_address[1])
+        self.assertEqual(refresh(names=[post_source(post.pk)]), {post_source(post.pk): False})
+        self.assertContains(self.client.get(post.get_absolute_url()), 'Post is not Available.')
+
+class MarkupCacheTests(BasicTests):
+    '''This class tests the rendering cache of the markup filters, in :mod:`communication.markup`.'''
+
+    def setUp(self):
+        super(MarkupCacheTests, self).setUp()
+        cache.clear()
+        renderings.clear()
+        self.conversions = []
+        self.converters = dict(CONVERTERS)
+        for format, converter in self.converters.items():
+            CONVERTERS[format] = lambda source, converter=converter: self.conversions.append(source) or converter(source)
+
+    def tearDown(self):
+        CONVERTERS.update(self.converters)
+        renderings.clear()
+        super(MarkupCacheTests, self).tearDown()
+
+    def test_repeated_rendering(self):
+        '''This tests that a source is converted once, and then served from this process or the shared cache.'''
+        self.assertTrue('<h1>Lab Rules</h1>' in markdown_md('# Lab Rules'))
+        self.assertEqual(markdown_md('# Lab Rules'), markdown_md(u'# Lab Rules'))
+        rst = markdown_rst(u'Policy\n======\n\nShare the data \u2014 always.')
+        self.assertTrue(u'\u2014 always' in rst)
+        renderings.clear()
+        self.assertEqual(markdown_rst(u'Policy\n======\n\nShare the data \u2014 always.'), rst)
+        self.assertEqual(len(self.conversions), 2)
+        stats = markup_cache_stats()
+        self.assertEqual((stats['local_hits'], stats['shared_hits'], stats['misses']), (0, 1, 0))
+        markdown_rst(u'Policy\n======\n\nShare the data \u2014 always.')
+        self.assertEqual(markup_cache_stats()['hit_ratio'], 1.0)
+
+    def test_changed_source_and_bound(self):
+        '''This tests that changed sources are converted again and that the in-process cache is bounded.'''
+        with self.settings(MARKUP_CACHE_SIZE=2):
+            for number in range(4):
+                render_markup('md', u'Version %i' % number)
+            self.assertEqual(len(self.conversions), 4)
+            self.assertEqual(markup_cache_stats()['size'], 2)
+            self.assertEqual(render_markup('md', u'Version 3'), u'<p>Version 3</p>')
+            self.assertEqual(markup_cache_stats()['local_hits'], 1)
+            self.assertEqual(markup_cache_stats()['hit_ratio'], 0.2)
+
+    def test_shared_stats(self):
+        '''This tests that the counts are added to the shared counters in batches, and shown by the markup_stats command.'''
+        output = StringIO()
+        call_command('markup_stats', stdout=output)
+        self.assertEqual(output.getvalue(), 'No renderings have been recorded.\n')
+        with self.settings(MARKUP_STATS_BATCH=3):
+            for attempt in range(2):
+                render_markup('md', u'Shared')
+            self.assertEqual(shared_markup_cache_stats()['hit_ratio'], None)
+            render_markup('md', u'Shared')
+        stats = shared_markup_cache_stats()
+        self.assertEqual((stats['local_hits'], stats['shared_hits'], stats['misses']), (2, 0, 1))
+        output = StringIO()
+        call_command('markup_stats', stdout=output)
+        self.assertTrue('0.67' in output.getvalue())
+
+class FacebookStandInHandler(BaseHTTPRequestHandler):
+    '''This is a stand-in for the Facebook Graph API, which delays each section by the time in the delays of the server.'''
+
+    def do_GET(self):
+        if '/photos/' in self.path:
+            section, data = 'photos', {'data': [{'link': 'http://example.com/photo', 'picture': 'stand-in-photo.jpg'}]}
+        elif 'fields=links' in self.path:
+            section, data = 'links', {'links': {'data': []}}
+        else:
+            section, data = 'posts', {'posts': {'data': [{'id': '1', 'message': 'Stand-in news'}]}}
+        time.sleep(self.server.delays.get(section, 0))
+        body = json.dumps(data)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class FacebookNewsTests(BasicTests):
+    '''This class tests that the Facebook sections of the news page are refreshed concurrently, and that the page only reads the stored copies.'''
+
+    def setUp(self):
+        super(FacebookNewsTests, self).setUp()
+        self.server = MarkdownStandInServer(('127.0.0.1', 0), FacebookStandInHandler)
+        self.server.delays = {}
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.graph_url = 'http://127.0.0.1:%i/' % self.server.server_address[1]
+        self.sections = ['facebook-posts', 'facebook-links', 'facebook-photos']
+        cache.clear()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(FacebookNewsTests, self).tearDown()
+
+    def test_concurrent_sections(self):
+        '''This tests that the sections are requested at the same time, so a refresh waits for the slowest rather than the sum.'''
+        self.server.delays = {'posts': 0.5, 'links': 0.5, 'photos': 0.5}
+        with self.settings(FACEBOOK_GRAPH_URL=self.graph_url, FACEBOOK_ACCESS_TOKEN='stand-in-token'):
+            start = time.time()
+            self.assertEqual(refresh(names=self.sections), dict.fromkeys(self.sections, True))
+            self.assertTrue(time.time() - start < 1.2)
+            sections = read(*self.sections)
+            self.assertEqual(sections['facebook-posts']['posts']['data'][0]['message'], 'Stand-in news')
+            self.assertEqual(sections['facebook-links'], {'links': {'data': []}})
+            self.assertContains(self.client.get('/news/'), 'Stand-in news')
+
+    def test_news_page_reads_store(self):
+        '''This tests that the news page never waits for Facebook, and shows a section once the worker has stored it.'''
+        self.server.delays = {'posts': 1, 'links': 1, 'photos': 1}
+        with self.settings(FACEBOOK_GRAPH_URL=self.graph_url, FACEBOOK_ACCESS_TOKEN='stand-in-token'):
+            start = time.time()
+            response = self.client.get('/news/')
+            self.assertTrue(time.time() - start < 0.5)
+            self.assertEqual(response.context['photos'], None)
+            self.assertNotContains(response, 'Stand-in news')
+            self.server.delays = {}
+            refresh(names=['facebook-photos'])
+            response = self.client.get('/news/')
+            self.assertContains(response, 'stand-in-photo.jpg')
+            self.assertEqual(response.context['posts'], None)
+
+class ExternalContentTests(BasicTests):
+    '''This class tests the refresh schedule and stored content of :mod:`communication.external`, with a stand-in host for the lab rules.'''
+
+    fixtures = ['test_personnel']
+
+    def setUp(self):
+        super(ExternalContentTests, self).setUp()
+        self.server = MarkdownStandInServer(('127.0.0.1', 0), MarkdownStandInHandler)
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        self.server.version = 1
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.url = 'http://127.0.0.1:%i/rules.md' % self.server.server_address[1]
+        cache.clear()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(ExternalContentTests, self).tearDown()
+
+    def test_refresh_schedule(self):
+        '''This tests that a source is only requested once its interval has passed, and then with a conditional request.'''
+        with self.settings(LAB_RULES_FILE=self.url):
+            self.assertContains(self.client.get('/lab-rules'), 'Lab Rules File is not Available.')
+            self.assertEqual(refresh(), {'lab-rules': True})
+            self.assertEqual(refresh(), {})
+            self.assertContains(self.client.get('/lab-rules'), 'This is version 1.')
+            self.assertEqual(self.server.requests, [None])
+            self.server.version = 2
+            with self.settings(EXTERNAL_REFRESH_INTERVALS={'lab-rules': 0}):
+                self.assertEqual(refresh(), {'lab-rules': True})
+            self.assertEqual(self.server.requests, [None, '"1"'])
+            self.assertContains(self.client.get('/lab-rules'), 'This is version 2.')
+            self.assertEqual(len(self.server.requests), 2)
+
+    def test_failed_source_kept(self):
+        '''This tests that a source which fails keeps its stored content, and counts its failures.'''
+        with self.settings(LAB_RULES_FILE=self.url):
+            refresh()
+            self.server.shutdown()
+            self.server.server_close()
+            self.assertEqual(refresh(force=True), {'lab-rules': False})
+            entry = ExternalContent.objects.get(name='lab-rules')
+            self.assertEqual(entry.failures, 1)
+            self.assertContains(self.client.get('/lab-rules'), 'This is version 1.')
+
+    def test_post_markdown(self):
+        '''This tests that the markdown of new posts is fetched, that a changed url is fetched again and that deleted posts are removed.
+
+        Posts without a markdown url are not requested.
+        '''
+        post = Post.objects.create(post_title='Stored Post', author=Person.objects.get(pk=1), markdown_url=self.url)
+        self.assertContains(self.client.get(post.get_absolute_url()), 'Post is not Available.')
+        call_command('refresh_external', stdout=StringIO())
+        self.assertContains(self.client.get(post.get_absolute_url()), 'This is version 1.')
+        Post.objects.create(post_title='Draft Post', author=Person.objects.get(pk=1), markdown_url='')
+        post.markdown_url = self.url + '?moved'
+        post.save()
+        self.assertEqual(refresh(), {post_source(post.pk): True})
+        self.assertEqual(self.server.requests, [None, None])
+        post.delete()
+        refresh()
+        self.assertFalse(ExternalContent.objects.exists())
+        self.assertRaises(CommandError, call_command, 'refresh_external', sources=['not-a-source'], stdout=StringIO())
@@ -1,15 +1,42 @@
 '''This package contains utility functions for the :mod:`communication` app.
 
-This will include generic API request functionality (currently for oauth2).
+This will include generic API request functionality (currently for oauth2, and for running several requests concurrently).
 OAuth2 authentication is done using the python-oauth2 library (from https://github.com/brosner/python-oauth2).  This library in turn requires httplib2
 '''
 
+import logging
 import oauth2 as oauth
 import time
 import tweepy
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
 
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
+def fetch_concurrently(calls, deadline, processes=None):
+    '''This function runs several calls at once, returning the results of those which finish within deadline seconds.
+
+    The calls are a dictionary of names and (function, args) tuples, each of which is run in its own thread, or by at most processes threads if given.
+    The returned dictionary only contains the calls which returned in time, so the slowest call sets the time taken, but never more than the deadline.
+    Calls which miss the deadline continue in the background, and calls which raise an exception are logged and left out.
+    '''
+    if not calls:
+        return {}
+    pool = ThreadPool(min(len(calls), processes or len(calls)))
+    pending = dict((name, pool.apply_async(function, args)) for name, (function, args) in calls.items())
+    pool.close()
+    end = time.time() + deadline
+    results = {}
+    for name, result in pending.items():
+        try:
+            results[name] = result.get(max(0, end - time.time()))
+        except TimeoutError:
+            logger.warning('The %s request missed the %.1fs deadline.', name, deadline)
+        except Exception, error:
+            logger.warning('The %s request failed: %s', name, error)
+    return results
 
 
 def twitter_oauth_req(url, http_method="GET", post_body=None, http_headers=None):
@@ -1,7 +1,9 @@
 '''This package contains views for the communication app.
 
-So far this includes API calls for Twitter feeds and Google Calendar'''
+So far this includes API calls for Twitter feeds and Google Calendar.
+The content from other sites is fetched by the refresh_external command, and these views only read the stored copy, see :mod:`communication.external`.'''
 
+import httplib
 import json
 import urllib, urllib2
 import datetime, time
@@ -21,7 +23,10 @@ from django.core.urlresolvers import reverse_lazy
 from braces.views import PermissionRequiredMixin
 
 from communication.models import LabAddress, LabLocation, Post
+from communication.external import read, post_source
+from lab_website import outbound
 from papers.models import Commentary
+from lab_website.pagination import KeysetPaginationMixin
 
 def generate_twitter_timeline(count):
     '''This function generates a timeline from a twitter username.
@@ -30,8 +35,8 @@ def generate_twitter_timeline(count):
     The function also requires an integer for the number of tweets as a second argument.
     It places a REST call to the Twitter API v1 (see https://dev.twitter.com/docs/api/1/get/statuses/user_timeline)
     It returns a dictionary containing information on the most recent tweets from that account (excluding replies).
-    If twitter returns a HTTPError, an error message is returned.
-    It is not currently in use and is only left here for reference purposes.
+    If twitter returns an error, a tweepy.TweepError is raised.
+    It is called by the refresh_external command, see :mod:`communication.external`.
     '''
 
     auth = tweepy.OAuthHandler(settings.TWITTER_CONSUMER_KEY, settings.TWITTER_CONSUMER_SECRET)
@@ -46,38 +51,30 @@ def generate_twitter_timeline(count):
     #    tweet['created_at_cleaned'] = datetime.datetime(*str_time[:6])
     return timeline
     
-def facebook_status_request(type, max):
+def facebook_status_request(type, max, timeout=None):
     '''This function takes a request url and token and returns deserialized data.
         
-    It requires a type (general, milestones or posts) and a maximum number of entries to return
+    It requires a type (general, milestones or posts) and a maximum number of entries to return, and takes an optional timeout in seconds.
+    If the Facebook API is not available, None is returned.
     '''
     values = {'access_token':settings.FACEBOOK_ACCESS_TOKEN}
     params = urllib.urlencode(values)
-    request_url = 'https://graph.facebook.com/v2.3/'+ '447068338637332' + type + '&' + params + '&limit=' + str(max)  
+    request_url = getattr(settings, 'FACEBOOK_GRAPH_URL', 'https://graph.facebook.com/v2.3/') + '447068338637332' + type + '&' + params + '&limit=' + str(max)  
     request = urllib2.Request(request_url)
     
     try:
-        response = urllib2.urlopen(request)
-    except urllib2.URLError, e:
-        if e.code == 404:
-            data = "Facebook API is not Available."
-        else:
-            #this is for a non-404 URLError.
-            data = "Facebook API is not Available."
-    except ValueError:
-            data = "Facebook API is not Available."        
-    else:
-            #successful connection
-            json_data = response.read()
-            data = json.loads(json_data)
-            return data       
-    
+        response = outbound.urlopen(request, timeout=timeout)
+        data = json.loads(response.read())
+    except (IOError, ValueError, httplib.HTTPException):
+        return None
+    return data
+
 def get_wikipedia_edits(username, count):
     '''This function gets the wikipedia edits for a particular user.
     
     This function takes a username argument and a count argument.
     It places a REST call to the Wikipedia API (see http://www.mediawiki.org/wiki/API).
-    It returns a dictionary with the names of the edited articles.
+    It returns a dictionary with the names of the edited articles, whose timestamps can be parsed with :func:`~communication.views.clean_wikipedia_edits`.
     '''    
     values = {'ucuser':username, 
     'action':'query', 
@@ -89,9 +86,13 @@ def get_wikipedia_edits(username, count):
     'ucshow':'!minor'}
     params = urllib.urlencode(values)
     target_site = 'http://en.wikipedia.org/w/api.php?' + params
-    response = urllib2.urlopen(target_site)
+    response = outbound.urlopen(target_site)
     json_response = response.read() #this reads the HTTP response
     pages = json.loads(json_response) 
+    return pages
+
+def clean_wikipedia_edits(pages):
+    '''This function adds the parsed time of each edit from :func:`~communication.views.get_wikipedia_edits` as timestamp_cleaned.'''
     for edit in pages['query']['usercontribs']:
         str_time = time.strptime(edit['timestamp'], "%Y-%m-%dT%H:%M:%SZ")
         edit['timestamp_cleaned'] = datetime.datetime(*str_time[:6])    
@@ -100,8 +101,8 @@ def get_wikipedia_edits(username, count):
 class TwitterView(TemplateView):
     '''This view class generates a page showing the twitter timeline for the lab twitter feed.
     
-    This view uses the function :function:`~communication.utilities.twitter_oauth_req`.
-    The default settings are to return 20 tweets including retweets but excluding replies.
+    The timeline is the stored copy from :func:`~communication.views.generate_twitter_timeline`, which is empty until it has been fetched.
+    The default settings are to return 50 tweets including retweets but excluding replies.
     '''
 
     template_name = "twitter_timeline.html"
@@ -109,7 +110,7 @@ class TwitterView(TemplateView):
     def get_context_data(self, **kwargs):
         '''This function adds the google_calendar_id to the context.'''
         context = super(TwitterView, self).get_context_data(**kwargs)
-        context['timeline'] = generate_twitter_timeline(50)
+        context['timeline'] = read('twitter')['twitter'] or []
         context['screen_name'] = settings.TWITTER_NAME
         return context 
              
@@ -132,17 +133,18 @@ class GoogleCalendarView(TemplateView):
         
 class WikipedaEditsView(View):  
     '''This view class generates a page showing the wikipedia edits for a user.
+
+    The edits are the stored copy from :func:`~communication.views.get_wikipedia_edits`.
     '''
 
     def get(self, request, *args, **kwargs):
         '''This sets the GET function for WikipediaEditsView.'''
-        try: 
-            pages = get_wikipedia_edits(settings.WIKIPEDIA_USERNAME,50)
-            return render('wikipedia_edits.html',
-            {'pages':pages,'username':settings.WIKIPEDIA_USERNAME})
-        except urllib2.HTTPError:
-            messages.error(request, 'No Response from Wikipedia.  Are you sure that %s is a valid username?' % settings.WIKIPEDIA_USERNAME)	    
-            return render('wikipedia_edits.html',
+        pages = read('wikipedia')['wikipedia']
+        if pages is not None:
+            return render(request, 'wikipedia_edits.html',
+            {'pages':clean_wikipedia_edits(pages),'username':settings.WIKIPEDIA_USERNAME})
+        messages.error(request, 'No Response from Wikipedia.  Are you sure that %s is a valid username?' % settings.WIKIPEDIA_USERNAME)	    
+        return render(request, 'wikipedia_edits.html',
             {'username':settings.WIKIPEDIA_USERNAME})
              
 class LabRulesView(TemplateView):
@@ -158,23 +160,12 @@ class LabRulesView(TemplateView):
     def get_context_data(self, **kwargs):
         '''This function provides the context which is passed to this view.
         
-        It will check if the markdown file is available, download it and pass  it to the template.
+        It will check if the stored markdown file is available and pass it to the template.
         If there is no markdown file, then it will generate a no file presented note.'''
         context = super(LabRulesView, self).get_context_data(**kwargs)
-        request = urllib2.Request(settings.LAB_RULES_FILE)
-        try:
-            response = urllib2.urlopen(request)
-        except urllib2.URLError, e:
-            if e.code == 404:
-                lab_rules = "Lab Rules File is not Available."
-            else:
-                #this is for a non-404 URLError.
-                lab_rules = "Lab Rules File is not Available."
-        except ValueError:
-            lab_rules = "Lab Rules File is not Available."        
-        else:
-             #successful connection
-             lab_rules = response.read()         
+        lab_rules = read('lab-rules')['lab-rules']
+        if lab_rules is None:
+            lab_rules = "Lab Rules File is not Available."
         context['lab_rules'] = lab_rules
         context['lab_rules_source'] = settings.LAB_RULES_FILE
         return context 
@@ -192,23 +183,12 @@ class PublicationPolicyView(TemplateView):
     def get_context_data(self, **kwargs):
         '''This function provides the context which is passed to this view.
         
-        It will check if the markdown file is available, download it and pass  it to the template.
+        It will check if the stored markdown file is available and pass it to the template.
         If there is no markdown file, then it will generate a no file presented note.'''
         context = super(PublicationPolicyView, self).get_context_data(**kwargs)
-        request = urllib2.Request(settings.PUBLICATION_POLICY_FILE)
-        try:
-            response = urllib2.urlopen(request)
-        except urllib2.URLError, e:
-            if e.code == 404:
-                publication_policy = "Publication Policy File is not Available."
-            else:
-                #this is for a non-404 URLError.
-                publication_policy = "Publication Policy File is not Available."
-        except ValueError:
-            publication_policy = "Publication Policy File is not Available."        
-        else:
-             #successful connection
-             publication_policy = response.read()         
+        publication_policy = read('publication-policy')['publication-policy']
+        if publication_policy is None:
+            publication_policy = "Publication Policy File is not Available."
         context['publication_policy'] = publication_policy
         context['publication_policy_source'] = settings.PUBLICATION_POLICY_FILE
         return context
@@ -226,24 +206,13 @@ class DataResourceSharingPolicyView(TemplateView):
     def get_context_data(self, **kwargs):
         '''This function provides the context which is passed to this view.
         
-        It will check if the markdown file is available, download it and pass  it to the template.
+        It will check if the stored markdown file is available and pass it to the template.
         If there is no markdown file, then it will generate a no file presented note.'''
         context = super(DataResourceSharingPolicyView, self).get_context_data(**kwargs)
-        request = urllib2.Request(settings.DATA_SHARING_FILE)
-        try:
-            response = urllib2.urlopen(request)
-        except urllib2.URLError, e:
-            if e.code == 404:
-                data_sharing_policy = "Publication Policy File is not Available."
-            else:
-                #this is for a non-404 URLError.
-                data_sharing_policy = "Publication Policy File is not Available."
-        except ValueError:
-            data_sharing_policy = "Publication Policy File is not Available."        
-        else:
-             #successful connection
-             publication_policy = response.read()         
-        context['data_sharing_policy'] = publication_policy
+        data_sharing_policy = read('data-sharing-policy')['data-sharing-policy']
+        if data_sharing_policy is None:
+            data_sharing_policy = "Data Sharing Policy File is not Available."
+        context['data_sharing_policy'] = data_sharing_policy
         context['data_sharing_policy_source'] = settings.DATA_SHARING_FILE
         return context
 
@@ -261,6 +230,8 @@ class FeedDetailView(TemplateView):
         
 class NewsView(TemplateView):
     '''This view parses the facebook feed and presents it as laboratory news.
+
+    The posts, links and photos are the stored copies from :func:`~communication.views.facebook_status_request`, and are None until they have been fetched.
     '''
     
     template_name = "lab_news.html"
@@ -269,9 +240,10 @@ class NewsView(TemplateView):
         '''This function adds milestones and posts to the context.'''
                                               
         context = super(NewsView, self).get_context_data(**kwargs)
-        context['posts'] = facebook_status_request('/?fields=posts', 100)
-        context['links'] = facebook_status_request('/?fields=links', 5)
-        context['photos'] = facebook_status_request('/photos/?type=uploaded', 100)
+        sections = read('facebook-posts', 'facebook-links', 'facebook-photos')
+        context['posts'] = sections['facebook-posts']
+        context['links'] = sections['facebook-links']
+        context['photos'] = sections['facebook-photos']
 #         milestones = facebook_status_request('milestones', 10)
 #         for milestone in milestones['data']:
 #             milestone['start_time_cleaned'] = dateutil.parser.parse(milestone['start_time'])
@@ -307,8 +279,10 @@ class LabLocationView(ListView):
     template_name = "location.html"
     model = LabLocation  
     
-class PostList(ListView):
+class PostList(KeysetPaginationMixin, ListView):
     '''This class generates the view for posts and commentaries located at **/post**.
+
+    The posts are paginated by their creation date.
     '''
     model = Post
     template_name = "post_list.html"
@@ -322,6 +296,8 @@ class PostList(ListView):
 
 class PostDetail(DetailView):
     '''This class generates the view for post-detail located at **/post/<slug>**.
+
+    The markdown of the post is the stored copy, which is fetched by the refresh_external command soon after the post is created.
     '''
     model = Post
     slug_field = "post_slug"
@@ -330,22 +306,10 @@ class PostDetail(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super(PostDetail, self).get_context_data(**kwargs)
-        request_url = str(context['post'].markdown_url)
-        
-        request = urllib2.Request(request_url)
-        try:
-            response = urllib2.urlopen(request)
-        except urllib2.URLError, e:
-            if e.code == 404:
-                post_data = "Post is not Available."
-            else:
-                #this is for a non-404 URLError.
-                post_data = "Post is not Available."
-        except ValueError:
-            post_data = "Post is not Available."        
-        else:
-             #successful connection
-             post_data = response.read()         
+        source = post_source(context['post'].pk)
+        post_data = read(source)[source]
+        if post_data is None:
+            post_data = "Post is not Available."
         context['post_data'] = post_data
         return context
                 
@@ -0,0 +1 @@
+default_app_config = 'lab_website.apps.LabWebsiteConfig'
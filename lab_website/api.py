@@ -0,0 +1,271 @@
+'''This package contains the shared parts of the API, served at **/api/v1/** with tastypie.
+
+The resources are defined in the api module of each app, see :mod:`papers.api`, :mod:`personnel.api` and :mod:`projects.api`.
+They use :class:`~lab_website.api.CachedResourceMixin`, so repeated GET requests are answered from the cache without querying the database.
+Resources using :class:`~lab_website.api.SparseFieldsMixin` also accept a fields parameter, limiting both the columns loaded and the fields serialized.
+Collections are paged with opaque cursors by :class:`~lab_website.api.CursorPaginator`, see :mod:`lab_website.pagination`.
+A summary of the laboratory is served in one request at **/api/v1/overview/**, see :mod:`lab_website.overview`.
+Resources using :class:`~lab_website.api.StreamingListMixin` can also stream a whole collection with stream=true.
+'''
+
+import hashlib
+import urllib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from lxml import etree
+from tastypie.exceptions import BadRequest
+from tastypie.paginator import Paginator
+from tastypie.utils.mime import build_content_type
+
+from lab_website.cache import get_generations, shared_cache
+from lab_website.pagination import InvalidCursor, get_ordering, paginate, iterate_in_chunks
+
+API_CACHE_KEY = 'lab_website:api:%s'
+
+def normalized_query(request):
+    '''Returns the query string of a request with its parameters sorted, so equivalent requests share a cache entry.'''
+    return urllib.urlencode(sorted((key.encode('utf-8'), value.encode('utf-8'))
+        for key, values in request.GET.lists() for value in values))
+
+def cached_response(request, etag, render):
+    '''Returns a 304 response if the client has the ETag, otherwise the cached content for the ETag, calling render if it is not cached.
+
+    render returns an HttpResponse, which is only cached if it has a 200 status code and is not streaming.
+    The response has ETag, Cache-Control (API_CACHE_MAX_AGE seconds) and Vary: Accept headers.
+    If the cache is not shared by every process (see :func:`~lab_website.cache.shared_cache`) the ETag could be stale, so the response is always rendered and has no ETag.
+    '''
+    if not shared_cache():
+        response = render()
+    elif etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        key = API_CACHE_KEY % etag
+        cached = cache.get(key)
+        if cached is None:
+            response = render()
+            if response.status_code != 200:
+                return response
+            if response.streaming:
+                cached = None
+            else:
+                cached = (response.content, response['Content-Type'])
+                cache.set(key, cached, getattr(settings, 'API_CACHE_TIMEOUT', 60 * 60 * 24))
+        if cached is not None:
+            response = HttpResponse(cached[0], content_type=cached[1])
+    if shared_cache():
+        response['ETag'] = quote_etag(etag)
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'API_CACHE_MAX_AGE', 60))
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+class CachedResourceMixin(object):
+    '''This mixin caches the GET responses of a tastypie resource, and sends ETag and Cache-Control headers.
+
+    Subclasses set depends_on, a tuple of the model labels whose changes affect the resource, see :mod:`lab_website.cache`.
+    The cache key and ETag are built from the resource, the view, the url arguments, the normalized query string, the Accept header (if no format is given) and the generations of those models.
+    As the generations are changed by save and delete signals, a changed resource is never served from the cache, and an unchanged one never reaches the database.
+    Responses are cached for API_CACHE_TIMEOUT seconds (a day by default) and may be cached by clients for API_CACHE_MAX_AGE seconds (a minute by default).
+    '''
+    depends_on = ()
+
+    def cache_etag(self, request, view, kwargs):
+        '''Returns the ETag of a GET request to a view of this resource.'''
+        generations = get_generations(self.depends_on)
+        parts = [self._meta.resource_name, view, repr(sorted(kwargs.items())), normalized_query(request)]
+        if 'format' not in request.GET:
+            parts.append(request.META.get('HTTP_ACCEPT', ''))
+        parts.extend(repr(generations[label]) for label in sorted(generations))
+        return hashlib.md5('\n'.join(part.encode('utf-8') if isinstance(part, unicode) else part for part in parts)).hexdigest()
+
+    def wrap_view(self, view):
+        '''Wraps the views of the resource so GET requests are answered from the cache or with a 304 response.'''
+        wrapper = super(CachedResourceMixin, self).wrap_view(view)
+
+        @csrf_exempt
+        def cached_wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return wrapper(request, *args, **kwargs)
+            return cached_response(request, self.cache_etag(request, view, kwargs), lambda: wrapper(request, *args, **kwargs))
+
+        return cached_wrapper
+
+class SparseFieldsMixin(object):
+    '''This mixin lets clients request a subset of the fields of a ModelResource, with a comma separated fields parameter such as ?fields=title,doi.
+
+    Only the requested fields (and resource_uri) are serialized, and only the columns they need (and the primary key) are loaded with only().
+    Subclasses can set field_columns, a dictionary of the columns needed by fields which are not a model field, such as absolute_url.
+    Unknown fields return a 400 response.
+    '''
+    field_columns = {}
+
+    def requested_fields(self, request):
+        '''Returns the set of requested field names, or None if all fields are requested.'''
+        if request is None or not request.GET.get('fields'):
+            return None
+        requested = set(name.strip() for name in request.GET['fields'].split(',') if name.strip())
+        unknown = requested - set(self.fields)
+        if unknown:
+            raise BadRequest("Unknown fields requested: %s." % ', '.join(sorted(unknown)))
+        requested.add('resource_uri')
+        return requested
+
+    def apply_filters(self, request, applicable_filters):
+        '''Defers the columns not needed by the requested fields.'''
+        object_list = super(SparseFieldsMixin, self).apply_filters(request, applicable_filters)
+        requested = self.requested_fields(request)
+        if requested is None:
+            return object_list
+        model_fields = set(field.name for field in object_list.model._meta.concrete_fields)
+        columns = set([object_list.model._meta.pk.name])
+        for name in requested:
+            attribute = self.fields[name].attribute
+            if attribute in model_fields:
+                columns.add(attribute)
+            columns.update(self.field_columns.get(name, ()))
+        columns.update(field.name for field, descending in get_ordering(object_list))
+        return object_list.only(*columns)
+
+    def full_dehydrate(self, bundle, for_list=False):
+        '''Dehydrates only the requested fields, as in ModelResource.full_dehydrate.'''
+        requested = self.requested_fields(bundle.request)
+        if requested is None:
+            return super(SparseFieldsMixin, self).full_dehydrate(bundle, for_list=for_list)
+        for field_name in requested:
+            field_object = self.fields[field_name]
+            if field_object.dehydrated_type == 'related':
+                field_object.api_name = self._meta.api_name
+                field_object.resource_name = self._meta.resource_name
+            bundle.data[field_name] = field_object.dehydrate(bundle, for_list=for_list)
+            method = getattr(self, 'dehydrate_%s' % field_name, None)
+            if method:
+                bundle.data[field_name] = method(bundle)
+        return self.dehydrate(bundle)
+
+class CursorPaginator(Paginator):
+    '''This paginator pages API collections with keyset pagination rather than limit and offset.
+
+    The page after (or before) a cursor is requested with the after (or before) parameter, and the meta object gives the next and previous urls, which contain these cursors.
+    Each page costs a single query however deep it is, and rows are not skipped or repeated when objects are added or deleted between requests.
+    No total_count is returned, as counting the collection would cost as much as loading it.
+    The number of objects is set by limit, which is at most max_limit (limit=0 returns max_limit objects).
+    For compatibility, a request with an offset parameter is paged by limit and offset as before.
+    '''
+
+    def get_cursor_uri(self, limit, name, cursor):
+        '''Returns the url of the page of limit objects after or before a cursor.'''
+        if self.resource_uri is None or cursor is None:
+            return None
+        request_params = self.request_data.copy()
+        for param in ('limit', 'offset', 'after', 'before'):
+            if param in request_params:
+                del request_params[param]
+        request_params.update({'limit': limit, name: cursor})
+        return '%s?%s' % (self.resource_uri, request_params.urlencode())
+
+    def page(self):
+        if 'offset' in self.request_data:
+            return super(CursorPaginator, self).page()
+        limit = self.get_limit() or self.max_limit
+        try:
+            page = paginate(self.objects, limit, after=self.request_data.get('after'), before=self.request_data.get('before'))
+        except InvalidCursor:
+            raise BadRequest("Invalid cursor provided.")
+        return {
+            self.collection_name: page.object_list,
+            'meta': {
+                'limit': limit,
+                'next': self.get_cursor_uri(limit, 'after', page.next_cursor),
+                'previous': self.get_cursor_uri(limit, 'before', page.previous_cursor),
+            },
+        }
+
+class StreamBuffer(object):
+    '''This is a file like object which collects what is written to it until it is drained.'''
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(data)
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+class StreamingListMixin(object):
+    '''This mixin streams a whole collection as json or xml when stream=true is requested, rather than building the response in memory.
+
+    The filtered and sorted objects are loaded stream_chunk_size at a time with :func:`~lab_website.pagination.iterate_in_chunks`, and each chunk is dehydrated, serialized and sent before the next is loaded.
+    The largest response therefore needs no more memory than a single chunk.
+    The xml is written with the incremental writer of lxml, and has the same elements as a normal response.
+    Streamed responses have no meta object, and are not cached (although they are still answered with a 304 if unchanged).
+    '''
+    stream_chunk_size = 500
+    stream_formats = ('application/json', 'application/xml')
+
+    def dispatch(self, request_type, request, **kwargs):
+        '''Streams list GET requests with stream=true, after the method, authentication and throttle checks of Resource.dispatch.
+
+        This is needed as dispatch replaces a StreamingHttpResponse, which is not an HttpResponse, with an empty response.
+        '''
+        if request_type != 'list' or request.method != 'GET' or request.GET.get('stream', '').lower() not in ('1', 'true'):
+            return super(StreamingListMixin, self).dispatch(request_type, request, **kwargs)
+        self.method_check(request, allowed=self._meta.list_allowed_methods)
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        response = self.stream_list(request, **kwargs)
+        self.log_throttled_access(request)
+        return response
+
+    def stream_list(self, request, **kwargs):
+        '''Returns a StreamingHttpResponse of all the filtered and sorted objects.'''
+        desired_format = self.determine_format(request)
+        if desired_format not in self.stream_formats:
+            raise BadRequest("Only json and xml responses can be streamed.")
+        base_bundle = self.build_bundle(request=request)
+        objects = self.obj_get_list(bundle=base_bundle, **self.remove_api_resource_names(kwargs))
+        sorted_objects = self.apply_sorting(objects, options=request.GET)
+        chunks = iterate_in_chunks(sorted_objects, chunk_size=self.stream_chunk_size)
+        if desired_format == 'application/json':
+            content = self.stream_json(request, chunks)
+        else:
+            content = self.stream_xml(request, chunks)
+        return StreamingHttpResponse(content, content_type=build_content_type(desired_format))
+
+    def dehydrate_chunk(self, request, chunk):
+        '''Returns the dehydrated bundles of a chunk of objects.'''
+        return [self.full_dehydrate(self.build_bundle(obj=obj, request=request), for_list=True) for obj in chunk]
+
+    def stream_json(self, request, chunks):
+        '''Yields a json document with an objects list, one chunk at a time.'''
+        serializer = self._meta.serializer
+        separator = b''
+        yield b'{"objects": ['
+        for chunk in chunks:
+            parts = []
+            for bundle in self.dehydrate_chunk(request, chunk):
+                parts.append(separator + serializer.to_json(bundle).encode('utf-8'))
+                separator = b', '
+            yield b''.join(parts)
+        yield b']}'
+
+    def stream_xml(self, request, chunks):
+        '''Yields an xml document with an objects element, one chunk at a time.'''
+        serializer = self._meta.serializer
+        output = StreamBuffer()
+        with etree.xmlfile(output, encoding='utf-8') as document:
+            document.write_declaration()
+            with document.element('response'):
+                with document.element('objects', {'type': 'list'}):
+                    for chunk in chunks:
+                        for bundle in self.dehydrate_chunk(request, chunk):
+                            document.write(serializer.to_etree(bundle))
+                        document.flush()
+                        yield output.drain()
+        yield output.drain()
@@ -0,0 +1,17 @@
+'''This package contains the application configuration for the :mod:`lab_website` app.'''
+
+from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from lab_website.cache import invalidate_saved, invalidate_related
+
+class LabWebsiteConfig(AppConfig):
+    '''The configuration connects the cache invalidation handlers in :mod:`lab_website.cache` when the app is loaded.'''
+
+    name = 'lab_website'
+    verbose_name = 'Lab Website'
+
+    def ready(self):
+        post_save.connect(invalidate_saved, dispatch_uid='lab_website.cache.invalidate_saved')
+        post_delete.connect(invalidate_saved, dispatch_uid='lab_website.cache.invalidate_deleted')
+        m2m_changed.connect(invalidate_related, dispatch_uid='lab_website.cache.invalidate_related')
@@ -0,0 +1,80 @@
+'''This package tracks when the content behind cached responses last changed.
+
+Each model in CACHED_MODELS has a generation, which is the time it was last saved, deleted or had a many to many relation changed.
+The generations are kept in the cache and updated by the signal handlers connected in :class:`~lab_website.apps.LabWebsiteConfig`.
+They are used by :class:`~lab_website.feeds.ConditionalFeed` for its validators and cache keys, so a cached rendering is never served after its content changes.
+
+Updates which do not send signals, such as bulk_create or update(), should call :func:`~lab_website.cache.bump_generation` themselves.
+
+As the generations are kept in the cache, they are only reliable if every process serving the site uses the same cache, such as memcached set in the CACHES setting.
+The default local memory cache belongs to a single process, so a save would only change the generation in the process which handled it.
+With that cache :func:`~lab_website.cache.shared_cache` is False, unless the SHARED_CACHE setting says the site is served by a single process.
+Then every generation is the current time, so nothing is served from the cache or answered with a 304 response because of its generations.
+'''
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+#these are the models whose generations are tracked, as app_label.ModelName
+CACHED_MODELS = frozenset([
+    'papers.Publication',
+    'papers.AuthorDetails',
+    'papers.Commentary',
+    'papers.SearchDocument',
+    'personnel.Person',
+    'projects.Project',
+    'projects.Funding',
+    'communication.Post',
+])
+
+GENERATION_KEY = 'lab_website:generation:%s'
+
+def model_label(model):
+    '''Returns the app_label.ModelName label of a model class.'''
+    return '%s.%s' % (model._meta.app_label, model._meta.object_name)
+
+def shared_cache():
+    '''Returns whether the default cache is shared by every process serving the site.
+
+    This is the SHARED_CACHE setting if it is set, otherwise whether the default cache is not a local memory cache.
+    '''
+    shared = getattr(settings, 'SHARED_CACHE', None)
+    if shared is None:
+        return not isinstance(caches['default'], LocMemCache)
+    return shared
+
+def get_generations(labels):
+    '''Returns a dictionary of the generation of each model label, with a single cache lookup.
+
+    A generation which is not in the cache (for example after a restart) is started at the current time.
+    If the cache is not shared, see :func:`~lab_website.cache.shared_cache`, every generation is the current time.
+    '''
+    if not shared_cache():
+        now = time.time()
+        return dict((label, now) for label in labels)
+    keys = dict((GENERATION_KEY % label, label) for label in labels)
+    generations = cache.get_many(keys.keys())
+    missing = dict((key, time.time()) for key in keys if key not in generations)
+    if missing:
+        cache.set_many(missing, None)
+        generations.update(missing)
+    return dict((keys[key], generation) for key, generation in generations.items())
+
+def bump_generation(*labels):
+    '''Sets the generation of each model label to the current time.'''
+    cache.set_many(dict((GENERATION_KEY % label, time.time()) for label in labels), None)
+
+def invalidate_saved(sender, **kwargs):
+    '''Bumps the generation of a tracked model when an instance is saved or deleted.'''
+    if model_label(sender) in CACHED_MODELS:
+        bump_generation(model_label(sender))
+
+def invalidate_related(sender, instance, action, model, **kwargs):
+    '''Bumps the generations of both sides of a many to many relation when it is changed.'''
+    if action.startswith('post_'):
+        labels = set([model_label(instance.__class__), model_label(model)]) & CACHED_MODELS
+        if labels:
+            bump_generation(*labels)
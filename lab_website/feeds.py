@@ -0,0 +1,159 @@
+'''This package contains the base class for the syndication feeds of all apps.
+
+:class:`~lab_website.feeds.ConditionalFeed` answers conditional requests from feed readers with a 304 response and keeps the rendered feed in the cache.
+The validators are computed from a single aggregate query on the items of the feed and the generations of the models it depends on, see :mod:`lab_website.cache`.
+
+Older items are available from paged archive feeds as described in RFC 5005 (Feed Paging and Archiving).
+The items are paged in the order they were created, and each archive page has FEED_ITEM_LIMIT items (25 by default), numbered from the oldest items, so an archive page does not change as new items are added.
+The current feed has the newer items, from FEED_ITEM_LIMIT up to twice that less one, so every item is in exactly one of the current feed and the archives.
+Within the current feed and each archive page the items are listed newest first.
+The current feed links to the newest archive with a prev-archive link, and each archive links to the one before and after it and to the current feed.
+'''
+
+import datetime
+import hashlib
+from urlparse import urljoin
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.urlresolvers import reverse
+from django.db.models import Count, Max
+from django.http import HttpResponse, Http404
+from django.utils.feedgenerator import Rss201rev2Feed
+from django.views.decorators.http import condition
+
+from lab_website.cache import get_generations, shared_cache
+
+FEED_CACHE_KEY = 'lab_website:feed:%s'
+FEED_HISTORY_NAMESPACE = 'http://purl.org/syndication/history/1.0'
+
+class ArchivedRssFeed(Rss201rev2Feed):
+    '''This RSS feed generator adds the RFC 5005 archive links, and the fh:archive element for archive pages.
+
+    The links are passed as archive_links, a list of (rel, url) tuples, and are made absolute against the feed url.
+    '''
+
+    def rss_attributes(self):
+        attributes = super(ArchivedRssFeed, self).rss_attributes()
+        attributes['xmlns:fh'] = FEED_HISTORY_NAMESPACE
+        return attributes
+
+    def add_root_elements(self, handler):
+        super(ArchivedRssFeed, self).add_root_elements(handler)
+        for rel, url in self.feed.get('archive_links', []):
+            handler.addQuickElement(u'atom:link', None, {u'rel': rel, u'href': urljoin(self.feed['feed_url'], url)})
+        if self.feed.get('is_archive'):
+            handler.addQuickElement(u'fh:archive', u'')
+
+def feed_item_limit():
+    '''Returns the number of items in each feed and archive page, from the FEED_ITEM_LIMIT setting.'''
+    return getattr(settings, 'FEED_ITEM_LIMIT', 25)
+
+class ConditionalFeed(Feed):
+    '''This feed sends ETag and Last-Modified headers, returns 304 responses and caches the rendered XML.
+
+    Subclasses set depends_on, a tuple of the model labels whose changes affect the feed, and modified_fields, the date fields of the items which are aggregated.
+    The ETag covers the number of items, the latest modification date and the generations, so it changes when any item is added, changed or deleted.
+    The Last-Modified header is the later of the latest modification date and the latest generation.
+    The rendered feed is cached for FEED_CACHE_TIMEOUT seconds (a day by default) under its ETag, so a changed feed is never served from the cache.
+    If the cache is not shared by every process, see :func:`~lab_website.cache.shared_cache`, the feed is rendered for every request without validators.
+
+    Subclasses set queryset, all the items of the feed, or override source_queryset, and set url_name, the name of the url of the feed.
+    The items are paged in the order they were created, whatever the ordering of the source queryset.
+    The archives are at the url named url_name-archive, with a page argument, and have FEED_ITEM_LIMIT items each.
+    The current feed has the items after the last archive page, which are at least FEED_ITEM_LIMIT items if there are that many and at most twice that less one.
+    Each feed lists its items with the most recently created first.
+    '''
+    depends_on = ()
+    modified_fields = ()
+    queryset = None
+    url_name = None
+    feed_type = ArchivedRssFeed
+
+    def source_queryset(self):
+        '''Returns all the items of the feed, which are aggregated for the validators and paged into archives.'''
+        if self.queryset is None:
+            raise ImproperlyConfigured('%s has no queryset, set queryset or override source_queryset.' % self.__class__.__name__)
+        return self.queryset.all()
+
+    def archive_pages(self):
+        '''Returns the number of archive pages, which are the complete pages of items except the newest one, which is in the current feed.'''
+        return max(0, self.source_queryset().count() // feed_item_limit() - 1)
+
+    def archive_url(self, page):
+        return reverse('%s-archive' % self.url_name, kwargs={'page': page})
+
+    def get_object(self, request, page=None, *args, **kwargs):
+        '''The object of a feed is a dictionary of the archive page (None for the current feed) and the number of archive pages.'''
+        pages = self.archive_pages() if self.url_name else 0
+        if page is not None:
+            page = int(page)
+            if not 1 <= page <= pages:
+                raise Http404
+        return {'page': page, 'pages': pages}
+
+    def items(self, obj):
+        '''Returns the items of an archive page, or the items after the last archive page for the current feed, most recently created first.
+
+        The pages are sliced from the items in the order they were created, so that archive pages are stable, and each page is then reversed.
+        '''
+        limit = feed_item_limit()
+        items = self.source_queryset().order_by('pk')
+        if obj['page'] is None:
+            items = list(items[obj['pages'] * limit:])
+        else:
+            items = list(items[(obj['page'] - 1) * limit:obj['page'] * limit])
+        items.reverse()
+        return items
+
+    def feed_extra_kwargs(self, obj):
+        '''Adds the RFC 5005 archive links, see :class:`~lab_website.feeds.ArchivedRssFeed`.'''
+        page, pages = obj['page'], obj['pages']
+        links = []
+        if page is None:
+            if pages:
+                links.append(('prev-archive', self.archive_url(pages)))
+        else:
+            links.append(('current', reverse(self.url_name)))
+            if page > 1:
+                links.append(('prev-archive', self.archive_url(page - 1)))
+            if page < pages:
+                links.append(('next-archive', self.archive_url(page + 1)))
+        return {'archive_links': links, 'is_archive': page is not None}
+
+    def get_state(self):
+        '''Returns a tuple of the ETag and Last-Modified datetime of the feed, with one aggregate query.'''
+        aggregates = dict(('latest_%s' % field, Max(field)) for field in self.modified_fields)
+        aggregates['count'] = Count('pk')
+        state = self.source_queryset().order_by().aggregate(**aggregates)
+        dates = [state['latest_%s' % field] for field in self.modified_fields if state['latest_%s' % field]]
+        generations = get_generations(self.depends_on)
+        last_modified = [datetime.datetime.utcfromtimestamp(generation) for generation in generations.values()]
+        last_modified.extend(datetime.datetime.combine(date, datetime.time.min) for date in dates)
+        etag = hashlib.md5('%s/%i/%s/%s' % (self.__class__.__name__, state['count'], max(dates) if dates else None,
+            ','.join(repr(generations[label]) for label in sorted(generations)))).hexdigest()
+        return etag, max(last_modified) if last_modified else None
+
+    def render(self, request, *args, **kwargs):
+        '''Renders the feed, returning a tuple of the content and content type.'''
+        response = super(ConditionalFeed, self).__call__(request, *args, **kwargs)
+        return response.content, response['Content-Type']
+
+    def __call__(self, request, *args, **kwargs):
+        if not shared_cache():
+            return super(ConditionalFeed, self).__call__(request, *args, **kwargs)
+        etag, last_modified = self.get_state()
+
+        @condition(etag_func=lambda request, *args, **kwargs: etag, last_modified_func=lambda request, *args, **kwargs: last_modified)
+        def view(request, *args, **kwargs):
+            key = FEED_CACHE_KEY % hashlib.md5('%s/%s%s' % (etag, request.get_host(), request.path)).hexdigest()
+            rendered = cache.get(key)
+            if rendered is None:
+                rendered = self.render(request, *args, **kwargs)
+                cache.set(key, rendered, getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 60 * 24))
+            content, content_type = rendered
+            return HttpResponse(content, content_type=content_type)
+
+        return view(request, *args, **kwargs)
@@ -82,11 +82,44 @@ FACEBOOK_NAME = '' #the name of the laboratory's facebook page.
 WIKIPEDIA_USERNAME = ''#the wikipedia username(s) to search by.
 MENDELEY_LAB_PAPERS_GROUP = '' #the public Mendeley group id containing the lab's papers
 MENDELEY_CONSUMER_KEY = '' #the Mendeley consumer key
+MENDELEY_API_OPTIONS = {} #optional host, port and timeout for the Mendeley API, ie {'host': 'api.mendeley.com', 'port': 80, 'timeout': 30}
 PLOS_API_KEY = '' #the PLOS API key for PLOS altmetrics
+PLOS_ALM_REQUEST_INTERVAL = 1 #the minimum number of seconds between requests to the PLOS ALM API
 IMPACT_STORY_API_KEY = '' #the impact story API key
 NALYTICS_TRACKING = '' #the analytics tracking id from google analytics (should start with UA)
 ANALYTICS_ROOT = '' #the root of your analytics tracking url
 
+#cache settings
+#the feeds, API and search keep their cached content valid with generations stored in the cache (see lab_website.cache)
+#when more than one process serves the site these need a cache shared by all of them, such as memcached:
+#CACHES = {
+#    'default': {
+#        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+#        'LOCATION': '127.0.0.1:11211',
+#    }
+#}
+#with the default local memory cache, responses are not cached unless SHARED_CACHE says the site is served by a single process
+SHARED_CACHE = None #True if every process uses the same cache, by default this is False only for the local memory cache
+
 #other settings
 PUBLICATION_POLICY_FILE = '' #URL for optional lab publication policy in restructured text format
 LAB_RULES_FILE = '' #URL for an optional laboratory rules file in restructured text format.
+ENFORCE_QUERY_BUDGETS = DEBUG #raise an error when a view issues more queries than its declared query_budget
+FEED_CACHE_TIMEOUT = 60 * 60 * 24 #the number of seconds a rendered feed is cached, feeds are also invalidated when their content changes
+FEED_ITEM_LIMIT = 25 #the number of items in each archive page, the current feed has the newest items after the last full archive page, between this and twice this less one
+SITEMAP_SHARD_SIZE = 50000 #the maximum number of urls in each sitemap file written by build_sitemaps
+API_CACHE_TIMEOUT = 60 * 60 * 24 #the number of seconds an API response is cached, responses are also invalidated when their models change
+API_CACHE_MAX_AGE = 60 #the max-age in seconds sent in the Cache-Control header of API responses
+OVERVIEW_PAPER_LIMIT = 10 #the default number of laboratory papers in the API overview
+DOCUMENT_FETCH_TIMEOUT = 5 #the number of seconds to wait for a document (such as post markdown) when it is refreshed
+MARKUP_CACHE_SIZE = 128 #the number of rendered markdown and RST documents kept in each process
+MARKUP_CACHE_TIMEOUT = 60 * 60 * 24 * 7 #the number of seconds rendered markdown and RST documents are kept in the shared cache
+MARKUP_STATS_BATCH = 100 #the number of renderings after which each process adds its rendering cache counts to the shared counters shown by markup_stats
+OUTBOUND_TIMEOUT = (3, 10) #the (connect, read) timeouts in seconds for requests to other sites
+OUTBOUND_TIMEOUTS = {} #(connect, read) timeouts for particular hosts, for example {'graph.facebook.com': (2, 5)}
+OUTBOUND_FAILURE_THRESHOLD = 5 #the number of failed requests to a host, within OUTBOUND_FAILURE_WINDOW seconds, which suspends requests to it
+OUTBOUND_FAILURE_WINDOW = 60
+OUTBOUND_BREAKER_RESET = 60 #the number of seconds requests to a failing host are suspended
+EXTERNAL_REFRESH_INTERVALS = {} #refresh intervals in seconds for content from other sites, for example {'twitter': 300, 'post': 900}, see communication.external
+EXTERNAL_REFRESH_DEADLINE = 60 #the number of seconds refresh_external waits for the sources, slower ones are tried again later
+EXTERNAL_REFRESH_THREADS = 8 #the number of sources requested at once by refresh_external
@@ -0,0 +1,34 @@
+'''This command writes the sitemap shards and index to STATIC_ROOT, see :mod:`lab_website.sitemaps`.
+
+It is run on a schedule (for example hourly from cron), or after changes, as::
+
+    python manage.py build_sitemaps [--force] [--protocol https] [--directory <path>]
+
+Only the sections whose items have changed since the last build are rewritten.
+'''
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lab_website.sitemaps import build_sitemaps
+
+class Command(BaseCommand):
+    help = 'Writes gzip compressed sitemaps and a sitemap index to STATIC_ROOT.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', default=False,
+            help='Rebuild every section, even if it has not changed.')
+        parser.add_argument('--protocol', choices=['http', 'https'], default='http',
+            help='The protocol of the urls in the sitemaps (default http).')
+        parser.add_argument('--directory', default=None,
+            help='The directory to write to, by default STATIC_ROOT.')
+
+    def handle(self, *args, **options):
+        directory = options['directory'] or settings.STATIC_ROOT
+        if not directory:
+            raise CommandError('Set STATIC_ROOT or pass --directory.')
+        rebuilt = build_sitemaps(directory, protocol=options['protocol'], force=options['force'])
+        if rebuilt:
+            self.stdout.write('Rebuilt the %s sitemaps in %s.' % (', '.join(rebuilt), directory))
+        else:
+            self.stdout.write('The sitemaps in %s are up to date.' % directory)
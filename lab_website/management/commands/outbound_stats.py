@@ -0,0 +1,24 @@
+'''This command shows the requests made to other sites by each host, see :mod:`lab_website.outbound`.
+
+It is run as::
+
+    python manage.py outbound_stats
+'''
+
+from django.core.management.base import BaseCommand
+
+from lab_website.outbound import outbound_stats
+
+class Command(BaseCommand):
+    help = 'Shows the requests, errors, short circuits and mean latency of the requests to each host.'
+
+    def handle(self, *args, **options):
+        stats = outbound_stats()
+        if not stats:
+            self.stdout.write('No outbound requests have been recorded.')
+            return
+        self.stdout.write('%-32s %9s %7s %15s %16s %s' % ('host', 'requests', 'errors', 'short circuits', 'mean latency ms', 'breaker'))
+        for host in sorted(stats):
+            host_stats = stats[host]
+            self.stdout.write('%-32s %9i %7i %15i %16s %s' % (host, host_stats['requests'], host_stats['errors'], host_stats['short_circuits'],
+                '-' if host_stats['mean_latency_ms'] is None else host_stats['mean_latency_ms'], 'open' if host_stats['open'] else 'closed'))
@@ -0,0 +1,51 @@
+'''This package contains view mixins which are shared between the apps of this site.
+
+Currently there is:
+
+* :class:`~lab_website.mixins.QueryBudgetMixin`
+'''
+
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+
+class QueryBudgetExceeded(Exception):
+    '''This exception is raised when a view issues more queries than its declared budget.'''
+    pass
+
+class QueryBudgetMixin(object):
+    '''This mixin declares the maximum number of database queries a view may issue.
+
+    The budget covers the view and the rendering of its template, so a template change which re-introduces per-object queries will be caught.
+    Budgets are only checked if ENFORCE_QUERY_BUDGETS is set in localsettings.py, otherwise they are checked when DEBUG is True.
+    If the budget is exceeded a :class:`~lab_website.mixins.QueryBudgetExceeded` exception is raised.
+    The queries are counted with the query log of the connection, which is kept for the request even when DEBUG is False.
+    '''
+
+    query_budget = None
+
+    def dispatch(self, request, *args, **kwargs):
+        '''Counts the queries issued while handling and rendering this request.'''
+        enforced = getattr(settings, 'ENFORCE_QUERY_BUDGETS', settings.DEBUG)
+        if self.query_budget is None or not enforced:
+            return super(QueryBudgetMixin, self).dispatch(request, *args, **kwargs)
+        #the queries of this request are logged to a separate log, which is added to the log of the connection afterwards
+        queries_log, force_debug_cursor = connection.queries_log, connection.force_debug_cursor
+        connection.queries_log = deque(maxlen=queries_log.maxlen)
+        connection.force_debug_cursor = True
+        try:
+            response = super(QueryBudgetMixin, self).dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        finally:
+            queries = list(connection.queries_log)
+            queries_log.extend(queries)
+            connection.queries_log, connection.force_debug_cursor = queries_log, force_debug_cursor
+        if len(queries) > self.query_budget:
+            raise QueryBudgetExceeded('%s issued %i queries, the budget is %i:\n%s' % (
+                self.__class__.__name__,
+                len(queries),
+                self.query_budget,
+                '\n'.join(query['sql'] for query in queries)))
+        return response
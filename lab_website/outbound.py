@@ -0,0 +1,169 @@
+'''This package makes the HTTP requests from this site to other sites, with per host timeouts and a circuit breaker for each host.
+
+:func:`~lab_website.outbound.urlopen` is used in place of urllib2.urlopen, and returns a response which has already been read.
+The timeouts are a (connect, read) tuple for each host in the OUTBOUND_TIMEOUTS setting, or OUTBOUND_TIMEOUT (3 and 10 seconds by default) for other hosts.
+When OUTBOUND_FAILURE_THRESHOLD requests to a host (5 by default) fail within OUTBOUND_FAILURE_WINDOW seconds (a minute by default), the circuit breaker for that host opens.
+While it is open, requests raise :class:`~lab_website.outbound.CircuitOpen` at once, without contacting the host, so the callers show their fallback content.
+After OUTBOUND_BREAKER_RESET seconds (a minute by default) requests are tried again, and a single further failure opens the breaker again.
+Connection errors, timeouts and 5xx responses are failures, other HTTP errors (such as a 404 or 304) are not.
+
+The number of requests, errors, short circuited requests and the total latency of each host are counted in the cache, see :func:`~lab_website.outbound.outbound_stats`.
+They can be shown with::
+
+    python manage.py outbound_stats
+
+As with :mod:`lab_website.cache`, the breakers and counters are shared by all processes only if a shared cache is set in the CACHES setting.
+'''
+
+import httplib
+import logging
+import time
+import urllib
+import urllib2
+from StringIO import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_KEY = 'lab_website:outbound:%s:%s'
+OUTBOUND_HOSTS_KEY = 'lab_website:outbound:hosts'
+OUTBOUND_COUNTERS = ('requests', 'errors', 'short_circuits', 'latency_ms')
+
+class CircuitOpen(urllib2.URLError):
+    '''This exception is raised rather than making a request to a host whose circuit breaker is open.'''
+
+    def __init__(self, host):
+        urllib2.URLError.__init__(self, 'Requests to %s are suspended after repeated failures.' % host)
+        self.host = host
+
+class TimeoutHTTPConnection(httplib.HTTPConnection):
+    '''This connection uses its timeout to connect, and then read_timeout for each read.'''
+    read_timeout = None
+
+    def connect(self):
+        httplib.HTTPConnection.connect(self)
+        self.sock.settimeout(self.read_timeout)
+
+class TimeoutHTTPSConnection(httplib.HTTPSConnection):
+    '''This connection uses its timeout to connect and complete the TLS handshake, and then read_timeout for each read.'''
+    read_timeout = None
+
+    def connect(self):
+        httplib.HTTPSConnection.connect(self)
+        self.sock.settimeout(self.read_timeout)
+
+class TimeoutHTTPHandler(urllib2.HTTPHandler):
+    '''This handler opens http urls with a :class:`~lab_website.outbound.TimeoutHTTPConnection`.'''
+
+    def __init__(self, read_timeout):
+        urllib2.HTTPHandler.__init__(self)
+        self.read_timeout = read_timeout
+
+    def connection(self, host, **kwargs):
+        connection = TimeoutHTTPConnection(host, **kwargs)
+        connection.read_timeout = self.read_timeout
+        return connection
+
+    def http_open(self, request):
+        return self.do_open(self.connection, request)
+
+class TimeoutHTTPSHandler(urllib2.HTTPSHandler):
+    '''This handler opens https urls with a :class:`~lab_website.outbound.TimeoutHTTPSConnection`.'''
+
+    def __init__(self, read_timeout):
+        urllib2.HTTPSHandler.__init__(self)
+        self.read_timeout = read_timeout
+
+    def connection(self, host, **kwargs):
+        connection = TimeoutHTTPSConnection(host, **kwargs)
+        connection.read_timeout = self.read_timeout
+        return connection
+
+    def https_open(self, request):
+        return self.do_open(self.connection, request, context=self._context)
+
+def host_timeouts(host):
+    '''Returns the (connect, read) timeouts in seconds for a host.'''
+    return getattr(settings, 'OUTBOUND_TIMEOUTS', {}).get(host, getattr(settings, 'OUTBOUND_TIMEOUT', (3, 10)))
+
+def increment(key, delta=1, timeout=None):
+    '''Increments a counter in the cache, creating it if required, and returns its value.'''
+    if cache.add(key, delta, timeout):
+        return delta
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout)
+        return delta
+
+def register_host(host):
+    hosts = cache.get(OUTBOUND_HOSTS_KEY) or []
+    if host not in hosts:
+        cache.set(OUTBOUND_HOSTS_KEY, hosts + [host], None)
+
+def record_request(host, start, failed):
+    '''Counts a request to a host, and opens its circuit breaker if it has failed too often.'''
+    register_host(host)
+    increment(OUTBOUND_KEY % (host, 'requests'))
+    increment(OUTBOUND_KEY % (host, 'latency_ms'), int((time.time() - start) * 1000))
+    if not failed:
+        cache.delete(OUTBOUND_KEY % (host, 'failures'))
+        return
+    increment(OUTBOUND_KEY % (host, 'errors'))
+    threshold = getattr(settings, 'OUTBOUND_FAILURE_THRESHOLD', 5)
+    window = getattr(settings, 'OUTBOUND_FAILURE_WINDOW', 60)
+    if increment(OUTBOUND_KEY % (host, 'failures'), timeout=window) >= threshold:
+        reset = getattr(settings, 'OUTBOUND_BREAKER_RESET', 60)
+        cache.set(OUTBOUND_KEY % (host, 'open'), True, reset)
+        #after the reset, one more failure opens the breaker again
+        cache.set(OUTBOUND_KEY % (host, 'failures'), threshold - 1, reset + window)
+        logger.warning('Suspending requests to %s for %is after %i failures.', host, reset, threshold)
+
+def urlopen(request, timeout=None):
+    '''Opens a url or urllib2.Request like urllib2.urlopen, with the timeouts and circuit breaker of its host.
+
+    The whole response is read, so a slow response times out here, and a response with the same interface as urllib2.urlopen is returned.
+    If timeout is given it is used for both the connect and read timeouts.
+    Failures raise a urllib2.URLError (an HTTPError for HTTP errors, or a :class:`~lab_website.outbound.CircuitOpen`), and an invalid url raises a ValueError.
+    '''
+    if not isinstance(request, urllib2.Request):
+        request = urllib2.Request(request)
+    host = request.get_host()
+    if cache.get(OUTBOUND_KEY % (host, 'open')):
+        register_host(host)
+        increment(OUTBOUND_KEY % (host, 'short_circuits'))
+        raise CircuitOpen(host)
+    connect_timeout, read_timeout = (timeout, timeout) if timeout is not None else host_timeouts(host)
+    opener = urllib2.build_opener(TimeoutHTTPHandler(read_timeout), TimeoutHTTPSHandler(read_timeout))
+    start = time.time()
+    try:
+        response = opener.open(request, timeout=connect_timeout)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+    except urllib2.HTTPError, error:
+        record_request(host, start, failed=error.code >= 500)
+        raise
+    except urllib2.URLError:
+        record_request(host, start, failed=True)
+        raise
+    except (IOError, httplib.HTTPException), error:
+        record_request(host, start, failed=True)
+        raise urllib2.URLError(error)
+    record_request(host, start, failed=False)
+    return urllib.addinfourl(StringIO(content), response.info(), response.geturl(), response.getcode())
+
+def outbound_stats():
+    '''Returns a dictionary of the counters of each host which has been requested, with the mean latency and whether its breaker is open.'''
+    stats = {}
+    for host in cache.get(OUTBOUND_HOSTS_KEY) or []:
+        keys = dict((OUTBOUND_KEY % (host, name), name) for name in OUTBOUND_COUNTERS + ('open',))
+        values = cache.get_many(keys.keys())
+        host_stats = dict((name, values.get(key, 0)) for key, name in keys.items())
+        host_stats['open'] = bool(host_stats['open'])
+        host_stats['mean_latency_ms'] = host_stats['latency_ms'] // host_stats['requests'] if host_stats['requests'] else None
+        stats[host] = host_stats
+    return stats
@@ -0,0 +1,111 @@
+'''This package serves a summary of the laboratory in a single API request, at **/api/v1/overview/**.
+
+Portals showing the laboratory would otherwise request the publications, personnel and projects APIs, and then each item in turn.
+The overview contains the current members, the latest laboratory papers (with their precomputed bylines), the active projects and the active funding.
+The sections are chosen with the sections parameter, and the number of papers with the papers parameter (OVERVIEW_PAPER_LIMIT by default, from 1 to 100)::
+
+    http://yourserver.org/api/v1/overview/
+    http://yourserver.org/api/v1/overview/?sections=members,papers&papers=5
+
+Active projects are those with current personnel.
+The response is cached until any of the models it contains change, see :func:`~lab_website.api.cached_response`.
+'''
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.views.decorators.http import require_GET
+
+from lab_website.api import cached_response, normalized_query
+from lab_website.cache import get_generations
+from papers.models import Publication
+from personnel.models import Person
+from projects.models import Project, Funding
+
+OVERVIEW_SECTIONS = ('members', 'papers', 'projects', 'funding')
+OVERVIEW_DEPENDS_ON = ('papers.Publication', 'papers.AuthorDetails', 'personnel.Person', 'projects.Project', 'projects.Funding')
+MAX_OVERVIEW_PAPERS = 100
+
+def overview_members():
+    '''Returns the current laboratory members.'''
+    return [{
+        'id': person.pk,
+        'name': person.full_name(),
+        'name_slug': person.name_slug,
+        'absolute_url': person.get_absolute_url(),
+        'image': person.image.url if person.image else None,
+        } for person in Person.objects.filter(current_lab_member=True).only('first_name', 'last_name', 'name_slug', 'image')]
+
+def overview_papers(limit):
+    '''Returns the latest laboratory papers, with their bylines.'''
+    papers = Publication.objects.filter(laboratory_paper=True).only(
+        'title', 'title_slug', 'byline', 'byline_html', 'journal', 'year', 'publication_date', 'doi', 'pmid', 'date_added')[:limit]
+    return [{
+        'id': paper.pk,
+        'title': paper.title,
+        'byline': paper.byline,
+        'byline_html': paper.byline_html,
+        'journal': paper.journal,
+        'year': paper.year,
+        'doi': paper.doi,
+        'pmid': paper.pmid,
+        'absolute_url': paper.get_absolute_url(),
+        } for paper in papers]
+
+def overview_projects():
+    '''Returns the projects with current personnel, and the current personnel of each.'''
+    projects = Project.objects.filter(current_personnel__isnull=False).distinct().only(
+        'title', 'title_slug', 'summary', 'start_date', 'priority', 'date_last_modified').prefetch_related('current_personnel')
+    return [{
+        'id': project.pk,
+        'title': project.title,
+        'summary': project.summary,
+        'start_date': project.start_date,
+        'absolute_url': project.get_absolute_url(),
+        'personnel': [{'name': person.full_name(), 'name_slug': person.name_slug} for person in project.current_personnel.all()],
+        } for project in projects]
+
+def overview_funding():
+    '''Returns the active funding, with the agency of each award.'''
+    return [{
+        'id': funding.pk,
+        'title': funding.title,
+        'funding_agency': funding.funding_agency.short_name if funding.funding_agency else None,
+        'start_date': funding.start_date,
+        'end_date': funding.end_date,
+        'absolute_url': funding.get_absolute_url(),
+        } for funding in Funding.objects.filter(active=True).select_related('funding_agency')]
+
+@require_GET
+def lab_overview(request):
+    '''Returns the overview as json, from the cache if none of its models have changed.'''
+    sections = request.GET.get('sections')
+    sections = [section.strip() for section in sections.split(',') if section.strip()] if sections else list(OVERVIEW_SECTIONS)
+    if not set(sections) <= set(OVERVIEW_SECTIONS):
+        return HttpResponseBadRequest('Unknown sections requested, the sections are %s.' % ', '.join(OVERVIEW_SECTIONS))
+    try:
+        paper_limit = min(int(request.GET.get('papers', getattr(settings, 'OVERVIEW_PAPER_LIMIT', 10))), MAX_OVERVIEW_PAPERS)
+    except ValueError:
+        return HttpResponseBadRequest('The papers parameter should be a number.')
+    if paper_limit < 1:
+        return HttpResponseBadRequest('The papers parameter should be at least 1.')
+    generations = get_generations(OVERVIEW_DEPENDS_ON)
+    etag = hashlib.md5('overview\n%s\n%s' % (normalized_query(request),
+        ','.join(repr(generations[label]) for label in sorted(generations)))).hexdigest()
+
+    def render():
+        overview = {}
+        if 'members' in sections:
+            overview['members'] = overview_members()
+        if 'papers' in sections:
+            overview['papers'] = overview_papers(paper_limit)
+        if 'projects' in sections:
+            overview['projects'] = overview_projects()
+        if 'funding' in sections:
+            overview['funding'] = overview_funding()
+        return HttpResponse(json.dumps(overview, cls=DjangoJSONEncoder), content_type='application/json')
+
+    return cached_response(request, etag, render)
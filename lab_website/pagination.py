@@ -0,0 +1,188 @@
+'''This package contains keyset (or seek) pagination which is shared between the apps of this site.
+
+Rather than counting rows with OFFSET, a page is found by filtering for the rows which sort after (or before) the last row of the previous page.
+The position in a list is encoded as an opaque cursor containing the values of the ordering fields, so a deep page costs the same as the first page.
+The ordering is taken from the queryset, or the Meta.ordering of the model, and the primary key is always added as the final tie breaker.
+
+The main entry points are:
+
+* :func:`~lab_website.pagination.paginate` which returns a :class:`~lab_website.pagination.KeysetPage`
+* :func:`~lab_website.pagination.iterate_in_chunks` which walks a whole queryset one page at a time
+* :class:`~lab_website.pagination.KeysetPaginationMixin` which adds this pagination to a ListView
+'''
+
+import base64
+import json
+
+from django.core.exceptions import ImproperlyConfigured, FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+
+class InvalidCursor(ValueError):
+    '''This exception is raised when a cursor can not be decoded for a queryset.'''
+    pass
+
+def get_ordering(queryset):
+    '''Returns the ordering of a queryset as a list of (field, descending) tuples.
+
+    The primary key is appended if it is not already part of the ordering, so that the ordering is total.
+    Only concrete, non-relational fields of the model can be used for keyset pagination.
+    '''
+    opts = queryset.model._meta
+    ordering = list(queryset.query.order_by) or list(opts.ordering)
+    keys = []
+    for name in ordering:
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        if name == 'pk':
+            name = opts.pk.name
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured("Keyset pagination can not order %s by '%s'." % (opts.object_name, name))
+        if field.is_relation:
+            raise ImproperlyConfigured("Keyset pagination can not order %s by the relation '%s'." % (opts.object_name, name))
+        keys.append((field, descending))
+    if opts.pk not in [field for field, descending in keys]:
+        keys.append((opts.pk, False))
+    return keys
+
+def encode_cursor(obj, keys):
+    '''Encodes the ordering values of an object as an opaque, url safe cursor.'''
+    values = [getattr(obj, field.attname) for field, descending in keys]
+    data = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, keys):
+    '''Decodes a cursor into a list of ordering values, raising :class:`~lab_website.pagination.InvalidCursor` if it is not valid.'''
+    try:
+        cursor = str(cursor)
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data.decode('utf-8'))
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidCursor('The cursor %r is not valid.' % cursor)
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise InvalidCursor('The cursor %r does not match this ordering.' % cursor)
+    try:
+        return [field.to_python(value) for (field, descending), value in zip(keys, values)]
+    except (TypeError, ValueError, ValidationError):
+        raise InvalidCursor('The cursor %r does not match this ordering.' % cursor)
+
+def _comes_after(field, value, descending, nulls_largest):
+    '''Returns a Q object for the rows which sort after value for one field, or None if no row can.'''
+    nulls_last = nulls_largest != descending
+    if value is None:
+        if nulls_last:
+            return None
+        return Q(**{'%s__isnull' % field.name: False})
+    condition = Q(**{'%s__%s' % (field.name, 'lt' if descending else 'gt'): value})
+    if nulls_last:
+        condition |= Q(**{'%s__isnull' % field.name: True})
+    return condition
+
+def seek(queryset, keys, values, reverse=False):
+    '''Filters and orders a queryset to the rows which come after the values in the ordering given by keys.
+
+    If reverse is True, the rows before the values are returned, in reverse order.
+    '''
+    nulls_largest = connections[queryset.db].features.nulls_order_largest
+    keys = [(field, descending != reverse) for field, descending in keys]
+    queryset = queryset.order_by(*[('-' if descending else '') + field.name for field, descending in keys])
+    if values is None:
+        return queryset
+    alternatives = []
+    equal = Q()
+    for (field, descending), value in zip(keys, values):
+        after = _comes_after(field, value, descending, nulls_largest)
+        if after is not None:
+            alternatives.append(equal & after)
+        if value is None:
+            equal &= Q(**{'%s__isnull' % field.name: True})
+        else:
+            equal &= Q(**{field.name: value})
+    if not alternatives:
+        return queryset.none()
+    condition = alternatives[0]
+    for alternative in alternatives[1:]:
+        condition |= alternative
+    return queryset.filter(condition)
+
+class KeysetPage(object):
+    '''This is a single page of objects, with cursors for the next and previous pages.
+
+    The has_next, has_previous, next_cursor and previous_cursor attributes are used to generate links to adjacent pages.
+    '''
+
+    def __init__(self, object_list, keys, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = None
+        self.previous_cursor = None
+        if object_list:
+            if has_next:
+                self.next_cursor = encode_cursor(object_list[-1], keys)
+            if has_previous:
+                self.previous_cursor = encode_cursor(object_list[0], keys)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+def paginate(queryset, page_size, after=None, before=None):
+    '''Returns the :class:`~lab_website.pagination.KeysetPage` of page_size objects after (or before) a cursor.
+
+    Each page costs a single query (plus any prefetching) regardless of how deep it is.
+    One extra row is requested to find out whether there is a following page.
+    '''
+    keys = get_ordering(queryset)
+    if before:
+        rows = list(seek(queryset, keys, decode_cursor(before, keys), reverse=True)[:page_size + 1])
+        has_previous = len(rows) > page_size
+        object_list = rows[:page_size]
+        object_list.reverse()
+        return KeysetPage(object_list, keys, has_next=True, has_previous=has_previous)
+    values = decode_cursor(after, keys) if after else None
+    rows = list(seek(queryset, keys, values)[:page_size + 1])
+    return KeysetPage(rows[:page_size], keys, has_next=len(rows) > page_size, has_previous=bool(after))
+
+def iterate_in_chunks(queryset, chunk_size=500):
+    '''Yields the objects of a queryset as lists of at most chunk_size objects, in the order of the queryset.
+
+    Unlike iterator(), any select_related or prefetch_related of the queryset is applied to each chunk.
+    '''
+    cursor = None
+    while True:
+        page = paginate(queryset, chunk_size, after=cursor)
+        if page.object_list:
+            yield page.object_list
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+
+class KeysetPaginationMixin(object):
+    '''This mixin replaces the page number pagination of a ListView with keyset pagination.
+
+    The page is selected with the **after** or **before** query parameters, which take a cursor from the previous page.
+    The page_obj in the context is a :class:`~lab_website.pagination.KeysetPage` and the paginator is None.
+    An invalid cursor will return a 404 error.
+    '''
+
+    paginate_by = 25
+
+    def paginate_queryset(self, queryset, page_size):
+        '''Returns a tuple of (paginator, page, object_list, is_paginated) as expected by ListView.'''
+        try:
+            page = paginate(queryset, page_size,
+                after=self.request.GET.get('after'),
+                before=self.request.GET.get('before'))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        return (None, page, page.object_list, page.has_other_pages())
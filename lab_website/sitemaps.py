@@ -0,0 +1,157 @@
+'''This package lists the sitemaps of the website and writes them to disk as gzip compressed files.
+
+Rather than generating the sitemaps on each request, they are built with::
+
+    python manage.py build_sitemaps
+
+This writes one or more shards per section (sitemap-<section>-<number>.xml.gz, each of at most SITEMAP_SHARD_SIZE urls) and an index (sitemap.xml) to STATIC_ROOT.
+The index gives the lastmod of each shard, which is the latest lastmod of its urls.
+A manifest (sitemap-manifest.json) records a fingerprint of each section, and a section is only rebuilt when its fingerprint changes.
+The fingerprint is the number of items, the sum of their primary keys and the latest value of each of the modified_fields of the sitemap, from one aggregate query.
+Sitemaps without modified_fields (such as :class:`~lab_website.sitemaps.StaticViewSitemap`) are fingerprinted by their urls.
+
+The index is served at **/sitemap.xml** by :func:`~lab_website.sitemaps.sitemap_index`, and the shards from STATIC_URL.
+Sitemaps are never generated on request, so until build_sitemaps has been run /sitemap.xml returns a 404.
+'''
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.contrib.sitemaps import Sitemap
+from django.contrib.sites.models import Site
+from django.core.urlresolvers import reverse
+from django.db.models import Count, Max, Sum
+from django.http import HttpResponse, Http404
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+from personnel.sitemap import LabPersonnelSitemap
+from papers.sitemap import LabPublicationsSitemap, CommentarySitemap
+from projects.sitemap import ProjectsSitemap, FundingSitemap
+from communication.sitemap import PostsSitemap
+
+SITEMAP_INDEX = 'sitemap.xml'
+SITEMAP_MANIFEST = 'sitemap-manifest.json'
+SITEMAP_SHARD = 'sitemap-%s-%i.xml.gz'
+
+class StaticViewSitemap(Sitemap):
+    '''This sitemap is for all static pages, including list views home and feeds.'''
+
+    priority = 0.4
+    changefreq = 'weekly'
+
+    def items(self):
+        return ['location','feed-details','laboratory-papers','interesting-papers','commentary-list','laboratory-personnel','laboratory-alumni','project-list', 'post-list', 'twitter','google-calendar','wikipedia','lab-rules','publication-policy','data-resource-policy','lab-news','contact-info','funding-list']
+
+    def location(self, item):
+        return reverse(item)
+
+#this dictionary lists sitemap files which will be generated.
+sitemaps = {
+    'personnel': LabPersonnelSitemap,
+    'papers': LabPublicationsSitemap,
+    'commentary': CommentarySitemap,
+    'posts': PostsSitemap,
+    'projects': ProjectsSitemap,
+    'funding': FundingSitemap,
+    'static': StaticViewSitemap
+    }
+
+def sitemap_fingerprint(sitemap):
+    '''Returns a string which changes when the urls or lastmod dates of a sitemap may have changed.'''
+    modified_fields = getattr(sitemap, 'modified_fields', ())
+    if not modified_fields:
+        return hashlib.md5(u'\n'.join(sitemap.location(item) for item in sitemap.items()).encode('utf-8')).hexdigest()
+    aggregates = dict(('latest_%s' % field, Max(field)) for field in modified_fields)
+    state = sitemap.items().order_by().aggregate(count=Count('pk'), pk_sum=Sum('pk'), **aggregates)
+    return '/'.join('%s=%s' % (key, state[key]) for key in sorted(state))
+
+def latest_lastmod(urls):
+    '''Returns the latest lastmod of a list of sitemap urls as a W3C date, or None.'''
+    dates = [url['lastmod'] for url in urls if url.get('lastmod')]
+    if not dates:
+        return None
+    latest = max(dates)
+    return latest.strftime('%Y-%m-%d') if isinstance(latest, datetime.date) else u'%s' % latest
+
+def write_file(path, content, compress=False):
+    '''Writes a file atomically, by writing to a temporary file and renaming it.'''
+    temporary = '%s.tmp' % path
+    if compress:
+        with open(temporary, 'wb') as output:
+            archive = gzip.GzipFile(filename=os.path.basename(path)[:-3], mode='wb', fileobj=output, mtime=0)
+            archive.write(content)
+            archive.close()
+    else:
+        with open(temporary, 'wb') as output:
+            output.write(content)
+    os.rename(temporary, path)
+
+def shard_url(filename, site, protocol):
+    '''Returns the absolute url of a shard in STATIC_URL.'''
+    url = settings.STATIC_URL + filename
+    if '://' in url:
+        return url
+    return '%s://%s%s' % (protocol, site.domain, url)
+
+def build_sitemaps(directory=None, protocol='http', force=False, shard_size=None):
+    '''Writes the shards of each changed section and the sitemap index, returning the list of rebuilt sections.
+
+    The files are written to directory, by default STATIC_ROOT.
+    If force is True every section is rebuilt.
+    '''
+    directory = directory or settings.STATIC_ROOT
+    shard_size = shard_size or getattr(settings, 'SITEMAP_SHARD_SIZE', Sitemap.limit)
+    site = Site.objects.get_current()
+    manifest_path = os.path.join(directory, SITEMAP_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    rebuilt = []
+    for section in sorted(sitemaps):
+        sitemap = sitemaps[section]()
+        sitemap.limit = shard_size
+        fingerprint = sitemap_fingerprint(sitemap)
+        previous = manifest.get(section)
+        if previous and previous['fingerprint'] == fingerprint and all(
+                os.path.exists(os.path.join(directory, shard['filename'])) for shard in previous['shards']):
+            continue
+        shards = []
+        for page in sitemap.paginator.page_range:
+            urls = sitemap.get_urls(page=page, site=site, protocol=protocol)
+            filename = SITEMAP_SHARD % (section, page)
+            write_file(os.path.join(directory, filename), render_to_string('sitemap.xml', {'urlset': urls}).encode('utf-8'), compress=True)
+            shards.append({'filename': filename, 'lastmod': latest_lastmod(urls)})
+        if previous:
+            for shard in previous['shards'][len(shards):]:
+                if os.path.exists(os.path.join(directory, shard['filename'])):
+                    os.remove(os.path.join(directory, shard['filename']))
+        manifest[section] = {'fingerprint': fingerprint, 'shards': shards}
+        rebuilt.append(section)
+    for section in set(manifest) - set(sitemaps):
+        del manifest[section]
+    if rebuilt or not os.path.exists(os.path.join(directory, SITEMAP_INDEX)):
+        lines = [u'<?xml version="1.0" encoding="UTF-8"?>', u'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for section in sorted(manifest):
+            for shard in manifest[section]['shards']:
+                lines.append(u'<sitemap><loc>%s</loc>%s</sitemap>' % (escape(shard_url(shard['filename'], site, protocol)),
+                    u'<lastmod>%s</lastmod>' % shard['lastmod'] if shard['lastmod'] else u''))
+        lines.append(u'</sitemapindex>\n')
+        write_file(os.path.join(directory, SITEMAP_INDEX), u'\n'.join(lines).encode('utf-8'))
+        write_file(manifest_path, json.dumps(manifest, indent=1, sort_keys=True))
+    return rebuilt
+
+def sitemap_index(request):
+    '''Serves the sitemap index written by build_sitemaps, or returns a 404 if the sitemaps have not been built yet.'''
+    path = os.path.join(settings.STATIC_ROOT or '', SITEMAP_INDEX)
+    if not settings.STATIC_ROOT or not os.path.exists(path):
+        raise Http404
+    with open(path, 'rb') as index:
+        return HttpResponse(index.read(), content_type='application/xml')
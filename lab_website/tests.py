@@ -4,13 +4,34 @@ This file contains the basic unit tests, which are imported into other apps.
 
 """
 
+import base64
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib2
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from StringIO import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.test.client import Client
 from django.contrib.auth.models import User
 
+from lab_website.pagination import InvalidCursor, paginate, iterate_in_chunks
+from lab_website.sitemaps import build_sitemaps
+from lab_website import outbound
+from communication.external import refresh
 from papers.models import Publication
 from personnel.models import Person
-from projects.models import Project
+from projects.models import Project, Funding
 
 MODELS = [Publication, Person, Project]
 
@@ -59,5 +80,245 @@ class HomeViewTests(BasicTests):
         self.assertTrue('fb_app_id' in test_response.context)
         self.assertTrue('fb_admins' in test_response.context)
         self.assertTrue('analytics_tracking' in test_response.context)        
-        self.assertTrue('analytics_root' in test_response.context)                          
+        self.assertTrue('analytics_root' in test_response.context)
+
+class KeysetPaginationTests(BasicTests):
+    '''This class tests the keyset pagination in :mod:`lab_website.pagination`.'''
+
+    def setUp(self):
+        '''Creates publications with repeated and missing publication dates and years.'''
+        super(KeysetPaginationTests, self).setUp()
+        for number in range(11):
+            test_publication = Publication(title='Test Publication %i' % number,
+                year = [None, 2010, 2012][number % 3],
+                publication_date = [None, datetime.date(2012, 1, 1), datetime.date(2013, 6, 1)][number % 3 if number % 2 else 0],
+                laboratory_paper=True, interesting_paper=False, preprint=False)
+            test_publication.save()
+        self.queryset = Publication.objects.all()
+
+    def test_forward_pages(self):
+        '''This tests that following the next cursors returns every object once, in the model ordering.'''
+        seen = []
+        page = paginate(self.queryset, 4)
+        self.assertFalse(page.has_previous)
+        seen.extend(page.object_list)
+        while page.has_next:
+            page = paginate(self.queryset, 4, after=page.next_cursor)
+            seen.extend(page.object_list)
+        self.assertEqual([paper.pk for paper in seen], [paper.pk for paper in self.queryset])
+
+    def test_backward_pages(self):
+        '''This tests that the previous cursor returns the preceding page.'''
+        first_page = paginate(self.queryset, 4)
+        second_page = paginate(self.queryset, 4, after=first_page.next_cursor)
+        previous_page = paginate(self.queryset, 4, before=second_page.previous_cursor)
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous)
+        self.assertTrue(previous_page.has_next)
+
+    def test_iterate_in_chunks(self):
+        '''This tests that a queryset can be walked in chunks.'''
+        chunks = list(iterate_in_chunks(self.queryset, 5))
+        self.assertEqual([len(chunk) for chunk in chunks], [5, 5, 1])
+        self.assertEqual([paper.pk for chunk in chunks for paper in chunk], [paper.pk for paper in self.queryset])
+
+    def test_paginated_view(self):
+        '''This tests that a list view is paginated and that an invalid cursor returns a 404 error.'''
+        test_response = self.client.get('/papers/')
+        self.assertEqual(test_response.status_code, 200)
+        self.assertFalse(test_response.context['is_paginated'])
+        self.assertEqual(len(test_response.context['publication_list']), 11)
+        next_cursor = paginate(self.queryset.filter(laboratory_paper=True), 5).next_cursor
+        test_response = self.client.get('/papers/', {'after': next_cursor})
+        self.assertEqual(test_response.status_code, 200)
+        self.assertTrue(test_response.context['is_paginated'])
+        self.assertEqual(len(test_response.context['publication_list']), 6)
+        test_response = self.client.get('/papers/', {'after': 'not-a-cursor'})
+        self.assertEqual(test_response.status_code, 404)
+
+    def test_cursor_with_wrong_types(self):
+        '''This tests that a well formed cursor whose values have the wrong types is rejected rather than raising an error.'''
+        cursor = base64.urlsafe_b64encode(json.dumps([1, None, '2026-10-18', 1])).rstrip('=')
+        self.assertRaises(InvalidCursor, paginate, self.queryset, 4, after=cursor)
+        self.assertEqual(self.client.get('/papers/', {'after': cursor}).status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/publications/', {'after': cursor, 'format': 'json'}).status_code, 400)
+
+class SitemapBuildTests(BasicTests):
+    '''This class tests writing the sitemaps to disk with :func:`~lab_website.sitemaps.build_sitemaps`.'''
+
+    fixtures = ['test_publication', 'test_publication_personnel']
+
+    def setUp(self):
+        super(SitemapBuildTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(SitemapBuildTests, self).tearDown()
+
+    def read_shard(self, filename):
+        archive = gzip.open(os.path.join(self.directory, filename))
+        try:
+            return archive.read()
+        finally:
+            archive.close()
+
+    def test_build_sitemaps(self):
+        '''This tests that each section is written as a compressed shard listed in the index with its lastmod.'''
+        self.assertEqual(build_sitemaps(self.directory), ['commentary', 'funding', 'papers', 'personnel', 'posts', 'projects', 'static'])
+        shard = self.read_shard('sitemap-papers-1.xml.gz')
+        self.assertTrue('http://example.com/papers/14-3-3-proteins-a-number-of-functions-for-a-numbered-protein' in shard)
+        self.assertTrue('<lastmod>2012-07-21</lastmod>' in shard)
+        self.assertTrue('/feeds' in self.read_shard('sitemap-static-1.xml.gz'))
+        with open(os.path.join(self.directory, 'sitemap.xml')) as index:
+            index = index.read()
+        self.assertTrue('<sitemap><loc>http://example.com/static/sitemap-papers-1.xml.gz</loc><lastmod>2012-07-21</lastmod></sitemap>' in index)
+        with self.settings(STATIC_ROOT=self.directory):
+            self.assertEqual(self.client.get('/sitemap.xml').content, index)
+
+    def test_unbuilt_sitemap_index(self):
+        '''This tests that the sitemaps are not generated on request if they have not been built.'''
+        with self.settings(STATIC_ROOT=self.directory):
+            self.assertEqual(self.client.get('/sitemap.xml').status_code, 404)
+        self.assertEqual(self.client.get('/sitemap-papers.xml').status_code, 404)
+
+    def test_incremental_build(self):
+        '''This tests that only changed sections are rebuilt and that sections are split into shards.'''
+        build_sitemaps(self.directory)
+        self.assertEqual(build_sitemaps(self.directory), [])
+        Publication.objects.create(title='New Sitemap Paper', laboratory_paper=True, interesting_paper=False, preprint=False)
+        self.assertEqual(build_sitemaps(self.directory, shard_size=1), ['papers'])
+        self.assertTrue('new-sitemap-paper' in self.read_shard('sitemap-papers-2.xml.gz'))
+        with open(os.path.join(self.directory, 'sitemap-manifest.json')) as manifest:
+            self.assertEqual(len(json.load(manifest)['papers']['shards']), 2)
+        Publication.objects.filter(title='New Sitemap Paper').delete()
+        self.assertEqual(build_sitemaps(self.directory), ['papers'])
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'sitemap-papers-2.xml.gz')))
+        self.assertEqual(len(build_sitemaps(self.directory, force=True)), 7)
+
+@override_settings(SHARED_CACHE=True)
+class OverviewTests(BasicTests):
+    '''This class tests the laboratory overview served by :func:`~lab_website.overview.lab_overview`.'''
+
+    fixtures = ['test_publication', 'test_publication_personnel', 'test_project', 'test_funding_agency', 'test_funding']
+
+    def setUp(self):
+        super(OverviewTests, self).setUp()
+        cache.clear()
+
+    def test_overview(self):
+        '''This tests that the overview contains every section, and is served from the cache when it is requested again.'''
+        response = self.client.get('/api/v1/overview/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        overview = json.loads(response.content)
+        self.assertEqual(sorted(overview), ['funding', 'members', 'papers', 'projects'])
+        lab_papers = Publication.objects.filter(laboratory_paper=True)
+        self.assertEqual([paper['id'] for paper in overview['papers']], [paper.pk for paper in lab_papers])
+        self.assertEqual(overview['papers'][0]['byline'], lab_papers[0].byline)
+        self.assertEqual(len(overview['members']), Person.objects.filter(current_lab_member=True).count())
+        self.assertEqual(len(overview['funding']), Funding.objects.filter(active=True).count())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/v1/overview/').content, response.content)
+            self.assertEqual(self.client.get('/api/v1/overview/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_overview_sections(self):
+        '''This tests that the sections and number of papers can be chosen, and that unknown sections and numbers below 1 are rejected.'''
+        overview = json.loads(self.client.get('/api/v1/overview/', {'sections': 'papers,members', 'papers': 1}).content)
+        self.assertEqual(sorted(overview), ['members', 'papers'])
+        self.assertEqual(len(overview['papers']), 1)
+        overview = json.loads(self.client.get('/api/v1/overview/', {'sections': 'papers, members,'}).content)
+        self.assertEqual(sorted(overview), ['members', 'papers'])
+        self.assertEqual(self.client.get('/api/v1/overview/', {'sections': 'papers,secrets'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/overview/', {'papers': 'all'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/overview/', {'papers': -5}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/overview/', {'papers': 0}).status_code, 400)
+
+    def test_overview_invalidated(self):
+        '''This tests that changing the active funding changes the overview.'''
+        response = self.client.get('/api/v1/overview/')
+        Funding.objects.filter(active=True).delete()
+        changed = self.client.get('/api/v1/overview/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(json.loads(changed.content)['funding'], [])
+
+class OutboundStandInHandler(BaseHTTPRequestHandler):
+    '''This is a stand-in for another site, which answers /slow slowly, /broken with a 500 and /missing with a 404.'''
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == '/slow':
+            time.sleep(1)
+        status = {'/broken': 500, '/missing': 404}.get(self.path, 200)
+        body = 'Response to %s' % self.path
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class OutboundStandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class OutboundTests(BasicTests):
+    '''This class tests the timeouts, circuit breakers and counters of :mod:`lab_website.outbound`.'''
+
+    def setUp(self):
+        super(OutboundTests, self).setUp()
+        self.server = OutboundStandInServer(('127.0.0.1', 0), OutboundStandInHandler)
+        self.server.requests = []
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.host = '127.0.0.1:%i' % self.server.server_address[1]
+        cache.clear()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(OutboundTests, self).tearDown()
+
+    def test_request_counted(self):
+        '''This tests that a response is read and returned, and counted for its host.'''
+        response = outbound.urlopen('http://%s/page' % self.host)
+        self.assertEqual(response.read(), 'Response to /page')
+        self.assertEqual(response.getcode(), 200)
+        with self.assertRaises(urllib2.HTTPError):
+            outbound.urlopen('http://%s/missing' % self.host)
+        stats = outbound.outbound_stats()[self.host]
+        self.assertEqual((stats['requests'], stats['errors'], stats['short_circuits'], stats['open']), (2, 0, 0, False))
+        self.assertTrue(stats['mean_latency_ms'] < 1000)
+        self.assertRaises(ValueError, outbound.urlopen, 'not a url')
+
+    def test_read_timeout(self):
+        '''This tests that the read timeout of a host applies to slow responses.'''
+        with self.settings(OUTBOUND_TIMEOUTS={self.host: (1, 0.2)}):
+            start = time.time()
+            self.assertRaises(urllib2.URLError, outbound.urlopen, 'http://%s/slow' % self.host)
+            self.assertTrue(time.time() - start < 0.8)
+        self.assertEqual(outbound.outbound_stats()[self.host]['errors'], 1)
 
+    def test_circuit_breaker(self):
+        '''This tests that repeated failures open the breaker, which short circuits requests until it resets.'''
+        with self.settings(OUTBOUND_FAILURE_THRESHOLD=2, OUTBOUND_BREAKER_RESET=60):
+            for attempt in range(2):
+                self.assertRaises(urllib2.HTTPError, outbound.urlopen, 'http://%s/broken' % self.host)
+            self.assertRaises(outbound.CircuitOpen, outbound.urlopen, 'http://%s/page' % self.host)
+            self.assertEqual(len(self.server.requests), 2)
+            with self.settings(LAB_RULES_FILE='http://%s/rules.rst' % self.host):
+                self.assertEqual(refresh(names=['lab-rules']), {'lab-rules': False})
+                self.assertEqual(self.client.get('/lab-rules/').context['lab_rules'], 'Lab Rules File is not Available.')
+            stats = outbound.outbound_stats()[self.host]
+            self.assertEqual((stats['requests'], stats['errors'], stats['short_circuits'], stats['open']), (2, 2, 2, True))
+            output = StringIO()
+            call_command('outbound_stats', stdout=output)
+            self.assertTrue(self.host in output.getvalue())
+            cache.delete(outbound.OUTBOUND_KEY % (self.host, 'open'))
+            self.assertRaises(urllib2.HTTPError, outbound.urlopen, 'http://%s/broken' % self.host)
+            self.assertRaises(outbound.CircuitOpen, outbound.urlopen, 'http://%s/page' % self.host)
+            cache.delete(outbound.OUTBOUND_KEY % (self.host, 'open'))
+            self.assertEqual(outbound.urlopen('http://%s/page' % self.host).read(), 'Response to /page')
+            self.assertRaises(urllib2.HTTPError, outbound.urlopen, 'http://%s/broken' % self.host)
+            self.assertEqual(outbound.urlopen('http://%s/page' % self.host).read(), 'Response to /page')
@@ -1,25 +1,20 @@
 '''This package has the url encodings for the main app.'''
 from django.conf.urls import include, url
-from django.core.urlresolvers import reverse
 from django.contrib import admin
-from django.contrib.sitemaps import views as sitemap_views
-from django.contrib.sitemaps import Sitemap
 from django.conf.urls.static import static
 from django.conf import settings
 
-#from tastypie.api import Api
+from tastypie.api import Api
 
 import communication
 from communication.views import FeedDetailView, LabLocationView
 
-from personnel.sitemap import LabPersonnelSitemap
-from papers.sitemap import LabPublicationsSitemap, CommentarySitemap
-from projects.sitemap import ProjectsSitemap, FundingSitemap
-from communication.sitemap import PostsSitemap
+from lab_website.sitemaps import sitemap_index
+from lab_website.overview import lab_overview
 
-#from papers.api import PublicationResource
-#from projects.api import ProjectResource
-#from personnel.api import PersonnelResource
+from papers.api import PublicationResource
+from projects.api import ProjectResource
+from personnel.api import PersonnelResource
 
 from papers.feeds import LabPapersFeed, InterestingPapersFeed, CommentaryFeed
 from projects.feeds import ProjectsFeed
@@ -27,33 +22,10 @@ from communication.feeds import PostsFeed
 
 from views import IndexView
 
-class StaticViewSitemap(Sitemap):
-    '''This sitemap is for all static pages, including list views home and feeds.'''   
- 
-    priority = 0.4
-    changefreq = 'weekly'
-
-    def items(self):
-        return ['location','feed-details','laboratory-papers','interesting-papers','commentary-list','laboratory-personnel','laboratory-alumni','project-list', 'post-list', 'twitter','google-calendar','wikipedia','lab-rules','publication-policy','data-resource-policy','lab-news','contact-info','funding-list']
-
-    def location(self, item):
-        return reverse(item)
-
-#v1_api = Api(api_name='v1')
-#v1_api.register(PublicationResource())
-#v1_api.register(ProjectResource())
-#v1_api.register(PersonnelResource())
-
-#this dictionary lists sitemap files which will be generated.
-sitemaps = {
-    'personnel': LabPersonnelSitemap,
-    'papers': LabPublicationsSitemap,
-    'commentary': CommentarySitemap,
-    'posts': PostsSitemap,
-    'projects': ProjectsSitemap,
-    'funding': FundingSitemap,
-    'static': StaticViewSitemap
-    }
+v1_api = Api(api_name='v1')
+v1_api.register(PublicationResource())
+v1_api.register(ProjectResource())
+v1_api.register(PersonnelResource())
 
 # Uncomment the next two lines to enable the admin:
 # from django.contrib import admin
@@ -76,10 +48,15 @@ urlpatterns = [
     
     url(r'^feeds/?$', FeedDetailView.as_view(), name="feed-details"),
     url(r'^feeds/lab-papers/?$', LabPapersFeed(), name="lab-papers-feed"),
+    url(r'^feeds/lab-papers/archive/(?P<page>\d+)/?$', LabPapersFeed(), name="lab-papers-feed-archive"),
     url(r'^feeds/interesting-papers/?$', InterestingPapersFeed(), name="interesting-papers-feed"),
+    url(r'^feeds/interesting-papers/archive/(?P<page>\d+)/?$', InterestingPapersFeed(), name="interesting-papers-feed-archive"),
     url(r'^feeds/commentaries/?$', CommentaryFeed(), name="commentary-feed"),
-    url(r'^feeds/projects/?', ProjectsFeed(), name="projects-feed"),
-    url(r'^feeds/posts/?', PostsFeed(), name="posts-feed"),    
+    url(r'^feeds/commentaries/archive/(?P<page>\d+)/?$', CommentaryFeed(), name="commentary-feed-archive"),
+    url(r'^feeds/projects/?$', ProjectsFeed(), name="projects-feed"),
+    url(r'^feeds/projects/archive/(?P<page>\d+)/?$', ProjectsFeed(), name="projects-feed-archive"),
+    url(r'^feeds/posts/?$', PostsFeed(), name="posts-feed"),    
+    url(r'^feeds/posts/archive/(?P<page>\d+)/?$', PostsFeed(), name="posts-feed-archive"),
       
     url(r'^twitter/?$', communication.views.TwitterView.as_view(), name="twitter"),
     url(r'^calendar/?$', communication.views.GoogleCalendarView.as_view(), name="google-calendar"),
@@ -90,9 +67,9 @@ urlpatterns = [
     url(r'^news/?$', communication.views.NewsView.as_view(), name='lab-news'),
 
  
-    #url(r'^api/',include(v1_api.urls)),   
-    url(r'^sitemap\.xml$', sitemap_views.index, {'sitemaps': sitemaps}),
-    url(r'^sitemap-(?P<section>.+)\.xml$', sitemap_views.sitemap, {'sitemaps': sitemaps}),
+    url(r'^api/v1/overview/?$', lab_overview, name='api-overview'),
+    url(r'^api/',include(v1_api.urls)),   
+    url(r'^sitemap\.xml$', sitemap_index, name='sitemap-index'),
     url(r'^$', IndexView.as_view(), name="home")
 ]
 
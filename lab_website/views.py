@@ -2,8 +2,6 @@
 
 So far this includes the home page.'''
 
-import json
-import urllib, urllib2
 import time
 import datetime
 
@@ -13,6 +11,7 @@ from django.views.generic.base import View, TemplateView
 from personnel.models import JobPosting
 from papers.models import Publication, Commentary
 from communication.models import Post
+from communication.external import read
 
 class IndexView(TemplateView):
     '''This view redirects to the home page.'''
@@ -21,37 +20,14 @@ class IndexView(TemplateView):
     def get_context_data(self, **kwargs):
         '''This function provides the context which is passed to this view.
         
-        This will query facebook's pages API for information regarding the group.
-        From facebook there will be separate queries for posts, photos, milestones and general information.
-        The Twitter API will be used to request facebook 
+        This will include the general information regarding the group from facebook's pages API, as stored by the refresh_external command (see :mod:`communication.external`).
         There will also be an internal query for lab publications.'''
         
         context = super(IndexView, self).get_context_data(**kwargs)
-        
-        def facebook_request(request_url):
-            '''This function takes a request url and token and returns deserialized data.'''
-            request = urllib2.Request(request_url)
-            try:
-                    response = urllib2.urlopen(request)
-            except urllib2.URLError, e:
-                    if e.code == 404:
-                        data = "Facebook API is not Available."
-                    else:
-                        #this is for a non-404 URLError.
-                        data = "Facebook API is not Available."
-            except ValueError:
-                    lab_rules = "Facebook API is not Available."        
-            else:
-                     #successful connection
-                     json_data = response.read()
-                     data = json.loads(json_data)
-                     return data
-         
-        general_request_url = 'https://graph.facebook.com/v2.3/' + settings.FACEBOOK_ID + '?access_token=' + settings.FACEBOOK_ACCESS_TOKEN
         context['recent_papers'] =  Publication.objects.filter(laboratory_paper=True)[0:10]  
         context['recent_posts'] =  Post.objects.all()[0:5]  
         context['recent_comments'] =  Commentary.objects.all()[0:5]                 
-        context['general_data'] = facebook_request(general_request_url)
+        context['general_data'] = read('facebook-general')['facebook-general']
         context['postings'] = JobPosting.objects.filter(active=True)
 	context['twitter'] = settings.TWITTER_NAME
     	context['google_plus'] = settings.GOOGLE_PLUS_ID
@@ -19,4 +19,6 @@ Longer Term Goals
 * Potentially convert to a facebook app with custom actions and objects.
 * Markup with opengraph tags and incorporate twitter cards.
 * The :class:`~papers.models.Publication` objects are manually entered but I hope to have these be automatically be generated from CrossRef or Mendeley APIs
-'''
\ No newline at end of file
+'''
+
+default_app_config = 'papers.apps.PapersConfig'
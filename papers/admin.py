@@ -1 +1 @@
-'''This package sets up the admin interface for the :mod:`papers` app.'''from django.contrib import adminfrom papers.models import Publication, AuthorDetails, AuthorContributionsclass PublicationAdmin(admin.ModelAdmin):    '''The :class:`~papers.models.Publication` model admin is the default.'''    passadmin.site.register(Publication, PublicationAdmin)class AuthorDetailsAdmin(admin.ModelAdmin):    '''The :class:`~papers.models.AuthorDetails` model admin is the default.'''    passadmin.site.register(AuthorDetails, AuthorDetailsAdmin)class AuthorContributionsAdmin(admin.ModelAdmin):    passadmin.site.register(AuthorContributions, AuthorContributionsAdmin)
\ No newline at end of file
+'''This package sets up the admin interface for the :mod:`papers` app.'''from django.contrib import adminfrom papers.models import Publication, AuthorDetails, AuthorContributionsclass PublicationAdmin(admin.ModelAdmin):    '''The :class:`~papers.models.Publication` model admin loads the choices of authors with their people and publications.'''    def formfield_for_manytomany(self, db_field, request=None, **kwargs):        if db_field.name == 'authors':            kwargs['queryset'] = AuthorDetails.objects.select_related('author').prefetch_related('publication_set')        return super(PublicationAdmin, self).formfield_for_manytomany(db_field, request, **kwargs)admin.site.register(Publication, PublicationAdmin)class AuthorDetailsAdmin(admin.ModelAdmin):    '''The :class:`~papers.models.AuthorDetails` model admin loads the people and publications of the listed details with a fixed number of queries.'''    def get_queryset(self, request):        return super(AuthorDetailsAdmin, self).get_queryset(request).select_related('author').prefetch_related('publication_set')admin.site.register(AuthorDetails, AuthorDetailsAdmin)class AuthorContributionsAdmin(admin.ModelAdmin):    passadmin.site.register(AuthorContributions, AuthorContributionsAdmin)
\ No newline at end of file
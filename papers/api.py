@@ -23,7 +23,7 @@ For a collection of publications you can request::
     http://yourserver.org/api/v1/publications/?format=json 
     
 This would return all publications in the database.  This would return the following json response with two JSON objects, meta and objects.
-The meta object contains fields for the limit, next, offset, previous and total_count for the series of objects requested.  The objects portion is an array of the returned publications.  Note the id field of a publication.  This is used for retrieving a single publication.  Collections can also be filtered based on type or year::
+The meta object contains fields for the limit, next and previous for the series of objects requested, where next and previous are the urls of the adjacent pages.  The objects portion is an array of the returned publications.  Note the id field of a publication.  This is used for retrieving a single publication.  Collections can also be filtered based on type or year::
 
     http://yourserver.org/api/v1/publications/?format=json&year=2012     
     http://yourserver.org/api/v1/publications/?format=json&type=journal-article 
@@ -48,7 +48,7 @@ Reference
 Request Parameters
 ``````````````````
 
-The following are the potential request variables.  You must supply a format, but can also filter based on other parameters.  By default 20 items are returned but you can increase this to all by setting limit=0.
+The following are the potential request variables.  You must supply a format, but can also filter based on other parameters.  By default 20 items are returned, and up to 1000 can be requested with limit.  Further pages are requested with the after or before cursors given in the next and previous urls.
 
 +------------------+-----------------------------------------+
 | Parameter        | Potential Values                        |
@@ -61,8 +61,30 @@ The following are the potential request variables.  You must supply a format, bu
 +------------------+-----------------------------------------+
 | laboratory_paper | **true** or **false**                   |
 +------------------+-----------------------------------------+
-| limit            | **0** for all, any other number         |
+| limit            | any number up to **1000**               |
 +------------------+-----------------------------------------+
+| after            | the cursor from a next url              |
++------------------+-----------------------------------------+
+| before           | the cursor from a previous url          |
++------------------+-----------------------------------------+
+| fields           | **title,doi** or other response values  |
++------------------+-----------------------------------------+
+| include          | **authors**                             |
++------------------+-----------------------------------------+
+| stream           | **true** to stream all publications     |
++------------------+-----------------------------------------+
+
+Setting fields returns only those response values (and resource_uri) for each publication, which is much smaller and faster than the full response, as the abstract is not loaded.  For example::
+
+    http://yourserver.org/api/v1/publications/?format=json&laboratory_paper=true&fields=title,doi,year
+
+Setting include=authors adds an authors list to each publication, in the order of the byline.  Each author has the id, name, name_slug and orcid_id of the person, and their order, corresponding_author and equal_contributors.  The authors of a whole page are loaded with one query.  For example::
+
+    http://yourserver.org/api/v1/publications/?format=json&include=authors
+
+Setting stream=true returns every matching publication in a single response, without a meta object, in json or xml.  This is sent as it is generated, so it should be used to export large collections rather than setting a large limit.  For example::
+
+    http://yourserver.org/api/v1/publications/?format=xml&laboratory_paper=true&stream=true
 
 Response Values
 ```````````````
@@ -117,16 +139,24 @@ The response (in either json or xml) provides the following fields for each obje
 
 '''
 
+from django.db.models import Prefetch
+from tastypie.exceptions import BadRequest
 from tastypie.resources import ModelResource
 
-from papers.models import Publication
+from lab_website.api import CachedResourceMixin, CursorPaginator, SparseFieldsMixin, StreamingListMixin
+from papers.models import Publication, AuthorDetails
 
-class PublicationResource(ModelResource):
+class PublicationResource(CachedResourceMixin, StreamingListMixin, SparseFieldsMixin, ModelResource):
     '''This generates the API resource for :class:`~papers.models.Publication` objects.
     
     It returns all publications in the database.
-    Authors are currently not linked, as that would require an API to the :mod:`personnel` app.
+    Authors are embedded (rather than linked) when include=authors is requested, with one prefetch query for each page.
+    Responses are cached until a publication or author changes, see :class:`~lab_website.api.CachedResourceMixin`.
+    A subset of fields can be requested, see :class:`~lab_website.api.SparseFieldsMixin`, and the whole collection can be streamed, see :class:`~lab_website.api.StreamingListMixin`.
     '''
+    depends_on = ('papers.Publication', 'papers.AuthorDetails', 'personnel.Person')
+    field_columns = {'absolute_url': ('title_slug',)}
+    includes = ('authors',)
     
     class Meta:
         '''The API serves all :class:`~papers.models.Publication` objects in the database..'''
@@ -134,10 +164,42 @@ class PublicationResource(ModelResource):
         resource_name = 'publications'
         list_allowed_methods = ['get']
         detail_allowed_methods = ['get'] 
+        paginator_class = CursorPaginator
         include_absolute_url = True
         filtering = {
             "year": 'exact',
             "type": ('exact', 'contains',),
             "laboratory_paper": 'exact',
-        }      
-               
\ No newline at end of file
+        }
+
+    def requested_includes(self, request):
+        '''Returns the set of related records requested with the include parameter.'''
+        if request is None or not request.GET.get('include'):
+            return set()
+        requested = set(name.strip() for name in request.GET['include'].split(',') if name.strip())
+        if not requested <= set(self.includes):
+            raise BadRequest("Only %s can be included." % ', '.join(self.includes))
+        return requested
+
+    def apply_filters(self, request, applicable_filters):
+        '''Prefetches the ordered authors and their people, if they are included.'''
+        object_list = super(PublicationResource, self).apply_filters(request, applicable_filters)
+        if 'authors' in self.requested_includes(request):
+            object_list = object_list.prefetch_related(Prefetch('authors',
+                queryset=AuthorDetails.objects.select_related('author').order_by('order', 'pk'),
+                to_attr='ordered_authors'))
+        return object_list
+
+    def dehydrate(self, bundle):
+        '''Embeds the prefetched authors, if they are included.'''
+        if 'authors' in self.requested_includes(bundle.request):
+            bundle.data['authors'] = [{
+                'id': details.author.pk,
+                'name': details.author.full_name(),
+                'name_slug': details.author.name_slug,
+                'orcid_id': details.author.orcid_id,
+                'order': details.order,
+                'corresponding_author': details.corresponding_author,
+                'equal_contributors': details.equal_contributors,
+                } for details in bundle.obj.ordered_authors]
+        return bundle
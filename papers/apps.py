@@ -0,0 +1,12 @@
+'''This package contains the application configuration for the :mod:`papers` app.'''
+
+from django.apps import AppConfig
+
+class PapersConfig(AppConfig):
+    '''The configuration connects the signal handlers in :mod:`papers.signals` when the app is loaded.'''
+
+    name = 'papers'
+    verbose_name = 'Papers'
+
+    def ready(self):
+        import papers.signals
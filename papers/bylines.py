@@ -0,0 +1,105 @@
+'''This package maintains the precomputed author byline of each :class:`~papers.models.Publication`.
+
+Rendering the authors of a paper from :class:`~papers.models.AuthorDetails` joins the author tables on every page and feed.
+Instead the byline is stored in the byline and byline_html fields of the publication, and is updated by the signal handlers in :mod:`papers.signals` whenever the authors, their details or their names change.
+Corresponding authors are marked with an asterisk and equally contributing authors with a dagger.
+
+Bylines can be rebuilt for all publications with::
+
+    python manage.py update_bylines
+'''
+
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.utils.html import escape
+
+from lab_website.cache import bump_generation
+from lab_website.pagination import iterate_in_chunks
+from papers.models import Publication
+
+CORRESPONDING_MARK = u'*'
+EQUAL_CONTRIBUTION_MARK = u'\u2020'
+
+def author_name(first_name, last_name):
+    '''Returns the name of an author as shown by :meth:`~personnel.models.Person.full_name`.'''
+    if last_name is None:
+        return u'No Name Given'
+    return u'%s %s' % (first_name, last_name)
+
+def join_names(names):
+    '''Joins names as "A", "A and B" or "A, B and C".'''
+    if len(names) < 2:
+        return u''.join(names)
+    return u'%s and %s' % (u', '.join(names[:-1]), names[-1])
+
+def format_byline(authors):
+    '''Returns a tuple of the plain text and HTML bylines for a list of ordered authors.
+
+    Each author is a dictionary with first_name, last_name, name_slug, current_lab_member, corresponding_author and equal_contributors.
+    Current laboratory members are linked to their personnel-details page.
+    '''
+    plain = []
+    html = []
+    for author in authors:
+        name = author_name(author['first_name'], author['last_name'])
+        marks = []
+        if author['corresponding_author']:
+            marks.append((CORRESPONDING_MARK, u'Corresponding author'))
+        if author['equal_contributors']:
+            marks.append((EQUAL_CONTRIBUTION_MARK, u'Equal contribution'))
+        plain.append(name + u''.join(mark for mark, title in marks))
+        if author['current_lab_member'] and author['name_slug']:
+            name_html = u'<a itemprop="author" itemscope itemtype="http://schema.org/Person" href="%s" class="plain-link"><span itemprop="name">%s</span></a>' % (
+                reverse('personnel-details', args=[author['name_slug']]), escape(name))
+        else:
+            name_html = escape(name)
+        html.append(name_html + u''.join(u'<sup title="%s">%s</sup>' % (title, mark) for mark, title in marks))
+    return join_names(plain), join_names(html)
+
+def load_bylines(publication_ids):
+    '''Returns a dictionary of the (byline, byline_html) of each publication, keyed by pk, with a single query.'''
+    publication_ids = list(publication_ids)
+    authors = dict((publication_id, []) for publication_id in publication_ids)
+    rows = Publication.authors.through.objects.filter(publication__in=publication_ids).order_by(
+        'authordetails__order', 'authordetails__pk').values_list(
+        'publication_id', 'authordetails__corresponding_author', 'authordetails__equal_contributors',
+        'authordetails__author__first_name', 'authordetails__author__last_name',
+        'authordetails__author__name_slug', 'authordetails__author__current_lab_member')
+    for publication_id, corresponding_author, equal_contributors, first_name, last_name, name_slug, current_lab_member in rows:
+        authors[publication_id].append({
+            'first_name': first_name,
+            'last_name': last_name,
+            'name_slug': name_slug,
+            'current_lab_member': current_lab_member,
+            'corresponding_author': corresponding_author,
+            'equal_contributors': equal_contributors,
+        })
+    return dict((publication_id, format_byline(publication_authors)) for publication_id, publication_authors in authors.items())
+
+def update_bylines(publication_ids):
+    '''Recomputes and stores the bylines of a list of publications, returning the number updated.
+
+    The bylines are written with a single executemany, so no signals are sent and date_last_modified is unchanged.
+    The ids should be passed in chunks of at most 500, see :func:`~papers.utilities.chunks`.
+    '''
+    bylines = load_bylines(publication_ids)
+    opts = Publication._meta
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany('UPDATE %s SET %s = %%s, %s = %%s WHERE %s = %%s' % (quote_name(opts.db_table),
+            quote_name(opts.get_field('byline').column), quote_name(opts.get_field('byline_html').column), quote_name(opts.pk.column)),
+            [(byline, byline_html, publication_id) for publication_id, (byline, byline_html) in bylines.items()])
+    return len(bylines)
+
+def update_byline(publication):
+    '''Recomputes and stores the byline of a single publication, also setting it on the instance.'''
+    publication.byline, publication.byline_html = load_bylines([publication.pk])[publication.pk]
+    Publication.objects.filter(pk=publication.pk).update(byline=publication.byline, byline_html=publication.byline_html)
+
+def rebuild_bylines():
+    '''Recomputes the bylines of every :class:`~papers.models.Publication` in chunks, returning the number updated.'''
+    count = 0
+    for chunk in iterate_in_chunks(Publication.objects.order_by('pk').only('pk')):
+        count += update_bylines([publication.pk for publication in chunk])
+    bump_generation('papers.Publication')
+    return count
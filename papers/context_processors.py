@@ -1,6 +1,7 @@
 '''This file contains context processors to pass api keys to templates as part of the :mod:`papers` app.
 
-This is needed to properly render the PLOS API requests.
+This is needed to properly render the Impact Story widgets.
+The PLOS API key is not passed, as article level metrics are fetched on the server, see :mod:`papers.metrics`.
 '''
 
 from django.conf import settings
@@ -11,6 +12,5 @@ def api_keys(request):
     If no accounts are specified then empty strings should be passed.
     '''
     dict = {}
-    dict['plos_api_key'] = settings.PLOS_API_KEY
     dict['impact_story_api_key'] = settings.IMPACT_STORY_API_KEY
     return dict
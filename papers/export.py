@@ -0,0 +1,155 @@
+'''This package exports sets of :class:`~papers.models.Publication` objects as BibTeX, RIS or CSL-JSON.
+
+The exports are generated one record at a time from a chunked queryset, see :func:`~lab_website.pagination.iterate_in_chunks`, so memory use does not grow with the number of publications.
+Each format is described by an :class:`~papers.export.ExportFormat` in EXPORT_FORMATS, keyed by its file extension.
+'''
+
+import json
+import re
+import unicodedata
+from collections import namedtuple
+
+from django.db.models import Prefetch
+
+from lab_website.pagination import iterate_in_chunks
+from papers.models import AuthorDetails
+
+ExportFormat = namedtuple('ExportFormat', ['content_type', 'header', 'separator', 'footer', 'writer'])
+
+BIBTEX_TYPES = {
+    'journal-article': 'article',
+    'book-section': 'incollection',
+    'book': 'book',
+    'conference-proceedings': 'inproceedings',
+    'report': 'techreport',
+}
+
+RIS_TYPES = {
+    'journal-article': 'JOUR',
+    'book-section': 'CHAP',
+    'book': 'BOOK',
+    'conference-proceedings': 'CONF',
+    'report': 'RPRT',
+    'patent': 'PAT',
+    'computer-program': 'COMP',
+    'magazine-article': 'MGZN',
+    'newspaper-article': 'NEWS',
+    'web-page': 'ELEC',
+}
+
+CSL_TYPES = {
+    'journal-article': 'article-journal',
+    'book-section': 'chapter',
+    'book': 'book',
+    'conference-proceedings': 'paper-conference',
+    'report': 'report',
+    'patent': 'patent',
+    'magazine-article': 'article-magazine',
+    'newspaper-article': 'article-newspaper',
+    'web-page': 'webpage',
+}
+
+BIBTEX_SPECIAL_CHARACTERS = re.compile(r'([\\{}%&$#_])')
+
+def export_queryset(queryset):
+    '''Returns the queryset with only the authors and their names prefetched, which is all the writers use.'''
+    return queryset.prefetch_related(Prefetch('authors', queryset=AuthorDetails.objects.select_related('author')))
+
+def author_names(publication):
+    '''Returns a list of (last_name, first_name) for the authors of a publication, in order.'''
+    return [(details.author.last_name or u'', details.author.first_name or u'') for details in publication.authors.all()]
+
+def bibtex_escape(value):
+    '''Escapes the characters which have a special meaning in BibTeX.'''
+    return BIBTEX_SPECIAL_CHARACTERS.sub(r'\\\1', u'%s' % value)
+
+def bibtex_key(publication, authors):
+    '''Returns a citation key of the first author's last name, the year and the pk, ie Bridges2005-1.'''
+    name = authors[0][0] if authors else u'paper'
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore')
+    name = re.sub(r'[^A-Za-z]', '', name) or 'paper'
+    return u'%s%s-%i' % (name, publication.year or '', publication.pk)
+
+def bibtex_record(publication):
+    '''Returns the BibTeX entry for a publication.'''
+    authors = author_names(publication)
+    fields = [
+        ('title', publication.title),
+        ('author', u' and '.join(u'%s, %s' % name if name[1] else name[0] for name in authors)),
+        ('journal', publication.journal),
+        ('year', publication.year),
+        ('volume', publication.volume),
+        ('number', publication.issue),
+        ('pages', publication.pages.replace('-', '--') if publication.pages else None),
+        ('doi', publication.doi),
+        ('pmid', publication.pmid),
+        ('pmcid', publication.full_pmcid() if publication.pmcid else None),
+        ('abstract', publication.abstract),
+    ]
+    lines = [u'@%s{%s,' % (BIBTEX_TYPES.get(publication.type, 'misc'), bibtex_key(publication, authors))]
+    lines.extend(u'  %s = {%s},' % (name, bibtex_escape(value)) for name, value in fields if value)
+    lines.append(u'}\n')
+    return u'\n'.join(lines)
+
+def ris_record(publication):
+    '''Returns the RIS record for a publication.'''
+    lines = [(u'TY', RIS_TYPES.get(publication.type, 'GEN')), (u'TI', publication.title)]
+    lines.extend((u'AU', u'%s, %s' % name if name[1] else name[0]) for name in author_names(publication))
+    if publication.pages:
+        pages = publication.pages.split('-', 1)
+        lines.append((u'SP', pages[0]))
+        if len(pages) > 1:
+            lines.append((u'EP', pages[1]))
+    lines.extend([
+        (u'JO', publication.journal),
+        (u'PY', publication.year),
+        (u'VL', publication.volume),
+        (u'IS', publication.issue),
+        (u'DO', publication.doi),
+        (u'AN', u'PMID:%s' % publication.pmid if publication.pmid else None),
+        (u'AB', publication.abstract),
+    ])
+    lines.append((u'ER', u''))
+    return u''.join(u'%s  - %s\n' % (tag, value) for tag, value in lines if value is not None and (value or tag == u'ER'))
+
+def csl_json_record(publication):
+    '''Returns the CSL-JSON item for a publication.'''
+    item = {
+        'id': 'publication-%i' % publication.pk,
+        'type': CSL_TYPES.get(publication.type, 'article'),
+        'title': publication.title,
+        'author': [{'family': last_name, 'given': first_name} for last_name, first_name in author_names(publication)],
+        'container-title': publication.journal,
+        'volume': publication.volume,
+        'issue': publication.issue,
+        'page': publication.pages,
+        'DOI': publication.doi,
+        'PMID': str(publication.pmid) if publication.pmid else None,
+        'PMCID': publication.full_pmcid() if publication.pmcid else None,
+        'abstract': publication.abstract,
+    }
+    if publication.year:
+        item['issued'] = {'date-parts': [[publication.year]]}
+    return json.dumps(dict((key, value) for key, value in item.items() if value), sort_keys=True)
+
+#these are the available formats, keyed by file extension
+EXPORT_FORMATS = {
+    'bib': ExportFormat('application/x-bibtex; charset=utf-8', u'', u'\n', u'', bibtex_record),
+    'ris': ExportFormat('application/x-research-info-systems; charset=utf-8', u'', u'\n', u'', ris_record),
+    'json': ExportFormat('application/vnd.citationstyles.csl+json; charset=utf-8', u'[\n', u',\n', u'\n]\n', csl_json_record),
+}
+
+def export_publications(queryset, extension, chunk_size=200):
+    '''Yields the publications of a queryset in the given format as UTF-8 encoded strings, one record at a time.'''
+    export_format = EXPORT_FORMATS[extension]
+    if export_format.header:
+        yield export_format.header.encode('utf-8')
+    first = True
+    for chunk in iterate_in_chunks(export_queryset(queryset), chunk_size):
+        for publication in chunk:
+            if not first:
+                yield export_format.separator.encode('utf-8')
+            first = False
+            yield export_format.writer(publication).encode('utf-8')
+    if export_format.footer:
+        yield export_format.footer.encode('utf-8')
@@ -13,18 +13,22 @@ The available feeds are as follows:
 +--------------------+---------------------------+---------------------------------------------+
 
 A main page describing all feeds is available at **/feeds**.
+The feeds answer conditional requests, are cached and contain the latest items, with older items in archives at **<feed location>/archive/<page>**, see :class:`~lab_website.feeds.ConditionalFeed`.
 '''
 
 from datetime import datetime, time
 
-from django.contrib.syndication.views import Feed
 from django.core.urlresolvers import reverse
 from django.conf import settings
 
+from lab_website.feeds import ConditionalFeed
 from papers.models import Publication, Commentary
 
-class PapersFeed(Feed):
+class PapersFeed(ConditionalFeed):
     '''This is the main class for all feeds related to :class:`~papers.models.Publication`.'''
+
+    depends_on = ('papers.Publication', 'papers.AuthorDetails', 'personnel.Person')
+    modified_fields = ('date_last_modified',)
     
     def item_title(self, item):
         '''The feed item title is the title of the paper.'''
@@ -34,14 +38,19 @@ class PapersFeed(Feed):
         '''The feed description is the abstract of the paper.'''
         return item.abstract
 
+    def item_author_name(self, item):
+        '''The authors are the stored byline of the paper.'''
+        return item.byline
+
 class LabPapersFeed(PapersFeed):
     '''This generates a feed for papers from this group.'''
 
     title = "Papers From the %s" % settings.LAB_NAME
     link = "/feeds/lab-papers"
     description = "This feed contains papers published by members of the %s." % settings.LAB_NAME
+    url_name = 'lab-papers-feed'
 
-    def items(self):
+    def source_queryset(self):
         '''The items returned by this feed are papers set as laboratory papers.'''
         return Publication.objects.filter(laboratory_paper=True)
         
@@ -51,21 +60,26 @@ class InterestingPapersFeed(PapersFeed):
     title = "Papers of Interest"
     link = "/feeds/interesting-papers"
     description = "This feed contains papers that the %s is particularly interested in." % settings.LAB_NAME
+    url_name = 'interesting-papers-feed'
 
-    def items(self):
+    def source_queryset(self):
         '''The items returned by this feed are papers set as interesting.'''
         return Publication.objects.filter(interesting_paper=True)
 
-class CommentaryFeed(Feed):
+class CommentaryFeed(ConditionalFeed):
     '''This class defines the feed for commentaries.'''
 
+    depends_on = ('papers.Commentary', 'papers.Publication', 'personnel.Person')
+    modified_fields = ('modified',)
+
     title = "Commentaries by the %s" % settings.LAB_NAME
     link = "/feeds/commentaries"
     description = "Comments, written by members of the %s on papers.  These are typically the results of our internal journal club discussions."
+    url_name = 'commentary-feed'
 
-    def items(self):
-        '''The items returned by this feed are all Commentary objects.'''
-        return Commentary.objects.all()
+    def source_queryset(self):
+        '''The items returned by this feed are all Commentary objects, loaded with their authors and papers in the same query.'''
+        return Commentary.objects.select_related('author', 'paper')
 
     def item_title(self, item):
         '''The title of each item will be "Commentary on XXX" or the unicode representation''' 
@@ -73,15 +87,16 @@ class CommentaryFeed(Feed):
 
     def item_description(self,item):
         '''The content of the feed is the actual comments.'''
-        return item.comments + item.citation
+        return item.comments + (item.citation or '')
 
     def item_author_name(self, item):
-        '''The author of the item.'''
+        '''The author of the item, which is optional for a commentary.'''
         return item.author
 
     def item_author_link(self, item):
         '''The link to the author's page.'''
-        return item.author.get_absolute_url()
+        if item.author is not None:
+            return item.author.get_absolute_url()
 
     def item_pubdate(self, item):
         '''The date of publication of this commentary, not the modification date.'''
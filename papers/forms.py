@@ -11,7 +11,7 @@ class PublicationForm(forms.ModelForm):
     This form only shows authors which have been pre-ordered but not yet assigned to a publication.
 
     '''
-    authors = forms.ModelMultipleChoiceField(queryset=AuthorDetails.objects.filter(publication__isnull=True),
+    authors = forms.ModelMultipleChoiceField(queryset=AuthorDetails.objects.filter(publication__isnull=True).select_related('author'),
         widget=forms.CheckboxSelectMultiple)
 
     class Meta:
@@ -0,0 +1,321 @@
+'''This package reads publications from BibTeX, RIS and CSL-JSON files and imports them in batches.
+
+The parsers are generators which read a file incrementally and yield one record at a time, in the format used by :func:`~papers.utilities.bulk_upsert_publications`.
+This means a large file is never held in memory, only the current batch of records.
+The formats are the same as those written by :mod:`papers.export`, so an export can be imported into another site.
+
+The main entry point is :func:`~papers.importers.import_publications`, which is used by::
+
+    python manage.py import_publications <file>
+'''
+
+import json
+import re
+import time
+from itertools import islice
+
+from django.db import transaction
+
+from papers.export import BIBTEX_TYPES, RIS_TYPES, CSL_TYPES
+from papers.search import index_publications
+from papers.utilities import PublicationIndex, UpsertStats, bulk_upsert_publications, chunks, load_people
+
+BIBTEX_PUBLICATION_TYPES = dict((value, key) for key, value in BIBTEX_TYPES.items())
+RIS_PUBLICATION_TYPES = dict((value, key) for key, value in RIS_TYPES.items())
+CSL_PUBLICATION_TYPES = dict((value, key) for key, value in CSL_TYPES.items())
+
+BIBTEX_ENTRY_START = re.compile(r'@\s*(\w+)\s*[{(]')
+BIBTEX_ESCAPE = re.compile(r'\\([\\{}%&$#_])')
+BIBTEX_BRACE = re.compile(r'(?<!\\)[{}]')
+BIBTEX_QUOTED = re.compile(r'["{}]')
+BIBTEX_SPACE = re.compile(r'\s*')
+BIBTEX_TOKEN = re.compile(r'[^,#]*')
+RIS_LINE = re.compile(r'^([A-Z][A-Z0-9])  -( (.*))?$')
+YEAR = re.compile(r'\d{4}')
+
+def split_name(name):
+    '''Splits an author name written as "Last, First" or "First Last" into a (first_name, last_name) tuple.'''
+    name = name.strip()
+    if ',' in name:
+        last_name, first_name = name.split(',', 1)
+        return (first_name.strip(), last_name.strip())
+    parts = name.rsplit(None, 1)
+    if len(parts) == 1:
+        return (u'', parts[0])
+    return (parts[0], parts[1])
+
+def parse_year(value):
+    '''Returns the first four digit number in a date, or None.'''
+    match = YEAR.search(value or '')
+    return int(match.group()) if match else None
+
+def parse_bibtex_fields(body, strings):
+    '''Parses the "key = value, ..." body of a BibTeX entry into a dictionary with lower case keys.
+
+    Values may be in braces, in quotes, numbers or @string macros, and may be joined with #.
+    As abstracts can be long, the end of a value in braces or quotes is found with find when it has no nested braces, and otherwise by scanning for the delimiters with a regular expression.
+    '''
+    fields = {}
+    position = 0
+    length = len(body)
+    while position < length:
+        equals = body.find('=', position)
+        if equals == -1:
+            break
+        name = body[position:equals].strip().strip(',').strip().lower()
+        position = equals + 1
+        parts = []
+        while True:
+            position = BIBTEX_SPACE.match(body, position).end()
+            if position >= length:
+                break
+            character = body[position]
+            if character == '{':
+                end = body.find('}', position + 1)
+                if end == -1 or body[end - 1] == '\\' or body.find('{', position + 1, end) != -1:
+                    depth = 0
+                    end = length
+                    for match in BIBTEX_BRACE.finditer(body, position):
+                        depth += 1 if match.group() == '{' else -1
+                        if depth == 0:
+                            end = match.start()
+                            break
+                parts.append(body[position + 1:end])
+                position = end + 1
+            elif character == '"':
+                end = body.find('"', position + 1)
+                if end == -1 or body.find('{', position + 1, end) != -1:
+                    depth = 0
+                    end = length
+                    for match in BIBTEX_QUOTED.finditer(body, position + 1):
+                        delimiter = match.group()
+                        if delimiter == '"' and not depth:
+                            end = match.start()
+                            break
+                        depth += {'{': 1, '}': -1}.get(delimiter, 0)
+                parts.append(body[position + 1:end])
+                position = end + 1
+            else:
+                end = BIBTEX_TOKEN.match(body, position).end()
+                token = body[position:end].strip()
+                parts.append(strings.get(token.lower(), token))
+                position = end
+            position = BIBTEX_SPACE.match(body, position).end()
+            if position < length and body[position] == '#':
+                position += 1
+                continue
+            break
+        value = u''.join(parts)
+        if '{' in value or '}' in value:
+            value = BIBTEX_BRACE.sub('', value)
+        if '\\' in value:
+            value = BIBTEX_ESCAPE.sub(r'\1', value)
+        fields[name] = u' '.join(value.split())
+        comma = body.find(',', position)
+        position = length if comma == -1 else comma + 1
+    return fields
+
+def bibtex_entries(stream):
+    '''Yields (type, key, body) for each entry in a BibTeX file, reading it line by line.
+
+    An entry ends when the brace (or parenthesis) which opened it is closed, escaped braces are not counted.
+    '''
+    buffer = u''
+    depth = 0
+    closer = None
+    for line in stream:
+        if isinstance(line, str):
+            line = line.decode('utf-8')
+        if not buffer:
+            match = BIBTEX_ENTRY_START.search(line)
+            if match is None:
+                continue
+            line = line[match.start():]
+            opener = match.group().strip()[-1]
+            closer = '}' if opener == '{' else ')'
+        buffer += line
+        if '\\' in line:
+            line = line.replace('\\' + opener, '').replace('\\' + closer, '')
+        depth += line.count(opener) - line.count(closer)
+        if depth > 0:
+            continue
+        match = BIBTEX_ENTRY_START.match(buffer)
+        body = buffer[match.end():buffer.rfind(closer)]
+        entry_type = match.group(1).lower()
+        if entry_type in ('comment', 'preamble', 'string'):
+            yield (entry_type, None, body)
+        else:
+            key, _, body = body.partition(',')
+            yield (entry_type, key.strip(), body)
+        buffer = u''
+        depth = 0
+
+def parse_bibtex(stream):
+    '''Yields a record for each entry in a BibTeX file.'''
+    strings = {}
+    for entry_type, key, body in bibtex_entries(stream):
+        if entry_type == 'string':
+            strings.update(parse_bibtex_fields(body, strings))
+            continue
+        if entry_type in ('comment', 'preamble'):
+            continue
+        fields = parse_bibtex_fields(body, strings)
+        yield {
+            'type': BIBTEX_PUBLICATION_TYPES.get(entry_type, 'generic'),
+            'title': fields.get('title'),
+            'journal': fields.get('journal') or fields.get('booktitle'),
+            'year': parse_year(fields.get('year')),
+            'volume': fields.get('volume'),
+            'issue': fields.get('number'),
+            'pages': fields.get('pages', '').replace('--', '-') or None,
+            'doi': fields.get('doi'),
+            'pmid': fields.get('pmid'),
+            'pmcid': fields.get('pmcid'),
+            'abstract': fields.get('abstract'),
+            'authors': [split_name(name) for name in re.split(r'\s+and\s+', fields.get('author', '')) if name.strip()],
+        }
+
+def parse_ris(stream):
+    '''Yields a record for each reference in a RIS file.'''
+    tags = {}
+    last_tag = None
+    for line in stream:
+        if isinstance(line, str):
+            line = line.decode('utf-8')
+        line = line.lstrip(u'\ufeff').rstrip(u'\r\n')
+        match = RIS_LINE.match(line)
+        if match is None:
+            if last_tag and line.strip():
+                tags[last_tag][-1] += u' ' + line.strip()
+            continue
+        tag, value = match.group(1), (match.group(3) or u'').strip()
+        if tag == 'ER':
+            if tags:
+                yield ris_record(tags)
+            tags = {}
+            last_tag = None
+            continue
+        tags.setdefault(tag, []).append(value)
+        last_tag = tag
+    if tags:
+        yield ris_record(tags)
+
+def ris_record(tags):
+    '''Converts a dictionary of lists of RIS tag values into a record.'''
+    def first(*names):
+        for name in names:
+            if tags.get(name):
+                return tags[name][0]
+        return None
+    pages = first('SP')
+    if pages and first('EP'):
+        pages = u'%s-%s' % (pages, first('EP'))
+    pmid = first('AN')
+    return {
+        'type': RIS_PUBLICATION_TYPES.get(first('TY'), 'generic'),
+        'title': first('TI', 'T1'),
+        'journal': first('JO', 'JF', 'T2', 'JA'),
+        'year': parse_year(first('PY', 'Y1', 'DA')),
+        'volume': first('VL'),
+        'issue': first('IS'),
+        'pages': pages,
+        'doi': first('DO'),
+        'pmid': pmid[5:] if pmid and pmid.upper().startswith('PMID:') else None,
+        'abstract': first('AB', 'N2'),
+        'authors': [split_name(name) for name in tags.get('AU', []) + tags.get('A1', [])],
+    }
+
+def parse_csl_json(stream, chunk_size=65536):
+    '''Yields a record for each item in a CSL-JSON array, decoding one item at a time from a buffer.'''
+    decoder = json.JSONDecoder()
+    buffer = u''
+    started = False
+    finished = False
+    while not finished:
+        chunk = stream.read(chunk_size)
+        if isinstance(chunk, str):
+            chunk = chunk.decode('utf-8')
+        finished = not chunk
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer:
+                    break
+                if buffer[0] != '[':
+                    raise ValueError('A CSL-JSON file must contain an array of items.')
+                buffer = buffer[1:]
+                started = True
+                continue
+            if buffer[:1] == ',':
+                buffer = buffer[1:]
+                continue
+            if not buffer or buffer[0] == ']':
+                break
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if finished:
+                    raise
+                break
+            buffer = buffer[end:]
+            yield csl_record(item)
+
+def csl_record(item):
+    '''Converts a CSL-JSON item into a record.'''
+    issued = (item.get('issued') or {}).get('date-parts') or [[None]]
+    return {
+        'type': CSL_PUBLICATION_TYPES.get(item.get('type'), 'generic'),
+        'title': item.get('title'),
+        'journal': item.get('container-title'),
+        'year': issued[0][0] if issued and issued[0] else None,
+        'volume': item.get('volume'),
+        'issue': item.get('issue'),
+        'pages': item.get('page'),
+        'doi': item.get('DOI'),
+        'pmid': item.get('PMID'),
+        'pmcid': item.get('PMCID'),
+        'abstract': item.get('abstract'),
+        'authors': [(author.get('given', u''), author.get('family') or author.get('literal', u'')) for author in item.get('author', [])],
+    }
+
+#these are the available parsers, keyed by file extension
+PARSERS = {
+    'bib': parse_bibtex,
+    'ris': parse_ris,
+    'json': parse_csl_json,
+}
+
+def import_publications(records, batch_size=1000, defaults=None, progress=None, update_search_index=True):
+    '''Imports an iterable of records in batches, each in its own transaction, returning the total UpsertStats.
+
+    The publication and people indexes are loaded once and reused for each batch.
+    defaults is a dictionary of fields (for example laboratory_paper) set on every record.
+    If given, progress is called after each batch with the number of records read and the elapsed seconds.
+    The search index is updated in a single pass over the changed publications once every batch is imported, rather than for each batch.
+    This still takes most of the time of a large import, it can be skipped with update_search_index=False and the index rebuilt later.
+    '''
+    index = PublicationIndex()
+    people = load_people()
+    totals = UpsertStats(0, 0, 0, 0)
+    changed = set()
+    started = time.time()
+    count = 0
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        if defaults:
+            for record in batch:
+                record.update(defaults)
+        stats = bulk_upsert_publications(batch, index=index, people=people, update_search_index=False, changed=changed)
+        totals = UpsertStats(*[total + value for total, value in zip(totals, stats)])
+        count += len(batch)
+        if progress is not None:
+            progress(count, time.time() - started)
+    if update_search_index:
+        with transaction.atomic():
+            for chunk in chunks(sorted(changed)):
+                index_publications(chunk)
+    return totals
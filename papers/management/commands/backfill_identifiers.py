@@ -0,0 +1,23 @@
+'''This command fills in the doi_key of :class:`~papers.models.Publication` objects saved before it was added, or changed with update().
+
+It is run once after upgrading with::
+
+    python manage.py backfill_identifiers
+'''
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from papers.models import Publication, normalize_doi
+
+class Command(BaseCommand):
+    help = 'Sets the normalized DOI used for identifier lookups on all publications.'
+
+    def handle(self, *args, **options):
+        updated = 0
+        with transaction.atomic():
+            for pk, doi, doi_key in Publication.objects.values_list('pk', 'doi', 'doi_key').iterator():
+                if normalize_doi(doi) != doi_key:
+                    Publication.objects.filter(pk=pk).update(doi_key=normalize_doi(doi))
+                    updated += 1
+        self.stdout.write('Updated %i publications.' % updated)
@@ -0,0 +1,89 @@
+'''This command measures the time taken by searches, see :mod:`papers.search`.
+
+It is run as::
+
+    python manage.py benchmark_search [--documents 50000] [--repeat 20] [--target 20] [query ...]
+
+By default it builds a temporary index of synthetic publications, times each query and rolls the database back, so the site is unchanged.
+With --documents 0 the existing index is searched instead.
+The median time of each query is reported against the target, 20 ms by default, and the command fails if any query misses it.
+'''
+
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from papers.models import Publication
+from papers.search import index_publications, search
+
+#the default queries are a very common term, two common terms and a rare term of the synthetic vocabulary
+DEFAULT_QUERIES = ['cell', 'cell protein', 'phosphorylase']
+COMMON_WORDS = ['cell', 'protein', 'insulin', 'signaling', 'mouse', 'expression', 'metabolism', 'kinase', 'glucose', 'tissue']
+
+class Rollback(Exception):
+    '''This exception rolls back the synthetic publications once the searches are timed.'''
+    pass
+
+def synthetic_text(generator, vocabulary, words):
+    '''Returns a text of words drawn from the vocabulary, with common words much more likely than rare ones.'''
+    return u' '.join(vocabulary[min(int(generator.paretovariate(1.0)) - 1, len(vocabulary) - 1)] for word in range(words))
+
+class Command(BaseCommand):
+    help = 'Times searches of a synthetic (or the existing) search index against a target.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=None,
+            help='The queries to time (by default a common term, two common terms and a rare term).')
+        parser.add_argument('--documents', type=int, default=50000,
+            help='The number of synthetic publications to index, or 0 to search the existing index (default 50000).')
+        parser.add_argument('--repeat', type=int, default=20,
+            help='The number of times each query is run (default 20).')
+        parser.add_argument('--target', type=float, default=20,
+            help='The target median time of each query in milliseconds (default 20).')
+
+    def build_index(self, documents):
+        '''Creates and indexes synthetic publications, in chunks so the memory used stays small.'''
+        generator = random.Random(0)
+        vocabulary = COMMON_WORDS + [u'term%i' % number for number in range(20000)]
+        vocabulary[-1] = u'phosphorylase'
+        start = time.time()
+        for offset in range(0, documents, 1000):
+            publications = Publication.objects.bulk_create([Publication(
+                title=synthetic_text(generator, vocabulary, 12), journal=u'Journal %i' % (number % 50),
+                abstract=synthetic_text(generator, vocabulary, 150),
+                laboratory_paper=False, interesting_paper=False, preprint=False) for number in range(offset, min(documents, offset + 1000))])
+            index_publications(list(Publication.objects.order_by('-pk').values_list('pk', flat=True)[:len(publications)]))
+        self.stdout.write('Indexed %i synthetic publications in %.1fs.' % (documents, time.time() - start))
+
+    def time_queries(self, queries, repeat, target):
+        '''Returns the queries whose median time missed the target, writing the time of each.'''
+        missed = []
+        for query in queries:
+            timings = []
+            for attempt in range(repeat):
+                start = time.time()
+                results = search(query)
+                timings.append((time.time() - start) * 1000)
+            median = sorted(timings)[len(timings) // 2]
+            self.stdout.write('%-20s %4i results  median %7.1f ms  max %7.1f ms' % (query, len(results), median, max(timings)))
+            if median > target:
+                missed.append(query)
+        return missed
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or DEFAULT_QUERIES
+        if not options['documents']:
+            missed = self.time_queries(queries, options['repeat'], options['target'])
+        else:
+            try:
+                with transaction.atomic():
+                    self.build_index(options['documents'])
+                    missed = self.time_queries(queries, options['repeat'], options['target'])
+                    raise Rollback
+            except Rollback:
+                pass
+        if missed:
+            raise CommandError('%s missed the %.0f ms target.' % (', '.join(missed), options['target']))
+        self.stdout.write('Every query met the %.0f ms target.' % options['target'])
@@ -0,0 +1,60 @@
+'''This command imports publications from a BibTeX, RIS or CSL-JSON file.
+
+It is run as::
+
+    python manage.py import_publications <file> [--format bib|ris|json] [--batch-size N] [--laboratory] [--interesting] [--skip-search-index]
+
+The file is read incrementally and committed in batches, see :mod:`papers.importers`.
+Publications which already exist (by DOI, PMID or Mendeley id) are updated rather than duplicated, so a file can be imported more than once.
+The search index is updated once all the batches are imported, for very large files --skip-search-index skips this, run rebuild_search_index afterwards.
+'''
+
+import io
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from papers.importers import PARSERS, import_publications
+
+class Command(BaseCommand):
+    help = 'Imports publications from a BibTeX, RIS or CSL-JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The file to import.')
+        parser.add_argument('--format', choices=sorted(PARSERS), default=None,
+            help='The format of the file, by default this is taken from the extension.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+            help='The number of records committed in each transaction (default 1000).')
+        parser.add_argument('--laboratory', action='store_true', default=False,
+            help='Mark the imported publications as laboratory papers.')
+        parser.add_argument('--interesting', action='store_true', default=False,
+            help='Mark the imported publications as interesting papers.')
+        parser.add_argument('--skip-search-index', action='store_true', default=False,
+            help='Do not update the search index, run rebuild_search_index after the import.')
+
+    def handle(self, *args, **options):
+        extension = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if extension not in PARSERS:
+            raise CommandError('Unknown format "%s", use --format with one of %s.' % (extension, ', '.join(sorted(PARSERS))))
+        defaults = {}
+        if options['laboratory']:
+            defaults['laboratory_paper'] = True
+        if options['interesting']:
+            defaults['interesting_paper'] = True
+
+        def progress(count, elapsed):
+            self.stdout.write('Read %i records in %.1fs (%.0f/s)' % (count, elapsed, count / elapsed if elapsed else 0))
+
+        try:
+            stream = io.open(options['path'], encoding='utf-8', newline='')
+        except IOError as error:
+            raise CommandError(error)
+        started = time.time()
+        with stream:
+            stats = import_publications(PARSERS[extension](stream), batch_size=options['batch_size'],
+                defaults=defaults, progress=progress, update_search_index=not options['skip_search_index'])
+        elapsed = time.time() - started
+        total = sum(stats)
+        self.stdout.write('Imported %i records in %.1fs (%.0f/s)' % (total, elapsed, total / elapsed if elapsed else 0))
+        self.stdout.write('%i created, %i updated, %i unchanged, %i skipped.' % (stats.created, stats.updated, stats.unchanged, stats.skipped))
@@ -0,0 +1,17 @@
+'''This command rebuilds the search index for all :class:`~papers.models.Publication` objects.
+
+It is run as::
+
+    python manage.py rebuild_search_index
+'''
+
+from django.core.management.base import BaseCommand
+
+from papers.search import rebuild_index
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full text search index for all publications.'
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write('Indexed %i publications.' % count)
@@ -0,0 +1,28 @@
+'''This command imports the documents authored by the lab from Mendeley.
+
+It is run as::
+
+    python manage.py sync_mendeley
+
+The first time it is run it will ask for the Mendeley verification code, see :func:`~papers.utilities.get_mendeley_authored_documents`.
+The documents which were fetched are imported even if others failed, the failures are then listed and the command exits with an error, so they can be retried by running it again.
+'''
+
+from django.core.management.base import BaseCommand, CommandError
+
+from papers.utilities import get_mendeley_authored_documents, write_mendeley_papers_to_database
+
+class Command(BaseCommand):
+    help = 'Imports the documents authored by the lab from Mendeley.'
+
+    def handle(self, *args, **options):
+        documents, failures, sync_stats = get_mendeley_authored_documents()
+        self.stdout.write('Fetched %i documents in %.1fs (%.1f/s) with %i retries, %i failed.' % (
+            sync_stats.documents, sync_stats.elapsed, sync_stats.rate, sync_stats.retries, sync_stats.failures))
+        stats = write_mendeley_papers_to_database(documents)
+        self.stdout.write('Imported %i documents: %i created, %i updated, %i unchanged, %i skipped.' % (
+            len(documents), stats.created, stats.updated, stats.unchanged, stats.skipped))
+        if failures:
+            for document_id, error in sorted(failures.items()):
+                self.stderr.write('Could not fetch Mendeley document %s: %s' % (document_id, error))
+            raise CommandError('%i Mendeley documents could not be fetched and were not imported.' % len(failures))
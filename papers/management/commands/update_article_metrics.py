@@ -0,0 +1,32 @@
+'''This command updates the stored article level metrics of publications from the PLOS ALM API.
+
+It is run as::
+
+    python manage.py update_article_metrics [--max-age DAYS] [--batch-size N] [--interval SECONDS]
+
+See :mod:`papers.metrics` for details.
+'''
+
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from papers.metrics import update_metrics
+
+class Command(BaseCommand):
+    help = 'Updates the stored article level metrics of publications with a DOI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=float, default=1,
+            help='Update metrics last requested more than this many days ago (default 1).')
+        parser.add_argument('--batch-size', type=int, default=50,
+            help='The number of DOIs requested at once (default 50).')
+        parser.add_argument('--interval', type=float, default=None,
+            help='The minimum number of seconds between requests (default PLOS_ALM_REQUEST_INTERVAL or 1).')
+
+    def handle(self, *args, **options):
+        requested, updated = update_metrics(
+            max_age=datetime.timedelta(days=options['max_age']),
+            batch_size=options['batch_size'],
+            interval=options['interval'])
+        self.stdout.write('Requested metrics for %i publications, updated %i.' % (requested, updated))
@@ -0,0 +1,17 @@
+'''This command recomputes the stored author byline for all :class:`~papers.models.Publication` objects.
+
+It is run after upgrading, or after changing authors with update() or raw SQL, with::
+
+    python manage.py update_bylines
+'''
+
+from django.core.management.base import BaseCommand
+
+from papers.bylines import rebuild_bylines
+
+class Command(BaseCommand):
+    help = 'Recomputes the author byline of all publications.'
+
+    def handle(self, *args, **options):
+        count = rebuild_bylines()
+        self.stdout.write('Updated the bylines of %i publications.' % count)
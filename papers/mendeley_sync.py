@@ -0,0 +1,219 @@
+'''This package contains a concurrent sync engine for documents in a Mendeley library.
+
+The client in :mod:`papers.mendeley_client` opens a new connection for every request and is used serially, so fetching the details of a few hundred documents is slow.
+This module replaces the transport with :class:`~papers.mendeley_sync.KeepAliveOAuthClient`, which keeps one persistent HTTP/1.1 connection per thread, and fetches documents through a bounded pool of worker threads.
+Requests which fail with a server error, a rate limit (429) or a network error are retried with exponential backoff.
+
+The host, port and timeout of the API can be set with the MENDELEY_API_OPTIONS setting, for example to point the sync at a local test server::
+
+    MENDELEY_API_OPTIONS = {'host': 'localhost', 'port': 8000, 'timeout': 10}
+
+A sync is normally run as::
+
+    client = KeepAliveMendeleyClient(settings.MENDELEY_CONSUMER_KEY, settings.MENDELEY_SECRET_KEY, settings.MENDELEY_API_OPTIONS)
+    documents, failures = MendeleySync(client).fetch_authored()
+'''
+
+import httplib
+import logging
+import random
+import socket
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from papers.mendeley_client import OAuthClient, MendeleyClient
+
+logger = logging.getLogger(__name__)
+
+#these status codes are temporary and the request will be retried
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+class MendeleyAPIError(Exception):
+    '''This exception is raised when the Mendeley API returns a temporary error, such as a 503 or 429 response.
+
+    The retry_after attribute is the number of seconds the server asked us to wait, or None.
+    '''
+
+    def __init__(self, status, reason, retry_after=None):
+        super(MendeleyAPIError, self).__init__('Mendeley API returned %i %s' % (status, reason))
+        self.status = status
+        self.retry_after = retry_after
+
+#these errors are retried by MendeleySync
+RETRY_ERRORS = (MendeleyAPIError, httplib.HTTPException, socket.error)
+
+class KeepAliveOAuthClient(OAuthClient):
+    '''This OAuth client reuses one persistent HTTP connection per thread, rather than opening one per request.
+
+    If a kept-alive connection has been closed by the server, a GET request is sent once more on a new connection.
+    Responses with a status code in RETRY_STATUS_CODES are read and raised as :class:`~papers.mendeley_sync.MendeleyAPIError`, so the connection can be reused.
+    The open connections of all threads are kept, so they can be closed with close_all once the threads are finished.
+    '''
+
+    def __init__(self, consumer_key, consumer_secret, options=None):
+        super(KeepAliveOAuthClient, self).__init__(consumer_key, consumer_secret, options)
+        self.timeout = (options or {}).get('timeout', 30)
+        self.connections_opened = 0
+        self._connections = set()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _get_conn(self):
+        '''Returns the connection of the current thread, opening it if required or if it was closed by close_all.'''
+        connection = getattr(self._local, 'connection', None)
+        with self._lock:
+            if connection is None or connection not in self._connections:
+                connection = httplib.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                self._local.connection = connection
+                self._connections.add(connection)
+                self.connections_opened += 1
+        return connection
+
+    def close(self):
+        '''Closes the connection of the current thread.'''
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+            with self._lock:
+                self._connections.discard(connection)
+
+    def close_all(self):
+        '''Closes the connections of every thread.'''
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for connection in connections:
+            connection.close()
+
+    def _send_request(self, request, token=None, body=None, extra_headers=None):
+        try:
+            response = super(KeepAliveOAuthClient, self)._send_request(request, token, body, extra_headers)
+        except (httplib.HTTPException, socket.error):
+            self.close()
+            if request.method != 'GET':
+                raise
+            response = super(KeepAliveOAuthClient, self)._send_request(request, token, body, extra_headers)
+        if response.status in RETRY_STATUS_CODES:
+            response.read()
+            retry_after = response.getheader('Retry-After')
+            raise MendeleyAPIError(response.status, response.reason,
+                int(retry_after) if retry_after and retry_after.isdigit() else None)
+        return response
+
+class KeepAliveMendeleyClient(MendeleyClient):
+    '''This is a :class:`~papers.mendeley_client.MendeleyClient` which uses :class:`~papers.mendeley_sync.KeepAliveOAuthClient` as its transport.'''
+
+    def __init__(self, consumer_key, consumer_secret, options=None):
+        super(KeepAliveMendeleyClient, self).__init__(consumer_key, consumer_secret, options)
+        self.mendeley = KeepAliveOAuthClient(consumer_key, consumer_secret, options)
+
+class SyncStats(object):
+    '''This object counts the requests made during a sync and reports the throughput.'''
+
+    def __init__(self):
+        self.documents = 0
+        self.failures = 0
+        self.retries = 0
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        '''Increments the named counters, this is safe to call from several threads.'''
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rate(self):
+        '''The number of documents fetched per second.'''
+        return self.documents / self.elapsed if self.elapsed else 0.0
+
+    def __unicode__(self):
+        return u'Fetched %i documents in %.1fs (%.1f/s) with %i retries and %i failures' % (
+            self.documents, self.elapsed, self.rate, self.retries, self.failures)
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+class MendeleySync(object):
+    '''This class fetches the details of many documents from a Mendeley library concurrently.
+
+    Documents are fetched by at most workers threads, each with its own kept-alive connection.
+    A request which raises one of RETRY_ERRORS is retried up to retries times, waiting backoff * 2 ** attempt seconds (with jitter, and at most max_backoff) or as long as the server asks.
+    The counts for the last sync are in the stats attribute, a :class:`~papers.mendeley_sync.SyncStats`.
+    The connections of the worker threads are closed when fetch_all finishes, and any others by close.
+    '''
+
+    def __init__(self, client, workers=8, retries=3, backoff=0.5, max_backoff=30):
+        self.client = client
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = SyncStats()
+
+    def close(self):
+        '''Closes the kept-alive connections of the client, if it keeps them.'''
+        close_all = getattr(self.client.mendeley, 'close_all', None)
+        if close_all is not None:
+            close_all()
+
+    def fetch(self, document_id):
+        '''Returns the details of a single document, retrying temporary errors.'''
+        for attempt in range(self.retries + 1):
+            try:
+                return self.client.document_details(document_id)
+            except RETRY_ERRORS as error:
+                if attempt == self.retries:
+                    raise
+                delay = getattr(error, 'retry_after', None)
+                if delay is None:
+                    delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1)
+                logger.debug('Retrying Mendeley document %s in %.2fs: %s', document_id, delay, error)
+                self.stats.add(retries=1)
+                time.sleep(delay)
+
+    def _fetch(self, document_id):
+        '''Returns a tuple of (document_id, details, error) so one failure does not stop the pool.'''
+        try:
+            return (document_id, self.fetch(document_id), None)
+        except RETRY_ERRORS as error:
+            return (document_id, None, error)
+
+    def fetch_all(self, document_ids):
+        '''Fetches the details of each document, returning a tuple of (documents, failures).
+
+        Both are dictionaries keyed by the document id, the failures contain the last error for that document.
+        '''
+        self.stats = SyncStats()
+        documents = {}
+        failures = {}
+        document_ids = list(document_ids)
+        pool = ThreadPool(max(1, min(self.workers, len(document_ids))))
+        try:
+            for document_id, details, error in pool.imap_unordered(self._fetch, document_ids):
+                if error is None:
+                    documents[document_id] = details
+                    self.stats.add(documents=1)
+                else:
+                    logger.warning('Could not fetch Mendeley document %s: %s', document_id, error)
+                    failures[document_id] = error
+                    self.stats.add(failures=1)
+        finally:
+            pool.close()
+            pool.join()
+            self.close()
+        self.stats.finished = time.time()
+        logger.info('%s', self.stats)
+        return documents, failures
+
+    def fetch_authored(self):
+        '''Fetches the details of every document authored by the authorized user.'''
+        response = self.client.documents_authored()
+        return self.fetch_all(response['document_ids'])
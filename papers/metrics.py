@@ -0,0 +1,129 @@
+'''This package fetches article level metrics from the PLOS ALM API and stores them as :class:`~papers.models.PublicationMetric` objects.
+
+Rather than each page view making a request per source from the browser, the metrics for many publications are requested together and stored.
+This is run on a schedule (for example daily from cron) with::
+
+    python manage.py update_article_metrics
+
+Publications with a DOI are updated if their metrics have never been requested, or were last requested more than max_age ago.
+The time of the last request is kept in metrics_checked, so DOIs which the API has no metrics for are not requested again on every run.
+The DOIs are requested and matched in the normalized form of :func:`~papers.models.normalize_doi`, so a stored DOI with a resolver prefix or different case still gets its metrics.
+Requests are made for batches of DOIs and are spaced at least PLOS_ALM_REQUEST_INTERVAL seconds apart.
+The API url can be changed with the PLOS_ALM_URL setting.
+'''
+
+import datetime
+import json
+import time
+import urllib
+import urllib2
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from lab_website import outbound
+from papers.models import Publication, PublicationMetric, normalize_doi
+
+#these are the sources shown, with their label and category
+METRIC_SOURCES = {
+    'counter': ('PLOS', 'readers'),
+    'pmc': ('PMC', 'readers'),
+    'mendeley': ('Mendeley', 'readers'),
+    'citeulike': ('CiteULike', 'readers'),
+    'crossref': ('CrossRef', 'citations'),
+    'pubmed': ('PubMed', 'citations'),
+    'scopus': ('Scopus', 'citations'),
+    'researchblogging': ('Blogs', 'citations'),
+    'twitter': ('Tweets', 'social'),
+    'facebook': ('Facebook', 'social'),
+}
+
+DEFAULT_ALM_URL = 'http://alm.plos.org/api/v3/articles'
+
+class RateLimiter(object):
+    '''This waits so that successive calls to wait() are at least interval seconds apart.'''
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.last = None
+
+    def wait(self):
+        if self.last is not None:
+            remaining = self.last + self.interval - time.time()
+            if remaining > 0:
+                time.sleep(remaining)
+        self.last = time.time()
+
+def stale_publications(max_age):
+    '''Returns the publications with a DOI whose metrics were never requested or were requested more than max_age (a timedelta) ago, oldest first.'''
+    cutoff = timezone.now() - max_age
+    return Publication.objects.exclude(doi__isnull=True).exclude(doi='').filter(
+        Q(metrics_checked__isnull=True) | Q(metrics_checked__lt=cutoff)).order_by('metrics_checked', 'pk')
+
+def fetch_metrics(dois, timeout=30):
+    '''Requests the metrics for a list of DOIs in a single API call.
+
+    The DOIs should already be normalized with :func:`~papers.models.normalize_doi`.
+    Returns a dictionary keyed by the normalized DOI, of dictionaries of counts keyed by source.
+    '''
+    url = getattr(settings, 'PLOS_ALM_URL', DEFAULT_ALM_URL)
+    query = urllib.urlencode({'ids': ','.join(dois), 'api_key': settings.PLOS_API_KEY, 'info': 'summary', 'source': ','.join(METRIC_SOURCES)})
+    response = outbound.urlopen('%s?%s' % (url, query), timeout=timeout)
+    articles = json.load(response)
+    if isinstance(articles, dict):
+        articles = articles.get('data') or []
+    metrics = {}
+    for article in articles:
+        counts = {}
+        for source in article.get('sources', []):
+            if source.get('name') in METRIC_SOURCES:
+                total = (source.get('metrics') or {}).get('total')
+                if total is None:
+                    total = source.get('events_count')
+                counts[source['name']] = int(total or 0)
+        doi = normalize_doi(article.get('doi'))
+        if doi:
+            metrics[doi] = counts
+    return metrics
+
+def store_metrics(publications, metrics):
+    '''Replaces the stored metrics of publications with the fetched counts, returning the number of publications updated.
+
+    Every publication requested is marked as checked, including those the API returned nothing for.
+    '''
+    updated = [publication for publication in publications if normalize_doi(publication.doi) in metrics]
+    with transaction.atomic():
+        Publication.objects.filter(pk__in=[publication.pk for publication in publications]).update(metrics_checked=timezone.now())
+        PublicationMetric.objects.filter(publication__in=updated).delete()
+        PublicationMetric.objects.bulk_create([
+            PublicationMetric(publication=publication, source=source, count=count,
+                label=METRIC_SOURCES[source][0], category=METRIC_SOURCES[source][1])
+            for publication in updated
+            for source, count in metrics[normalize_doi(publication.doi)].items()])
+    return len(updated)
+
+def update_metrics(max_age=datetime.timedelta(days=1), batch_size=50, interval=None):
+    '''Fetches and stores the metrics for all stale publications, in rate limited batches.
+
+    Returns a tuple of the number of publications requested and updated.
+    A batch which fails is skipped, and will be retried on the next run.
+    '''
+    if interval is None:
+        interval = getattr(settings, 'PLOS_ALM_REQUEST_INTERVAL', 1)
+    limiter = RateLimiter(interval)
+    publications = list(stale_publications(max_age))
+    requested = 0
+    updated = 0
+    for start in range(0, len(publications), batch_size):
+        batch = publications[start:start + batch_size]
+        limiter.wait()
+        requested += len(batch)
+        dois = [doi for doi in (normalize_doi(publication.doi) for publication in batch) if doi]
+        try:
+            metrics = fetch_metrics(dois) if dois else {}
+        except (urllib2.URLError, IOError, ValueError):
+            continue
+        updated += store_metrics(batch, metrics)
+    return requested, updated
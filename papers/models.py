@@ -1,6 +1,8 @@
 '''This file is the model configuration file for the :mod`papers` app.
 
-There are two models in this app, :class:`~papers.models.Publication` and :class:`~papers.models.AuthorDetails`
+There are two main models in this app, :class:`~papers.models.Publication` and :class:`~papers.models.AuthorDetails`.
+The :class:`~papers.models.SearchDocument` and :class:`~papers.models.SearchPosting` models store the search index, see :mod:`papers.search`.
+Article level metrics are stored in :class:`~papers.models.PublicationMetric`, see :mod:`papers.metrics`.
 '''
 
 from django.db import models
@@ -35,20 +37,86 @@ PUBLICATION_TYPES = (
 	),
 )
 
+#these are removed from the start of a DOI when it is normalized
+DOI_PREFIXES = ('http://dx.doi.org/', 'https://dx.doi.org/', 'http://doi.org/', 'https://doi.org/', 'doi:')
+
+#this is the largest value of an IntegerField on every database backend, larger identifiers cannot be stored or looked up
+MAX_IDENTIFIER = 2147483647
+
+def normalize_doi(doi):
+    '''Returns a DOI stripped of whitespace and any resolver prefix and case folded, or None.
+
+    DOIs are case insensitive, so this is stored in :attr:`Publication.doi_key` for lookups.
+    '''
+    if not doi:
+        return None
+    doi = doi.strip().lower()
+    for prefix in DOI_PREFIXES:
+        if doi.startswith(prefix):
+            doi = doi[len(prefix):]
+    return doi.strip() or None
+
+def normalize_pmid(pmid):
+    '''Returns a PubMed id as an integer, or None if it is not a number which fits in an IntegerField.'''
+    pmid = (u'%s' % (pmid or u'')).strip()
+    if not pmid.isdigit():
+        return None
+    pmid = int(pmid)
+    return pmid if pmid <= MAX_IDENTIFIER else None
+
+def normalize_pmcid(pmcid):
+    '''Returns a PubMed Central id such as PMC12345 as an integer, or None.'''
+    pmcid = u'%s' % (pmcid or u'')
+    pmcid = pmcid.strip().upper()
+    if pmcid.startswith(u'PMC'):
+        pmcid = pmcid[3:]
+    return normalize_pmid(pmcid)
+
+METRIC_CATEGORIES = (
+    ('readers', 'Readers'),
+    ('citations', 'Citations'),
+    ('social', 'Social Networks'),
+)
+
+class PublicationQuerySet(models.QuerySet):
+    '''This queryset adds loading plans for :class:`~papers.models.Publication` objects.'''
+
+    def for_list(self):
+        '''Prefetches the commentaries and the stored metrics shown in lists of papers.
+
+        The authors are shown from the stored byline, so they are not loaded.
+        '''
+        return self.prefetch_related('commentary_set', 'metrics')
+
+    def with_authors(self):
+        '''Prefetches the ordered authors, the linked people, their contributions, any commentaries and the stored metrics.
+
+        This keeps the number of queries fixed for templates which render a list of papers with their authors.
+        '''
+        return self.prefetch_related(
+            models.Prefetch('authors',
+                queryset=AuthorDetails.objects.select_related('author').prefetch_related('contribution')),
+            'commentary_set',
+            'metrics')
+
 class Publication(models.Model):
     '''This model covers :class:`~papers.models.Publication` objects of several types.
     
     The publication fields are based on Mendeley and PubMed fields.
     For the author, there is a ManyToMany link to a group of authors with the order and other details, see :class:`~papers.models.AuthorDetails`.
+    The author names are also stored in the byline and byline_html fields, which are maintained by :mod:`papers.bylines`.
     '''
     mendeley_url = models.URLField(blank=True, null=True)
     title = models.CharField(max_length=150)
     authors = models.ManyToManyField('AuthorDetails', blank=True, null=True)
+    byline = models.TextField(blank=True, null=True, editable=False, help_text="The author names, kept up to date from the authors")
+    byline_html = models.TextField(blank=True, null=True, editable=False, help_text="The author names with links to current laboratory members")
     title_slug = models.SlugField(blank=True, null=True, max_length=150, editable=False, unique=True)
     mendeley_id = models.IntegerField(blank=True, null=True)
     doi = models.CharField(blank=True, null=True, max_length=50, help_text="Digital Object Identifier", verbose_name="DOI")
-    pmid = models.IntegerField(blank=True, null=True, help_text='PubMed Idenfifier', verbose_name="PMID")
-    pmcid = models.IntegerField(blank=True, null=True, help_text='PubMed Central Idenfifier', verbose_name="PMCID")    
+    doi_key = models.CharField(blank=True, null=True, max_length=50, editable=False, db_index=True, help_text="The case folded DOI, used for lookups")
+    pmid = models.IntegerField(blank=True, null=True, db_index=True, help_text='PubMed Idenfifier', verbose_name="PMID")
+    pmcid = models.IntegerField(blank=True, null=True, db_index=True, help_text='PubMed Central Idenfifier', verbose_name="PMCID")    
     journal = models.CharField(max_length=100, blank=True, null=True)
     year = models.IntegerField(blank=True, null=True)
     volume = models.CharField(max_length=15, blank=True, null=True)    
@@ -62,6 +130,9 @@ class Publication(models.Model):
     preprint = models.BooleanField(help_text="Is this a preprint")
     date_last_modified = models.DateField(auto_now=True)
     date_added = models.DateField(auto_now_add=True)    
+    metrics_checked = models.DateTimeField(blank=True, null=True, editable=False, help_text="When the article level metrics were last requested")
+
+    objects = PublicationQuerySet.as_manager()
     
     def doi_link(self):
         '''This turns the DOI into a link.'''
@@ -80,6 +151,13 @@ class Publication(models.Model):
         else:
             return self.get_absolute_url()       
     
+    def metric_totals(self):
+        '''Returns a list of (category label, total) for the stored :class:`~papers.models.PublicationMetric` objects, in the order of METRIC_CATEGORIES.'''
+        totals = dict((category, 0) for category, label in METRIC_CATEGORIES)
+        for metric in self.metrics.all():
+            totals[metric.category] += metric.count
+        return [(label, totals[category]) for category, label in METRIC_CATEGORIES if totals[category]]
+
     def __unicode__(self):
         '''The unicode representation for a :class:`~papers.models.Publication` is its title'''
         return self.title
@@ -90,9 +168,10 @@ class Publication(models.Model):
         return ('paper-details', [str(self.title_slug)])   
 
     def save(self, *args, **kwargs):
-        '''The title is slugified upon saving into title_slug.'''
+        '''The title is slugified upon saving into title_slug and the DOI is normalized into doi_key.'''
         if not self.id:
             self.title_slug = slugify(self.title)
+        self.doi_key = normalize_doi(self.doi)
         super(Publication, self).save(*args, **kwargs)
         
     class Meta:
@@ -117,8 +196,14 @@ class AuthorDetails(models.Model):
         null=True)
                 
     def __unicode__(self):
-        '''The unicode representation is the author name.'''
-        return '%i - %s -  %s' %(self.order, self.publication_set.last(), self.author)
+        '''The unicode representation is the order, publication and author name.
+
+        The publication is only shown if the publications have been prefetched (as in the admin), so listing author details does not query each one.
+        '''
+        publications = getattr(self, '_prefetched_objects_cache', {}).get(self.publication_set.prefetch_cache_name)
+        if publications is None:
+            return u'%i - %s' % (self.order, self.author)
+        return u'%i - %s -  %s' % (self.order, list(publications)[-1] if publications else None, self.author)
     
     def name(self):
         '''The name representation shows the author name only.'''
@@ -180,4 +265,62 @@ class AuthorContributions(models.Model):
         
     def __unicode__(self):
         '''The unicode representation is the contribution'''
-        return self.contribution
\ No newline at end of file
+        return self.contribution
+
+class SearchDocument(models.Model):
+    '''This is the entry for a :class:`~papers.models.Publication` in the search index.
+
+    The length is the weighted number of terms in the indexed fields, which is used for BM25 ranking.
+    It is deleted along with its publication.
+    '''
+
+    publication = models.OneToOneField('Publication', related_name='search_document')
+    length = models.PositiveIntegerField(default=0)
+
+    def __unicode__(self):
+        '''The unicode representation is the id of the publication.'''
+        return u'%s' % self.publication_id
+
+class SearchPosting(models.Model):
+    '''This is an entry in the inverted index, the weighted frequency of a term in a :class:`~papers.models.SearchDocument`.
+
+    The weight is the BM25 score of the term in the document before it is multiplied by the inverse document frequency, see :mod:`papers.search`.
+    '''
+
+    term = models.CharField(max_length=50)
+    document = models.ForeignKey('SearchDocument', related_name='postings')
+    frequency = models.PositiveIntegerField()
+    weight = models.FloatField(default=0)
+
+    def __unicode__(self):
+        '''The unicode representation is the term.'''
+        return self.term
+
+    class Meta:
+        '''Postings are looked up by term and document, read by term in order of weight, and replaced by document.
+
+        Both term indexes include the other columns a search reads, so searches never read the table itself.
+        '''
+        index_together = [['term', 'document', 'weight'], ['term', 'weight', 'document']]
+
+class PublicationMetric(models.Model):
+    '''This is a stored article level metric for a :class:`~papers.models.Publication`, such as the number of Mendeley readers.
+
+    These are filled from the PLOS ALM API by the update_article_metrics management command, so pages can show them without any requests from the browser.
+    There is one count per publication and source, and the sources are grouped into categories.
+    '''
+    publication = models.ForeignKey('Publication', related_name='metrics')
+    source = models.CharField(max_length=30, help_text="The source of this metric, ie mendeley")
+    label = models.CharField(max_length=50, help_text="The name shown for this source")
+    category = models.CharField(max_length=15, choices=METRIC_CATEGORIES)
+    count = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        '''The unicode representation is the label and count.'''
+        return u'%s: %i' % (self.label, self.count)
+
+    class Meta:
+        '''The meta options keep one metric per source for each publication, ordered by category and source.'''
+        unique_together = ('publication', 'source')
+        ordering = ['category', 'source']
@@ -0,0 +1,373 @@
+'''This package contains the full text search index for :class:`~papers.models.Publication` objects.
+
+The index is an inverted index stored in the :class:`~papers.models.SearchDocument` and :class:`~papers.models.SearchPosting` models, so it works with any database backend.
+Each publication is indexed on its title, author names, journal and abstract, with the title and authors weighted more heavily.
+The index is updated when a publication, its authors or an author's name changes (see :mod:`papers.signals`) and can be rebuilt with::
+
+    python manage.py rebuild_search_index
+
+Searches are ranked with BM25 and return a highlighted snippet of the abstract or title for each hit.
+Each posting stores its BM25 weight (the score of the term in the document before it is multiplied by the inverse document frequency), computed with the average document length of the index when the publication was indexed.
+Rebuilding the index recomputes every weight with the current average length.
+The number of documents and the document frequency of each term are kept in the cache for the current generation of the index (see :mod:`lab_website.cache`), which changes with every update.
+A search reads the postings of each term in order of weight, and scores only the documents found, so it reads a few postings however common the terms are (see :func:`~papers.search.ranked_publications`).
+The speed of searching a large index can be measured with::
+
+    python manage.py benchmark_search
+'''
+
+import hashlib
+import math
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from heapq import nlargest
+from itertools import chain
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Avg, Case, Count, F, FloatField, Sum, Value, When
+from django.utils.safestring import mark_safe
+
+from lab_website.cache import bump_generation, get_generations, shared_cache
+from lab_website.pagination import iterate_in_chunks
+from papers.models import Publication, SearchDocument, SearchPosting
+
+#these are the relative weights of the indexed fields
+FIELD_WEIGHTS = (('title', 3), ('authors', 2), ('journal', 1), ('abstract', 1))
+
+#these are the standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+#searches which would read more postings than this for each term score every posting of the terms instead
+MAX_SEARCH_DEPTH = 2500
+#the documents looked up by a search are sent in batches of this size, below the SQLite limit of 999 parameters
+LOOKUP_BATCH_SIZE = 500
+
+SEARCH_INDEX = 'papers.SearchDocument'
+SEARCH_KEY = 'papers:search:%s:%s'
+
+STOP_WORDS = frozenset(['a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of', 'on', 'or', 'that', 'the', 'to', 'was', 'were', 'with'])
+
+#these are the characters escaped by django.utils.html.escape, which is slow for the many short pieces of a snippet
+HTML_ESCAPES = {ord(u'&'): u'&amp;', ord(u'<'): u'&lt;', ord(u'>'): u'&gt;', ord(u'"'): u'&quot;', ord(u"'"): u'&#39;'}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SearchResult = namedtuple('SearchResult', ['publication', 'score', 'snippet'])
+
+def normalize(word):
+    '''Case folds a word (or text) and strips any accents.'''
+    word = unicodedata.normalize('NFKD', u'%s' % word.lower())
+    try:
+        word.encode('ascii')
+        return word
+    except UnicodeEncodeError:
+        return u''.join(character for character in word if not unicodedata.combining(character))
+
+def tokenize(text):
+    '''Returns the list of index terms in a text, excluding stop words.
+
+    The whole text is normalized at once, which is much faster than normalizing each word.
+    '''
+    if not text:
+        return []
+    return [term[:50] for term in TOKEN_RE.findall(normalize(text)) if term not in STOP_WORDS]
+
+def publication_fields(publication, authors=None):
+    '''Returns a dictionary of the indexed text of a :class:`~papers.models.Publication`.
+
+    The authors can be passed if they have already been loaded, otherwise they are queried.
+    '''
+    if authors is None:
+        authors = publication.authors.select_related('author')
+    return {
+        'title': publication.title,
+        'authors': u' '.join(u'%s %s' % (details.author.first_name or '', details.author.last_name or '') for details in authors),
+        'journal': publication.journal,
+        'abstract': publication.abstract,
+    }
+
+def term_frequencies(fields):
+    '''Returns a dictionary of the weighted frequency of each term in the indexed fields.'''
+    frequencies = {}
+    get = frequencies.get
+    for field, weight in FIELD_WEIGHTS:
+        for term in tokenize(fields[field]):
+            frequencies[term] = get(term, 0) + weight
+    return frequencies
+
+def term_weights(frequencies, average_length):
+    '''Returns a dictionary of the BM25 weight of each term of a document, from its term frequencies and the average document length of the index.'''
+    length = float(sum(frequencies.values()))
+    normalization = K1 * (1 - B + B * length / (average_length or length or 1.0))
+    return dict((term, frequency * (K1 + 1) / (frequency + normalization)) for term, frequency in frequencies.items())
+
+def index_statistics(terms=()):
+    '''Returns a dictionary of the number of indexed documents and their average length, and a dictionary of the number of documents containing each term.
+
+    These are cached for the current generation of the index, so repeated searches do not count the postings of common terms.
+    They are only cached if the cache is shared by every process, see :func:`~lab_website.cache.shared_cache`.
+    '''
+    shared = shared_cache()
+    generation = repr(get_generations([SEARCH_INDEX])[SEARCH_INDEX])
+    statistics_key = SEARCH_KEY % (generation, 'statistics')
+    keys = dict((SEARCH_KEY % (generation, hashlib.md5(term.encode('utf-8')).hexdigest()), term) for term in terms)
+    cached = cache.get_many(keys.keys() + [statistics_key])
+    timeout = getattr(settings, 'SEARCH_CACHE_TIMEOUT', 60 * 60 * 24)
+    statistics = cached.get(statistics_key)
+    if statistics is None:
+        statistics = SearchDocument.objects.aggregate(count=Count('pk'), average_length=Avg('length'))
+        if shared:
+            cache.set(statistics_key, statistics, timeout)
+    document_frequencies = dict((term, cached[key]) for key, term in keys.items() if key in cached)
+    missing = [term for term in keys.values() if term not in document_frequencies]
+    if missing:
+        counted = dict.fromkeys(missing, 0)
+        counted.update(SearchPosting.objects.filter(term__in=missing).order_by().values_list('term').annotate(Count('pk')))
+        if shared:
+            cache.set_many(dict((key, counted[term]) for key, term in keys.items() if term in counted), timeout)
+        document_frequencies.update(counted)
+    return statistics, document_frequencies
+
+def index_publication(publication):
+    '''Adds or replaces a :class:`~papers.models.Publication` in the search index.'''
+    frequencies = term_frequencies(publication_fields(publication))
+    weights = term_weights(frequencies, index_statistics()[0]['average_length'])
+    with transaction.atomic():
+        document, created = SearchDocument.objects.update_or_create(publication=publication,
+            defaults={'length': sum(frequencies.values())})
+        if not created:
+            document.postings.all().delete()
+        insert_postings([(document.pk, term, frequency, weights[term]) for term, frequency in frequencies.items()])
+    bump_generation(SEARCH_INDEX)
+
+def insert_postings(rows):
+    '''Inserts a list of (document_id, term, frequency, weight) postings.
+
+    There can be hundreds of postings per publication, so these are inserted with a single executemany rather than creating model instances.
+    '''
+    opts = SearchPosting._meta
+    columns = [connection.ops.quote_name(opts.get_field(name).column) for name in ('document', 'term', 'frequency', 'weight')]
+    with connection.cursor() as cursor:
+        cursor.executemany('INSERT INTO %s (%s) VALUES (%%s, %%s, %%s, %%s)' % (connection.ops.quote_name(opts.db_table), ', '.join(columns)), rows)
+
+def index_publications(publication_ids):
+    '''Adds or replaces many publications in the search index with a fixed number of queries.
+
+    This is used by bulk imports, which do not send the signals that keep the index up to date.
+    The indexed fields are loaded as values rather than model instances, as this is called for thousands of publications.
+    The postings are inserted in order of term, which is the order of the posting indexes.
+    '''
+    authors = defaultdict(list)
+    for publication_id, first_name, last_name in Publication.authors.through.objects.filter(publication__in=publication_ids).order_by(
+            'authordetails__order').values_list('publication_id', 'authordetails__author__first_name', 'authordetails__author__last_name'):
+        authors[publication_id].append(u'%s %s' % (first_name or '', last_name or ''))
+    frequencies = {}
+    for publication_id, title, journal, abstract in Publication.objects.filter(pk__in=publication_ids).values_list('pk', 'title', 'journal', 'abstract'):
+        frequencies[publication_id] = term_frequencies({'title': title, 'authors': u' '.join(authors[publication_id]), 'journal': journal, 'abstract': abstract})
+    average_length = index_statistics()[0]['average_length']
+    if not average_length and frequencies:
+        average_length = sum(sum(terms.values()) for terms in frequencies.values()) / float(len(frequencies))
+    with transaction.atomic():
+        SearchDocument.objects.filter(publication__in=frequencies.keys()).delete()
+        SearchDocument.objects.bulk_create([SearchDocument(publication_id=publication_id, length=sum(terms.values()))
+            for publication_id, terms in frequencies.items()])
+        documents = SearchDocument.objects.filter(publication__in=frequencies.keys()).values_list('pk', 'publication_id')
+        rows = []
+        for document_id, publication_id in documents:
+            weights = term_weights(frequencies[publication_id], average_length)
+            rows.extend((document_id, term, frequency, weights[term]) for term, frequency in frequencies[publication_id].items())
+        rows.sort(key=itemgetter(1))
+        insert_postings(rows)
+    bump_generation(SEARCH_INDEX)
+
+def remove_publication(publication):
+    '''Removes a :class:`~papers.models.Publication` from the search index.'''
+    SearchDocument.objects.filter(publication=publication).delete()
+    bump_generation(SEARCH_INDEX)
+
+def reweight_index():
+    '''Recomputes the weight of every posting with the current average document length, with a single update.'''
+    average_length = SearchDocument.objects.aggregate(average_length=Avg('length'))['average_length']
+    if not average_length:
+        return
+    quote_name = connection.ops.quote_name
+    postings, documents = SearchPosting._meta, SearchDocument._meta
+    names = {
+        'postings': quote_name(postings.db_table),
+        'weight': quote_name(postings.get_field('weight').column),
+        'frequency': quote_name(postings.get_field('frequency').column),
+        'document': quote_name(postings.get_field('document').column),
+        'documents': quote_name(documents.db_table),
+        'length': quote_name(documents.get_field('length').column),
+        'id': quote_name(documents.pk.column),
+        }
+    with connection.cursor() as cursor:
+        cursor.execute(('UPDATE %(postings)s SET %(weight)s = %(frequency)s * %%s / (%(frequency)s + %%s + %%s * '
+            '(SELECT %(length)s FROM %(documents)s WHERE %(documents)s.%(id)s = %(postings)s.%(document)s))') % names,
+            [K1 + 1, K1 * (1 - B), K1 * B / average_length])
+    bump_generation(SEARCH_INDEX)
+
+def rebuild_index():
+    '''Indexes every :class:`~papers.models.Publication` in chunks and then reweights the postings, returning the number indexed.'''
+    count = 0
+    for chunk in iterate_in_chunks(Publication.objects.order_by('pk').only('pk')):
+        index_publications([publication.pk for publication in chunk])
+        count += len(chunk)
+    reweight_index()
+    return count
+
+def matching_words(text, terms, start=0):
+    '''Yields the (start, end) positions of the words of a text, from start, which are one of the terms.
+
+    The whole text is normalized once and searched with a single expression, unless stripping its accents changes its length.
+    Then each word is normalized separately, so that the positions are those of the original text.
+    '''
+    if not terms:
+        return
+    folded = normalize(text)
+    if len(folded) == len(text):
+        pattern = re.compile(r'(?<!\w)(?:%s)(?!\w)' % u'|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.UNICODE)
+        for match in pattern.finditer(folded, start):
+            yield match.span()
+    else:
+        for match in TOKEN_RE.finditer(text, start):
+            if normalize(match.group()) in terms:
+                yield match.span()
+
+def highlight(text, terms, length=250):
+    '''Returns a snippet of about length characters from the text, with the matching terms marked.
+
+    The snippet starts shortly before the first matching term and is HTML escaped.
+    '''
+    if not text:
+        return mark_safe(u'')
+    text = u'%s' % text
+    matches = matching_words(text, terms)
+    first = next(matches, None)
+    start = 0
+    if first is not None and first[0] > length // 3:
+        start = text.rfind(u' ', 0, first[0] - length // 3) + 1
+    end = min(len(text), start + length)
+    if end < len(text) and text.rfind(u' ', start, end) > start:
+        end = text.rfind(u' ', start, end)
+    parts = [u'&hellip;'] if start > 0 else []
+    position = start
+    for match_start, match_end in (chain([first], matches) if first is not None else []):
+        if match_end > end:
+            break
+        parts.append(text[position:match_start].translate(HTML_ESCAPES))
+        parts.append(u'<mark>%s</mark>' % text[match_start:match_end].translate(HTML_ESCAPES))
+        position = match_end
+    parts.append(text[position:end].translate(HTML_ESCAPES))
+    if end < len(text):
+        parts.append(u'&hellip;')
+    return mark_safe(u''.join(parts))
+
+def score_postings(postings, idfs, limit):
+    '''Returns the (publication id, score) tuples of the limit best documents of some postings, summing the weights of the terms multiplied by their idfs.
+
+    The idfs are computed in python as not every database has a logarithm function.
+    '''
+    idf = Case(*[When(term=term, then=Value(value)) for term, value in idfs.items()], default=Value(0.0), output_field=FloatField())
+    return list(postings.order_by().values('document__publication_id').annotate(score=Sum(idf * F('weight'), output_field=FloatField())).order_by(
+        '-score', 'document__publication_id').values_list('document__publication_id', 'score')[:limit])
+
+def ranked_publications(idfs, limit):
+    '''Returns up to limit (publication id, score) tuples of the best matching publications, best first.
+
+    This is the threshold algorithm: the postings of each term are read in blocks, in order of weight, and each document found is scored
+    by looking up its postings for all the terms, which are found with the term and document index.
+    A document which has not been found can score at most the sum of the weight of the last posting read of each term (times its idf).
+    Once the limit-th best score is at least that much the best documents are known, so only a few hundred postings of each term are read however many documents contain it.
+    Beyond MAX_SEARCH_DEPTH postings for each term, every posting of the terms is scored instead.
+    The postings are read with raw SQL, as building the querysets took longer than running them.
+    '''
+    opts = SearchPosting._meta
+    quote_name = connection.ops.quote_name
+    names = {
+        'postings': quote_name(opts.db_table),
+        'id': quote_name(opts.pk.column),
+        'document': quote_name(opts.get_field('document').column),
+        'term': quote_name(opts.get_field('term').column),
+        'weight': quote_name(opts.get_field('weight').column),
+        }
+    read_postings = 'SELECT %(document)s, %(weight)s FROM %(postings)s WHERE %(term)s = %%s ORDER BY %(weight)s DESC, %(document)s DESC LIMIT %%s OFFSET %%s' % names
+    look_up_postings = 'SELECT %(document)s, %(weight)s FROM %(postings)s WHERE %(term)s = %%%%s AND %(document)s IN (%%s)' % names
+    terms = list(idfs)
+    scores = {}
+    passed = set()
+    lowest = None
+    last_weights = dict.fromkeys(terms, None)
+    read, block = 0, limit
+    with connection.cursor() as cursor:
+        while read < MAX_SEARCH_DEPTH:
+            found = defaultdict(dict)
+            for term in terms:
+                if last_weights[term] == 0.0:
+                    continue
+                cursor.execute(read_postings, [term, block, read])
+                postings = cursor.fetchall()
+                for document_id, weight in postings:
+                    if document_id not in scores and document_id not in passed:
+                        found[document_id][term] = idfs[term] * weight
+                #a term whose postings have all been read adds nothing to the documents which were not found
+                last_weights[term] = postings[-1][1] if len(postings) == block else 0.0
+            if lowest is not None:
+                #a document which could not beat the limit-th best score (which only rises) is not looked up, now or when it is found again
+                for document_id, weights in found.items():
+                    if sum(weights.values()) + sum(idfs[term] * last_weights[term] for term in terms if term not in weights) < lowest:
+                        passed.add(document_id)
+                        del found[document_id]
+            for term in terms:
+                missing = [document_id for document_id, weights in found.items() if term not in weights]
+                for offset in range(0, len(missing), LOOKUP_BATCH_SIZE):
+                    batch = missing[offset:offset + LOOKUP_BATCH_SIZE]
+                    cursor.execute(look_up_postings % ', '.join(['%s'] * len(batch)), [term] + batch)
+                    for document_id, weight in cursor.fetchall():
+                        found[document_id][term] = idfs[term] * weight
+            scores.update((document_id, sum(weights.values())) for document_id, weights in found.items())
+            read += block
+            block *= 2
+            best = nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            if len(best) == limit:
+                lowest = best[-1][1]
+            threshold = sum(idfs[term] * weight for term, weight in last_weights.items())
+            if not threshold or (lowest is not None and lowest >= threshold):
+                break
+        else:
+            return score_postings(SearchPosting.objects.filter(term__in=terms), idfs, limit)
+    publication_ids = dict(SearchDocument.objects.filter(pk__in=[document_id for document_id, score in best]).values_list('pk', 'publication_id'))
+    return [(publication_ids[document_id], score) for document_id, score in best]
+
+def search(query, limit=20):
+    '''Returns a list of :class:`~papers.search.SearchResult` for a query, ranked by BM25.
+
+    Each result has the publication, the score and a highlighted snippet.
+    The related objects of the publications are not loaded, so views prefetch whatever their templates show.
+    '''
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    statistics, document_frequencies = index_statistics(terms)
+    idfs = dict((term, math.log(1 + (statistics['count'] - document_frequency + 0.5) / (document_frequency + 0.5)))
+        for term, document_frequency in document_frequencies.items() if document_frequency)
+    if not idfs:
+        return []
+    ranked = ranked_publications(idfs, limit)
+    publications = Publication.objects.in_bulk([publication_id for publication_id, score in ranked])
+    results = []
+    for publication_id, score in ranked:
+        publication = publications.get(publication_id)
+        if publication is None:
+            continue
+        if publication.abstract and next(matching_words(publication.abstract, terms), None) is not None:
+            snippet = highlight(publication.abstract, terms)
+        else:
+            snippet = highlight(publication.title, terms)
+        results.append(SearchResult(publication, score, snippet))
+    return results
@@ -0,0 +1,89 @@
+'''This package contains the signal handlers for the :mod:`papers` app.
+
+These are connected by :class:`~papers.apps.PapersConfig` and keep the search index in :mod:`papers.search` and the bylines in :mod:`papers.bylines` up to date.
+Search documents are deleted along with their :class:`~papers.models.Publication`, so no handler is needed for deletions.
+'''
+
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from papers.models import Publication, AuthorDetails
+from papers.search import index_publication, index_publications
+from papers.bylines import update_byline, update_bylines
+from papers.utilities import chunks
+from personnel.models import Person
+
+#these are the Person fields shown in the search index and in the bylines, which also link current laboratory members to their page
+PERSON_INDEXED_FIELDS = ('first_name', 'last_name')
+PERSON_BYLINE_FIELDS = PERSON_INDEXED_FIELDS + ('name_slug', 'current_lab_member')
+
+@receiver(post_save, sender=Publication)
+def index_saved_publication(sender, instance, raw=False, **kwargs):
+    '''Indexes a :class:`~papers.models.Publication` when it is saved.'''
+    if not raw:
+        index_publication(instance)
+
+@receiver(m2m_changed, sender=Publication.authors.through)
+def index_publication_authors(sender, instance, action, reverse, pk_set, **kwargs):
+    '''Re-indexes the affected publications and updates their bylines when authors are added to or removed from a :class:`~papers.models.Publication`.
+
+    If the change is made from the :class:`~papers.models.AuthorDetails` side, the instance is the author and pk_set holds the publications.
+    '''
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            index_publication(instance)
+            update_byline(instance)
+        return
+    if action == 'pre_clear':
+        instance._cleared_publications = list(instance.publication_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_publications', [])
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        for publication in Publication.objects.filter(pk__in=pk_set):
+            index_publication(publication)
+            update_byline(publication)
+
+@receiver(post_save, sender=AuthorDetails)
+def index_author_details(sender, instance, created, raw=False, **kwargs):
+    '''Re-indexes the publications of an :class:`~papers.models.AuthorDetails` and updates their bylines when it is changed.'''
+    if not raw and not created:
+        for publication in instance.publication_set.all():
+            index_publication(publication)
+            update_byline(publication)
+
+@receiver(pre_delete, sender=AuthorDetails)
+def stash_author_details_publications(sender, instance, **kwargs):
+    '''Records the publications of an :class:`~papers.models.AuthorDetails` before it and its links are deleted.'''
+    instance._deleted_publications = list(instance.publication_set.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=AuthorDetails)
+def update_deleted_author_bylines(sender, instance, **kwargs):
+    '''Updates the bylines of the publications an :class:`~papers.models.AuthorDetails` was removed from.'''
+    publication_ids = getattr(instance, '_deleted_publications', None)
+    if publication_ids:
+        update_bylines(publication_ids)
+
+@receiver(pre_save, sender=Person)
+def stash_person_names(sender, instance, raw=False, **kwargs):
+    '''Records the stored name fields of a :class:`~personnel.models.Person` before it is saved, so only changes to them update the publications.'''
+    if not raw and instance.pk is not None:
+        instance._stored_names = Person.objects.filter(pk=instance.pk).values(*PERSON_BYLINE_FIELDS).first()
+
+@receiver(post_save, sender=Person)
+def index_person_publications(sender, instance, created, raw=False, **kwargs):
+    '''Re-indexes the publications of a :class:`~personnel.models.Person` and updates their bylines when the fields they show are changed.
+
+    Saves which change none of them (such as the email or biography) do nothing.
+    The publications are re-indexed (if the name changed) and their bylines updated with a fixed number of queries.
+    '''
+    stored = getattr(instance, '_stored_names', None)
+    if raw or created or stored is None:
+        return
+    changed = set(name for name in PERSON_BYLINE_FIELDS if getattr(instance, name) != stored[name])
+    if not changed:
+        return
+    publication_ids = list(Publication.objects.filter(authors__author=instance).values_list('pk', flat=True).distinct())
+    for chunk in chunks(publication_ids):
+        if changed & set(PERSON_INDEXED_FIELDS):
+            index_publications(chunk)
+        update_bylines(chunk)
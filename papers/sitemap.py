@@ -14,6 +14,7 @@ class LabPublicationsSitemap(Sitemap):
 
     changefreq = 'yearly'
     priority = '0.7'
+    modified_fields = ('date_last_modified',)
     
     def items(self):
         '''Filters :class:`~papers.models.Publication` to show only laboratory papers.'''
@@ -28,6 +29,7 @@ class CommentarySitemap(Sitemap):
 
     changefreq = 'yearly'
     priority = '0.6'
+    modified_fields = ('modified',)
 
     def items(self):
         '''All Commentaries are shown.'''
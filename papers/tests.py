@@ -11,16 +11,79 @@ The API tests:
 
 * :class:`~PublicationResourceTests`
 
+The export tests:
+
+* :class:`~papers.tests.PublicationExportTests`
+
+The metrics tests:
+
+* :class:`~papers.tests.PublicationMetricTests`
+
+The import tests:
+
+* :class:`~papers.tests.BulkUpsertTests`
+
+* :class:`~papers.tests.PublicationImporterTests`
+
+The byline tests:
+
+* :class:`~papers.tests.PublicationBylineTests`
+
+The feed tests:
+
+* :class:`~papers.tests.PublicationFeedTests`
+
+The identifier tests:
+
+* :class:`~papers.tests.PublicationIdentifierTests`
+
+The Mendeley sync tests:
+
+* :class:`~papers.tests.MendeleySyncTests`
+
+The search tests:
+
+* :class:`~papers.tests.PublicationSearchTests`
+
 And the view tests:
 
 * :class:`~papers.tests.PublicationViewTests` 
 """
 
+import datetime
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import urlparse, parse_qs
+
+import oauth2
+from lxml import etree
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 from django.test.client import Client
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.core.cache import cache
 
-from papers.models import Publication, AuthorDetails, Person, Commentary
+from papers.api import PublicationResource
+from papers.models import Publication, AuthorDetails, Person, Commentary, PublicationMetric, SearchDocument, SearchPosting, normalize_doi, normalize_pmid, normalize_pmcid
+from papers.views import LaboratoryPaperList
+from papers.search import search, rebuild_index, highlight, tokenize, ranked_publications, score_postings
+from papers.bylines import format_byline
+from papers.utilities import bulk_upsert_publications, record_from_mendeley
+from papers.importers import parse_bibtex, parse_ris, parse_csl_json, import_publications
+from papers.metrics import update_metrics, stale_publications
+from papers.mendeley_sync import KeepAliveMendeleyClient, MendeleySync
+from lab_website.mixins import QueryBudgetExceeded
 
 MODELS = [Publication, AuthorDetails, Commentary]
 
@@ -126,7 +189,14 @@ class AuthorDetailsModelTests(TestCase):
         test_authordetail = AuthorDetails(author=Person.objects.get(pk=1), 
             order = 1, corresponding_author=True, equal_contributors=False)
         test_authordetail.save() 
+        self.assertEqual(test_authordetail.__unicode__(), '1 - Dave Bridges')
+        test_authordetail = AuthorDetails.objects.prefetch_related('publication_set').get(pk=test_authordetail.pk)
         self.assertEqual(test_authordetail.__unicode__(), '1 - None -  Dave Bridges')
+        Publication.objects.get(pk=1).authors.add(test_authordetail)
+        details = list(AuthorDetails.objects.select_related('author').prefetch_related('publication_set'))
+        with self.assertNumQueries(0):
+            self.assertTrue(all(u'%s' % detail for detail in details))
+        self.assertTrue(u'14-3-3 proteins' in u'%s' % AuthorDetails.objects.prefetch_related('publication_set').get(pk=test_authordetail.pk))
         
 class CommentaryModelTests(TestCase):
     '''This class tests various aspects of the :class:`~papers.models.Commentary` model.'''
@@ -173,6 +243,7 @@ class CommentaryModelTests(TestCase):
         test_commentary.save()
         self.assertEqual(test_commentary.__unicode__(), "Journal club summary on 14-3-3 proteins: a number of functions for a numbered protein.")                        
         
+@override_settings(SHARED_CACHE=True)
 class PublicationResourceTests(TestCase):  
     '''This class tests varios aspects of the :class:`~papers.api.PublicationResource` API model.'''
 
@@ -207,7 +278,883 @@ class PublicationResourceTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'application/json; charset=utf-8')  
         print response    
+
+    def test_api_publication_list(self):
+        '''This tests that the API lists :class:`~papers.models.Publication` objects with caching headers.'''
+        cache.clear()
+        response = self.client.get('/api/v1/publications/?format=json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(json.loads(response.content)['objects']), 2)
+        self.assertTrue('ETag' in response)
+        self.assertTrue('max-age=' in response['Cache-Control'])
+
+    def test_api_cached_response(self):
+        '''This tests that repeated and equivalent requests are answered from the cache, or with a 304, without queries.'''
+        cache.clear()
+        response = self.client.get('/api/v1/publications/?format=json&limit=5&year=2005')
+        self.assertEqual(len(json.loads(response.content)['objects']), 1)
+        with self.assertNumQueries(0):
+            cached_response = self.client.get('/api/v1/publications/?year=2005&format=json&limit=5')
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(cached_response['ETag'], response['ETag'])
+        with self.assertNumQueries(0):
+            not_modified = self.client.get('/api/v1/publications/?format=json&limit=5&year=2005', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_api_invalidated_on_save(self):
+        '''This tests that saving or deleting a publication invalidates the cached responses.'''
+        cache.clear()
+        response = self.client.get('/api/v1/publications/1/?format=json')
+        publication = Publication.objects.get(pk=1)
+        publication.journal = 'Renamed Journal'
+        publication.save()
+        changed = self.client.get('/api/v1/publications/1/?format=json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(json.loads(changed.content)['journal'], 'Renamed Journal')
+        Publication.objects.get(pk=2).delete()
+        self.assertEqual(len(json.loads(self.client.get('/api/v1/publications/?format=json').content)['objects']), 1)
+
+    def test_api_sparse_fields(self):
+        '''This tests that the fields parameter limits the serialized fields and the loaded columns.'''
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/publications/?format=json&fields=title,%20doi,absolute_url')
+        self.assertEqual(response.status_code, 200)
+        objects = json.loads(response.content)['objects']
+        self.assertEqual(len(objects), 2)
+        for publication in objects:
+            self.assertEqual(sorted(publication), ['absolute_url', 'doi', 'resource_uri', 'title'])
+            self.assertEqual(publication['absolute_url'], Publication.objects.get(title=publication['title']).get_absolute_url())
+        selects = [query['sql'] for query in queries.captured_queries if '"papers_publication"."title"' in query['sql']]
+        self.assertEqual(len(selects), 1)
+        self.assertFalse('"abstract"' in selects[0])
+        detail = json.loads(self.client.get('/api/v1/publications/1/?format=json&fields=year').content)
+        self.assertEqual(sorted(detail), ['resource_uri', 'year'])
+        self.assertEqual(self.client.get('/api/v1/publications/?format=json&fields=title,password').status_code, 400)
+
+    def test_api_cursor_pagination(self):
+        '''This tests that collections are paged with cursors, which are stable when publications are added between pages.'''
+        cache.clear()
+        expected = list(Publication.objects.values_list('pk', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            first = json.loads(self.client.get('/api/v1/publications/?format=json&limit=1').content)
+        self.assertFalse([query for query in queries.captured_queries if 'COUNT(' in query['sql']])
+        self.assertEqual([publication['id'] for publication in first['objects']], expected[:1])
+        self.assertEqual(first['meta']['previous'], None)
+        self.assertFalse('total_count' in first['meta'])
+        Publication.objects.create(title='A Newer Paper', title_slug='a-newer-paper', year=2030, publication_date=datetime.date(2030, 1, 1),
+            laboratory_paper=True, interesting_paper=False, preprint=False)
+        second = json.loads(self.client.get(first['meta']['next']).content)
+        self.assertEqual([publication['id'] for publication in second['objects']], expected[1:2])
+        self.assertEqual(second['meta']['next'], None)
+        previous = json.loads(self.client.get(second['meta']['previous']).content)
+        self.assertEqual([publication['id'] for publication in previous['objects']], expected[:1])
+        self.assertEqual(self.client.get('/api/v1/publications/?format=json&after=not-a-cursor').status_code, 400)
+        legacy = json.loads(self.client.get('/api/v1/publications/?format=json&limit=1&offset=1').content)
+        self.assertEqual(legacy['meta']['total_count'], 3)
+
+    def test_api_include_authors(self):
+        '''This tests that include=authors embeds the ordered authors, with the same number of queries for any page size.'''
+        cache.clear()
+        for publication in Publication.objects.all():
+            for order in range(3):
+                person = Person.objects.create(first_name='Author', last_name='%s %i' % (publication.pk, order), alumni=False, current_lab_member=False)
+                publication.authors.add(AuthorDetails.objects.create(author=person, order=order, corresponding_author=order == 0, equal_contributors=False))
+        with CaptureQueriesContext(connection) as single_page:
+            self.client.get('/api/v1/publications/?format=json&include=authors&limit=1')
+        cache.clear()
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get('/api/v1/publications/?format=json&include=authors')
+        self.assertEqual(len(full_page), len(single_page))
+        for publication in json.loads(response.content)['objects']:
+            expected = AuthorDetails.objects.filter(publication=publication['id']).order_by('order', 'pk')
+            self.assertEqual([author['id'] for author in publication['authors']], [details.author_id for details in expected])
+            self.assertEqual(publication['authors'][-1]['name'], 'Author %s 2' % publication['id'])
+            self.assertTrue(publication['authors'][-3]['corresponding_author'])
+        detail = json.loads(self.client.get('/api/v1/publications/1/?format=json&include=authors&fields=title').content)
+        self.assertEqual(sorted(detail), ['authors', 'resource_uri', 'title'])
+        self.assertFalse('authors' in json.loads(self.client.get('/api/v1/publications/1/?format=json').content))
+        self.assertEqual(self.client.get('/api/v1/publications/?format=json&include=projects').status_code, 400)
+
+    def test_api_streaming(self):
+        '''This tests that stream=true sends every publication in chunks, as json or xml matching the normal response.'''
+        cache.clear()
+        expected = json.loads(self.client.get('/api/v1/publications/?format=json&limit=0').content)['objects']
+        PublicationResource.stream_chunk_size = 1
+        try:
+            response = self.client.get('/api/v1/publications/?format=json&stream=true')
+            self.assertTrue(response.streaming)
+            parts = list(response.streaming_content)
+            self.assertEqual(len(parts), 4)
+            self.assertEqual(json.loads(b''.join(parts)), {'objects': expected})
+            response = self.client.get('/api/v1/publications/?format=xml&stream=true')
+            self.assertEqual(response['Content-Type'], 'application/xml; charset=utf-8')
+            document = etree.fromstring(b''.join(response.streaming_content))
+        finally:
+            del PublicationResource.stream_chunk_size
+        self.assertEqual(document.tag, 'response')
+        self.assertEqual([int(item.findtext('id')) for item in document.find('objects')], [item['id'] for item in expected])
+        self.assertEqual(self.client.get('/api/v1/publications/?format=xml&stream=true', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
        
+class PublicationExportTests(TestCase):
+    '''This class tests the BibTeX, RIS and CSL-JSON exports of :class:`~papers.models.Publication` objects.'''
+
+    fixtures = ['test_publication', 'test_publication_personnel', 'test_project']
+
+    def setUp(self):
+        '''Instantiate the test client and adds authors to the laboratory paper.'''
+        self.client = Client()
+        Publication.objects.get(pk=1).authors.add(*AuthorDetails.objects.all())
+        Publication.objects.filter(pk=1).update(date_last_modified=datetime.date(2012, 7, 21))
+
+    def get_content(self, response):
+        return ''.join(response.streaming_content).decode('utf-8')
+
+    def test_bibtex_export(self):
+        '''This tests the BibTeX export of the laboratory papers.'''
+        test_response = self.client.get('/papers/export/laboratory.bib')
+        self.assertEqual(test_response.status_code, 200)
+        self.assertTrue(test_response.streaming)
+        self.assertEqual(test_response['Content-Type'], 'application/x-bibtex; charset=utf-8')
+        self.assertEqual(test_response['Content-Disposition'], 'attachment; filename="laboratory.bib"')
+        content = self.get_content(test_response)
+        self.assertTrue(content.startswith(u'@article{Bridges2005-1,\n  title = {14-3-3 proteins: a number of functions for a numbered protein.},\n'))
+        self.assertTrue(u'  author = {Bridges, Dave and Moorhead, Greg},\n' in content)
+        self.assertTrue(u'  doi = {10.1126/stke.2962005re10},\n' in content)
+
+    def test_ris_export(self):
+        '''This tests the RIS export of the interesting papers.'''
+        content = self.get_content(self.client.get('/papers/export/interesting.ris'))
+        self.assertTrue(content.startswith(u'TY  - JOUR\nTI  - THE RELATION'))
+        self.assertTrue(u'SP  - 265\nEP  - 299\n' in content)
+        self.assertTrue(content.endswith(u'ER  - \n'))
+
+    def test_csl_json_export(self):
+        '''This tests the CSL-JSON export of a person's papers and an empty project.'''
+        items = json.loads(self.get_content(self.client.get('/papers/export/person/greg-moorhead.json')))
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['author'], [{'family': 'Bridges', 'given': 'Dave'}, {'family': 'Moorhead', 'given': 'Greg'}])
+        self.assertEqual(items[0]['issued'], {'date-parts': [[2005]]})
+        self.assertEqual(json.loads(self.get_content(self.client.get('/papers/export/project/fixture-project.json'))), [])
+        self.assertEqual(self.client.get('/papers/export/person/not-a-person.json').status_code, 404)
+
+    def test_export_chunks(self):
+        '''This tests that exports larger than one chunk are complete and in order.'''
+        for number in range(250):
+            Publication(title='Export Paper %i' % number, year=1900 + number, laboratory_paper=True, interesting_paper=False, preprint=False).save()
+        content = self.get_content(self.client.get('/papers/export/laboratory.ris'))
+        self.assertEqual(content.count(u'ER  - '), 251)
+        self.assertTrue(content.index(u'Export Paper 249') < content.index(u'Export Paper 0'))
+
+    def test_conditional_export(self):
+        '''This tests that an unchanged export returns a 304 response, and that changes today are not cached.'''
+        test_response = self.client.get('/papers/export/laboratory.bib')
+        self.assertEqual(test_response['Last-Modified'], 'Sat, 21 Jul 2012 00:00:00 GMT')
+        cached_response = self.client.get('/papers/export/laboratory.bib', HTTP_IF_NONE_MATCH=test_response['ETag'])
+        self.assertEqual(cached_response.status_code, 304)
+        Publication.objects.get(pk=1).save()
+        changed_response = self.client.get('/papers/export/laboratory.bib', HTTP_IF_NONE_MATCH=test_response['ETag'])
+        self.assertEqual(changed_response.status_code, 200)
+        self.assertFalse(changed_response.has_header('ETag'))
+
+class PLOSStandInHandler(BaseHTTPRequestHandler):
+    '''This is a stand-in for the PLOS ALM API which returns metrics for any requested DOI, except those with the 10.9999 prefix.'''
+
+    def do_GET(self):
+        dois = parse_qs(urlparse(self.path).query)['ids'][0].split(',')
+        self.server.requests.append(dois)
+        body = json.dumps([{'doi': doi.upper(), 'sources': [
+            {'name': 'mendeley', 'metrics': {'total': 12}},
+            {'name': 'twitter', 'metrics': {'total': 3}},
+            {'name': 'unknown', 'metrics': {'total': 1}}]} for doi in dois if not doi.startswith('10.9999/')])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class PublicationMetricTests(TestCase):
+    '''This class tests the stored article level metrics in :mod:`papers.metrics`.'''
+
+    fixtures = ['test_publication', 'test_publication_personnel']
+
+    def setUp(self):
+        '''Starts a stand-in PLOS ALM server.'''
+        self.client = Client()
+        self.server = MendeleyStandInServer(('127.0.0.1', 0), PLOSStandInHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever).start()
+        self.url = 'http://127.0.0.1:%i/api/v3/articles' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_update_metrics(self):
+        '''This tests that metrics are fetched in batches for publications with a DOI and stored.'''
+        for number in range(3):
+            Publication(title='Metrics Paper %i' % number, doi='10.1371/journal.%i' % number, laboratory_paper=True, interesting_paper=False, preprint=False).save()
+        with self.settings(PLOS_ALM_URL=self.url):
+            requested, updated = update_metrics(batch_size=2, interval=0)
+        self.assertEqual((requested, updated), (4, 4))
+        self.assertEqual([len(batch) for batch in self.server.requests], [2, 2])
+        metrics = Publication.objects.get(pk=1).metrics.all()
+        self.assertEqual([(metric.source, metric.label, metric.count) for metric in metrics], [('mendeley', 'Mendeley', 12), ('twitter', 'Tweets', 3)])
+        self.assertEqual(Publication.objects.get(pk=1).metric_totals(), [('Readers', 12), ('Social Networks', 3)])
+
+        #the metrics are now current, so nothing is requested
+        with self.settings(PLOS_ALM_URL=self.url):
+            self.assertEqual(update_metrics(interval=0), (0, 0))
+        self.assertEqual(stale_publications(datetime.timedelta(0)).count(), 4)
+
+    def test_unknown_dois_checked(self):
+        '''This tests that a DOI without metrics is marked as checked, so it is not requested again on the next run.'''
+        unknown = Publication.objects.create(title='Unknown Paper', doi='10.9999/unknown', laboratory_paper=True, interesting_paper=False, preprint=False)
+        with self.settings(PLOS_ALM_URL=self.url):
+            self.assertEqual(update_metrics(interval=0), (2, 1))
+            self.assertEqual(update_metrics(interval=0), (0, 0))
+        self.assertEqual(self.server.requests, [['10.1126/stke.2962005re10', '10.9999/unknown']])
+        self.assertFalse(unknown.metrics.exists())
+        self.assertIsNotNone(Publication.objects.get(pk=unknown.pk).metrics_checked)
+
+    def test_prefixed_doi(self):
+        '''This tests that a DOI stored with a resolver prefix and in upper case is requested and matched in its normalized form.'''
+        Publication.objects.filter(pk=1).update(doi=' https://dx.doi.org/10.1126/STKE.2962005RE10')
+        with self.settings(PLOS_ALM_URL=self.url):
+            self.assertEqual(update_metrics(interval=0), (1, 1))
+        self.assertEqual(self.server.requests, [['10.1126/stke.2962005re10']])
+        self.assertEqual(Publication.objects.get(pk=1).metrics.count(), 2)
+
+    def test_metrics_rendered(self):
+        '''This tests that stored metrics are shown on the detail and list pages, without the API key.'''
+        PublicationMetric.objects.create(publication_id=1, source='mendeley', label='Mendeley', category='readers', count=12)
+        test_response = self.client.get('/papers/14-3-3-proteins-a-number-of-functions-for-a-numbered-protein/')
+        self.assertTemplateUsed(test_response, 'plos_api_snippet.html')
+        self.assertContains(test_response, '<strong>Mendeley:</strong> 12')
+        self.assertNotContains(test_response, 'api_key')
+        test_response = self.client.get('/papers/')
+        self.assertContains(test_response, 'Readers: 12')
+
+class BulkUpsertTests(TestCase):
+    '''This class tests importing publications with :func:`~papers.utilities.bulk_upsert_publications`.'''
+
+    fixtures = ['test_publication', 'test_publication_personnel']
+
+    def records(self, count):
+        '''Returns a list of count new records with two authors each.'''
+        return [{'title': 'Imported Paper %i' % number,
+            'doi': '10.1000/IMPORT.%i' % number,
+            'year': '2014',
+            'authors': [('Dave', 'Bridges'), ('New', 'Author %i' % (number % 3))]} for number in range(count)]
+
+    def test_create(self):
+        '''This tests that new publications, people and ordered authors are created.'''
+        stats = bulk_upsert_publications(self.records(10))
+        self.assertEqual((stats.created, stats.updated, stats.unchanged, stats.skipped), (10, 0, 0, 0))
+        publication = Publication.objects.get(doi='10.1000/IMPORT.4')
+        self.assertEqual(publication.title_slug, 'imported-paper-4')
+        self.assertEqual(publication.year, 2014)
+        self.assertEqual(publication.laboratory_paper, False)
+        self.assertEqual([(author.order, author.author.last_name) for author in publication.authors.all()], [(1, 'Bridges'), (2, 'Author 1')])
+        self.assertEqual(publication.authors.all()[0].author.pk, 1)
+        self.assertEqual(Person.objects.filter(first_name='New').count(), 3)
+        self.assertEqual(search('imported')[0].publication.title[:14], 'Imported Paper')
+
+    def test_rerun_is_unchanged(self):
+        '''This tests that importing the same records twice does not create or update anything.'''
+        bulk_upsert_publications(self.records(20))
+        details_count = AuthorDetails.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            stats = bulk_upsert_publications(self.records(20))
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (0, 0, 20))
+        self.assertEqual(AuthorDetails.objects.count(), details_count)
+        self.assertTrue(len(queries) < 10)
+
+    def test_update_changed_fields(self):
+        '''This tests that records are matched case insensitively on DOI and only changed fields are written.'''
+        bulk_upsert_publications(self.records(3))
+        records = self.records(3)
+        records[1]['doi'] = '10.1000/import.1'
+        records[1]['journal'] = 'Cell'
+        records[2]['authors'] = [('New', 'Author 2')]
+        stats = bulk_upsert_publications(records)
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (0, 2, 1))
+        self.assertEqual(Publication.objects.get(title='Imported Paper 1').journal, 'Cell')
+        self.assertEqual(Publication.objects.get(title='Imported Paper 1').doi, '10.1000/import.1')
+        self.assertEqual([author.author.last_name for author in Publication.objects.get(title='Imported Paper 2').authors.all()], ['Author 2'])
+
+    def test_match_existing(self):
+        '''This tests that existing publications are matched by PMID and duplicate slugs are avoided.'''
+        stats = bulk_upsert_publications([
+            {'title': '14-3-3 proteins: a number of functions for a numbered protein.', 'pmid': 16091624, 'journal': 'Sci STKE'},
+            {'title': '14-3-3 proteins: a number of functions for a numbered protein.', 'pmid': 1},
+            {'doi': '10.1000/untitled'}])
+        self.assertEqual((stats.created, stats.updated, stats.skipped), (1, 1, 1))
+        self.assertEqual(Publication.objects.get(pk=1).journal, 'Sci STKE')
+        self.assertEqual(Publication.objects.get(pmid=1).title_slug, '14-3-3-proteins-a-number-of-functions-for-a-numbered-protein-2')
+
+    def test_record_from_mendeley(self):
+        '''This tests the conversion of a Mendeley document into a record.'''
+        record = record_from_mendeley({'id': '12345', 'title': 'A Paper', 'published_in': 'Nature', 'year': 2012,
+            'identifiers': {'doi': '10.1000/abc'}, 'authors': [{'forename': 'Dave', 'surname': 'Bridges'}]})
+        self.assertEqual(record, {'mendeley_id': 12345, 'title': 'A Paper', 'journal': 'Nature', 'year': 2012,
+            'doi': '10.1000/abc', 'laboratory_paper': True, 'authors': [('Dave', 'Bridges')]})
+
+BIBTEX_SAMPLE = u"""
+@string{stke = "Sci. STKE"}
+@comment{exported from a reference manager}
+@article{Bridges2005,
+  title = {14-3-3 proteins: a number of functions for a {N}umbered protein (a review)},
+  author = {Bridges, Dave and Greg Moorhead},
+  journal = stke,
+  year = 2005,
+  volume = "2005", number = {296},
+  pages = {re10--re12},
+  doi = {10.1126/STKE.2962005re10},
+  abstract = {Proteins \\& {\\{}peptides\\}}
+}
+@incollection(Chapter2010,
+  title = "A Book Chapter",
+  author = {Jos\xe9 M. Garc\xeda},
+  booktitle = {Signalling},
+  year = {2010}
+)
+"""
+
+RIS_SAMPLE = u"""TY  - JOUR
+TI  - A RIS Paper
+AU  - Bridges, Dave
+AU  - Moorhead, Greg
+JO  - Cell
+PY  - 2014/05/01
+SP  - 1
+EP  - 9
+AN  - PMID:123456
+AB  - The first line
+  continues here.
+ER  - 
+TY  - BOOK
+TI  - A RIS Book
+ER  - 
+"""
+
+class PublicationImporterTests(TestCase):
+    '''This class tests the streaming parsers and the batch importer in :mod:`papers.importers`.'''
+
+    fixtures = ['test_publication', 'test_publication_personnel']
+
+    def test_parse_bibtex(self):
+        '''This tests that BibTeX entries, macros, escapes and both delimiters are parsed.'''
+        records = list(parse_bibtex(io.StringIO(BIBTEX_SAMPLE)))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['title'], u'14-3-3 proteins: a number of functions for a Numbered protein (a review)')
+        self.assertEqual(records[0]['authors'], [(u'Dave', u'Bridges'), (u'Greg', u'Moorhead')])
+        self.assertEqual(records[0]['journal'], u'Sci. STKE')
+        self.assertEqual((records[0]['year'], records[0]['volume'], records[0]['issue'], records[0]['pages']), (2005, u'2005', u'296', u're10-re12'))
+        self.assertEqual(records[0]['abstract'], u'Proteins & {peptides}')
+        self.assertEqual(records[0]['type'], 'journal-article')
+        self.assertEqual(records[1]['type'], 'book-section')
+        self.assertEqual(records[1]['journal'], u'Signalling')
+        self.assertEqual(records[1]['authors'], [(u'Jos\xe9 M.', u'Garc\xeda')])
+
+    def test_parse_ris(self):
+        '''This tests that RIS references, continuation lines and page ranges are parsed.'''
+        records = list(parse_ris(io.StringIO(RIS_SAMPLE)))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['authors'], [(u'Dave', u'Bridges'), (u'Greg', u'Moorhead')])
+        self.assertEqual((records[0]['year'], records[0]['pages'], records[0]['pmid']), (2014, u'1-9', u'123456'))
+        self.assertEqual(records[0]['abstract'], u'The first line continues here.')
+        self.assertEqual(records[1]['type'], 'book')
+
+    def test_parse_csl_json(self):
+        '''This tests that CSL-JSON items are decoded one at a time, across buffer boundaries.'''
+        items = [{'title': 'Item %i' % number, 'type': 'article-journal', 'author': [{'family': 'Bridges', 'given': 'Dave'}],
+            'issued': {'date-parts': [[2000 + number]]}} for number in range(20)]
+        records = list(parse_csl_json(io.StringIO(json.dumps(items).decode('utf-8')), chunk_size=50))
+        self.assertEqual([record['title'] for record in records], ['Item %i' % number for number in range(20)])
+        self.assertEqual(records[3]['year'], 2003)
+        self.assertEqual(records[3]['authors'], [('Dave', 'Bridges')])
+        self.assertEqual(list(parse_csl_json(io.StringIO(u'[]'))), [])
+
+    def test_export_round_trip(self):
+        '''This tests that each export format can be imported again without creating duplicates.'''
+        Publication.objects.get(pk=1).authors.add(*AuthorDetails.objects.all())
+        for extension, parser in (('bib', parse_bibtex), ('ris', parse_ris), ('json', parse_csl_json)):
+            content = ''.join(self.client.get('/papers/export/laboratory.%s' % extension).streaming_content).decode('utf-8')
+            records = list(parser(io.StringIO(content)))
+            self.assertEqual(records[0]['authors'], [(u'Dave', u'Bridges'), (u'Greg', u'Moorhead')])
+            stats = import_publications(records)
+            self.assertEqual((stats.created, stats.updated, stats.unchanged), (0, 0, 1))
+
+    def test_import_batches(self):
+        '''This tests that records are imported in batches, resolving authors to existing people.'''
+        records = [{'title': 'Batch Paper %i' % number, 'doi': '10.1000/batch.%i' % number,
+            'authors': [(u'dave', u'BRIDGES'), (u'Jos\xe9 M.', u'Garc\xeda'), (u'Jose M', u'Garcia')]} for number in range(25)]
+        batches = []
+        stats = import_publications(records, batch_size=10, defaults={'interesting_paper': True}, progress=lambda count, elapsed: batches.append(count))
+        self.assertEqual(batches, [10, 20, 25])
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (25, 0, 0))
+        self.assertEqual(Publication.objects.filter(interesting_paper=True, title__startswith='Batch Paper').count(), 25)
+        authors = Publication.objects.get(doi='10.1000/batch.7').authors.all()
+        self.assertEqual(authors[0].author.pk, 1)
+        self.assertEqual(authors[1].author, authors[2].author)
+        self.assertEqual(Person.objects.count(), 3)
+        self.assertEqual(SearchDocument.objects.filter(publication__title__startswith='Batch Paper').count(), 25)
+        self.assertEqual(Publication.objects.get(doi='10.1000/batch.7').byline, u'Dave Bridges, Jos\xe9 M. Garc\xeda and Jos\xe9 M. Garc\xeda')
+
+    def test_import_command(self):
+        '''This tests the import_publications management command.'''
+        handle, path = tempfile.mkstemp(suffix='.ris')
+        try:
+            with io.open(handle, 'w', encoding='utf-8') as ris_file:
+                ris_file.write(RIS_SAMPLE)
+            output = io.BytesIO()
+            call_command('import_publications', path, '--laboratory', stdout=output)
+        finally:
+            os.remove(path)
+        self.assertTrue('2 created, 0 updated, 0 unchanged, 0 skipped.' in output.getvalue())
+        self.assertTrue(Publication.objects.get(title='A RIS Book').laboratory_paper)
+
+class MendeleyStandInHandler(BaseHTTPRequestHandler):
+    '''This is a stand-in for the Mendeley library API which serves document details over HTTP/1.1.
+
+    Documents with an id starting with *flaky* fail with a 503 the first time they are requested, *missing* documents always fail.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def send_json(self, status, data):
+        body = json.dumps(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/').split('/')
+        if path[-1] == 'authored':
+            return self.send_json(200, {'document_ids': self.server.document_ids})
+        document_id = path[-1]
+        with self.server.lock:
+            self.server.requests[document_id] = self.server.requests.get(document_id, 0) + 1
+            attempt = self.server.requests[document_id]
+        if document_id.startswith('missing') or (document_id.startswith('flaky') and attempt == 1):
+            return self.send_json(503, {'error': 'unavailable'})
+        self.send_json(200, {'id': document_id, 'title': 'Document %s' % document_id})
+
+    def log_message(self, *args):
+        pass
+
+class MendeleyStandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class MendeleySyncTests(TestCase):
+    '''This class tests the :class:`~papers.mendeley_sync.MendeleySync` engine against a local stand-in Mendeley server.'''
+
+    def setUp(self):
+        '''Starts the stand-in server and creates a client for it.'''
+        self.server = MendeleyStandInServer(('127.0.0.1', 0), MendeleyStandInHandler)
+        self.server.connections = 0
+        self.server.requests = {}
+        self.server.lock = threading.Lock()
+        self.server.document_ids = ['doc%i' % number for number in range(40)]
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.client = KeepAliveMendeleyClient('key', 'secret', {'host': '127.0.0.1', 'port': self.server.server_address[1]})
+        self.client.access_token = oauth2.Token('token', 'secret')
+
+    def tearDown(self):
+        '''Closes the kept-alive connections, so the handlers of the stand-in server finish, and then stops it.'''
+        MendeleySync(self.client).close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+
+    def test_fetch_authored(self):
+        '''This tests that all documents are fetched, reusing one connection per worker.'''
+        sync = MendeleySync(self.client, workers=4)
+        documents, failures = sync.fetch_authored()
+        self.assertEqual(sorted(documents.keys()), sorted(self.server.document_ids))
+        self.assertEqual(documents['doc3']['title'], 'Document doc3')
+        self.assertEqual(failures, {})
+        self.assertEqual(sync.stats.documents, 40)
+        self.assertTrue(self.server.connections <= 5)
+        self.assertEqual(self.client.mendeley.connections_opened, self.server.connections)
+        self.assertEqual(self.client.mendeley._connections, set())
+
+    def test_fetch_retries(self):
+        '''This tests that temporary errors are retried and permanent errors are reported as failures.'''
+        sync = MendeleySync(self.client, workers=2, retries=2, backoff=0.01)
+        documents, failures = sync.fetch_all(['flaky1', 'doc1', 'missing1'])
+        self.assertEqual(sorted(documents.keys()), ['doc1', 'flaky1'])
+        self.assertEqual(failures.keys(), ['missing1'])
+        self.assertEqual(failures['missing1'].status, 503)
+        self.assertEqual(self.server.requests['missing1'], 3)
+        self.assertEqual(sync.stats.retries, 3)
+        self.assertEqual(sync.stats.failures, 1)
+
+    def test_sync_command_failures(self):
+        '''This tests that the sync_mendeley command imports the fetched documents, prints the sync statistics and fails when any document could not be fetched.'''
+        self.server.document_ids = ['doc1', 'missing1']
+        directory = tempfile.mkdtemp()
+        working_directory = os.getcwd()
+        output, errors = io.BytesIO(), io.BytesIO()
+        try:
+            os.chdir(directory)
+            with open('mendeley_api_keys.pkl', 'w') as keys:
+                pickle.dump({'request_token': None, 'access_token': oauth2.Token('token', 'secret')}, keys)
+            with self.settings(MENDELEY_CONSUMER_KEY='key', MENDELEY_SECRET_KEY='secret',
+                    MENDELEY_API_OPTIONS={'host': '127.0.0.1', 'port': self.server.server_address[1]}):
+                self.assertRaises(CommandError, call_command, 'sync_mendeley', stdout=output, stderr=errors)
+        finally:
+            os.chdir(working_directory)
+            shutil.rmtree(directory)
+        self.assertTrue('Fetched 1 documents in ' in output.getvalue())
+        self.assertTrue('with 3 retries, 1 failed.' in output.getvalue())
+        self.assertTrue('Imported 1 documents: 1 created' in output.getvalue())
+        self.assertTrue('Could not fetch Mendeley document missing1' in errors.getvalue())
+        self.assertTrue(Publication.objects.filter(title='Document doc1').exists())
+
+    def test_reconnect_after_server_close(self):
+        '''This tests that a request is resent on a new connection if the kept-alive connection was closed.'''
+        sync = MendeleySync(self.client, workers=1)
+        self.assertEqual(sync.fetch('doc1')['id'], 'doc1')
+        self.client.mendeley._local.connection.sock.close()
+        self.assertEqual(sync.fetch('doc2')['id'], 'doc2')
+        self.assertEqual(sync.stats.retries, 0)
+
+class PublicationSearchTests(TestCase):
+    '''This class tests the full text search index for :class:`~papers.models.Publication` objects.'''
+
+    fixtures = ['test_publication', 'test_publication_personnel']
+
+    def setUp(self):
+        '''Instantiate the test client and index the fixtures.'''
+        self.client = Client()
+        rebuild_index()
+
+    def test_tokenize(self):
+        '''This tests that terms are case folded, accent stripped and stop words are removed.'''
+        self.assertEqual(tokenize(u'The Role of Prot\xe9ines in Insulin'), [u'role', u'proteines', u'insulin'])
+
+    def test_search_title(self):
+        '''This tests that a publication can be found by a word in its title.'''
+        results = search('catecholamines')
+        self.assertEqual([result.publication.pk for result in results], [2])
+
+    def test_search_ranking(self):
+        '''This tests that a match in the title ranks above a match in the abstract only.'''
+        test_publication = Publication(title='Scaffolding in the cell', laboratory_paper=True, interesting_paper=False, preprint=False)
+        test_publication.save()
+        results = search('scaffolding')
+        self.assertEqual(results[0].publication, test_publication)
+        self.assertEqual(len(results), 3)
+
+    def test_search_no_results(self):
+        '''This tests that unknown terms and stop words return no results.'''
+        self.assertEqual(search('zebrafish'), [])
+        self.assertEqual(search('the of'), [])
+
+    def test_index_updated_on_save(self):
+        '''This tests that changing a title updates the index.'''
+        test_publication = Publication.objects.get(pk=2)
+        test_publication.title = 'Glycogen metabolism'
+        test_publication.save()
+        self.assertEqual(search('catecholamines'), [])
+        self.assertEqual(search('glycogen')[0].publication.pk, 2)
+
+    def test_index_updated_on_author_change(self):
+        '''This tests that publications can be found by author once the authors are added.'''
+        self.assertEqual(search('moorhead'), [])
+        Publication.objects.get(pk=1).authors.add(*AuthorDetails.objects.all())
+        self.assertEqual([result.publication.pk for result in search('moorhead')], [1])
+        Publication.objects.get(pk=1).authors.clear()
+        self.assertEqual(search('moorhead'), [])
+
+    def test_index_removed_on_delete(self):
+        '''This tests that deleted publications are not returned.'''
+        Publication.objects.get(pk=2).delete()
+        self.assertEqual(search('catecholamines'), [])
+
+    def test_ranked_publications(self):
+        '''This tests that reading the postings in order of weight finds the same best publications as scoring every posting.'''
+        for number in range(30):
+            Publication(title=' '.join(['alpha'] * (number % 4) + ['beta'] * (number % 7) + ['gamma'] * (number % 3)),
+                laboratory_paper=True, interesting_paper=False, preprint=False).save()
+        idfs = {u'alpha': 0.5, u'beta': 1.5, u'gamma': 1.0}
+        for limit in (1, 3, 10, 40):
+            ranked = ranked_publications(idfs, limit)
+            scored = score_postings(SearchPosting.objects.filter(term__in=idfs.keys()), idfs, limit)
+            self.assertEqual([round(score, 6) for publication_id, score in ranked], [round(score, 6) for publication_id, score in scored])
+
+    def test_highlight(self):
+        '''This tests that matching terms are marked and the text is escaped.'''
+        self.assertEqual(highlight(u'Insulin <and> Glucose', set([u'glucose'])), u'Insulin &lt;and&gt; <mark>Glucose</mark>')
+
+    def test_search_query_count(self):
+        '''This tests that the number of queries does not depend on the number of results.'''
+        with CaptureQueriesContext(connection) as initial_queries:
+            search('phosphorylase')
+        for number in range(5):
+            Publication(title='Phosphorylase %i' % number, laboratory_paper=True, interesting_paper=False, preprint=False).save()
+        with CaptureQueriesContext(connection) as final_queries:
+            self.assertEqual(len(search('phosphorylase')), 6)
+        self.assertEqual(len(initial_queries), len(final_queries))
+
+    def test_search_view(self):
+        '''This tests the paper-search view, ensuring that templates are loaded correctly.'''
+        test_response = self.client.get('/papers/search', {'q': 'catecholamines'})
+        self.assertEqual(test_response.status_code, 200)
+        self.assertTemplateUsed(test_response, 'paper-search.html')
+        self.assertTemplateUsed(test_response, 'paper-detail-snippet.html')
+        self.assertEqual(test_response.context['query'], 'catecholamines')
+        self.assertEqual(test_response.context['results'][0].publication.pk, 2)
+        self.assertContains(test_response, '<mark>CATECHOLAMINES</mark>')
+
+        empty_response = self.client.get('/papers/search')
+        self.assertEqual(empty_response.status_code, 200)
+        self.assertEqual(empty_response.context['results'], [])
+
+class PublicationBylineTests(TestCase):
+    '''This class tests the stored author byline of :class:`~papers.models.Publication` objects, see :mod:`papers.bylines`.'''
+
+    fixtures = ['test_publication', 'test_publication_personnel']
+
+    def setUp(self):
+        '''Adds Dave Bridges and Greg Moorhead as the authors of the first paper.'''
+        self.publication = Publication.objects.get(pk=1)
+        self.first_author = AuthorDetails.objects.create(author=Person.objects.get(pk=1), order=1, corresponding_author=False, equal_contributors=True)
+        self.second_author = AuthorDetails.objects.create(author=Person.objects.get(pk=2), order=2, corresponding_author=True, equal_contributors=True)
+        self.publication.authors.add(self.first_author, self.second_author)
+
+    def byline(self):
+        return Publication.objects.filter(pk=1).values_list('byline', flat=True)[0]
+
+    def test_format_byline(self):
+        '''This tests that names are joined, marked and linked.'''
+        author = {'first_name': 'A', 'last_name': 'One', 'name_slug': 'a-one', 'current_lab_member': False, 'corresponding_author': False, 'equal_contributors': False}
+        self.assertEqual(format_byline([]), (u'', u''))
+        self.assertEqual(format_byline([author])[0], u'A One')
+        self.assertEqual(format_byline([author, dict(author, last_name='Two')])[0], u'A One and A Two')
+        plain, html = format_byline([author, dict(author, last_name='<Two>', corresponding_author=True), dict(author, last_name='Three', name_slug='a-three', current_lab_member=True)])
+        self.assertEqual(plain, u'A One, A <Two>* and A Three')
+        self.assertTrue(u'A &lt;Two&gt;<sup title="Corresponding author">*</sup>' in html)
+        self.assertTrue(u'<a itemprop="author" itemscope itemtype="http://schema.org/Person" href="/people/a-three/" class="plain-link"><span itemprop="name">A Three</span></a>' in html)
+
+    def test_byline_updated_on_author_change(self):
+        '''This tests that the byline follows authors being added, changed, removed and deleted.'''
+        self.assertEqual(self.byline(), u'Dave Bridges\u2020 and Greg Moorhead*\u2020')
+        self.second_author.equal_contributors = False
+        self.second_author.save()
+        self.assertEqual(self.byline(), u'Dave Bridges\u2020 and Greg Moorhead*')
+        self.publication.authors.remove(self.first_author)
+        self.assertEqual(self.byline(), u'Greg Moorhead*')
+        self.second_author.delete()
+        self.assertEqual(self.byline(), u'')
+
+    def test_byline_updated_on_person_change(self):
+        '''This tests that the byline is updated when an author changes their name.'''
+        person = Person.objects.get(pk=2)
+        person.first_name = 'Gregory'
+        person.save()
+        self.assertEqual(self.byline(), u'Dave Bridges\u2020 and Gregory Moorhead*\u2020')
+        self.assertEqual(search('gregory')[0].publication, self.publication)
+
+    def test_person_change_without_name(self):
+        '''This tests that saving a person without changing the fields shown in bylines leaves their publications alone.'''
+        person = Person.objects.get(pk=2)
+        person.email = 'greg@example.com'
+        with CaptureQueriesContext(connection) as queries:
+            person.save()
+        self.assertFalse([query for query in queries if 'papers_' in query['sql']])
+
+    def test_bulk_upsert_byline(self):
+        '''This tests that publications created in bulk have a byline.'''
+        bulk_upsert_publications([{'title': 'Imported Paper', 'doi': '10.1000/byline', 'authors': [('Dave', 'Bridges'), ('New', 'Author')]}])
+        publication = Publication.objects.get(doi='10.1000/byline')
+        self.assertEqual(publication.byline, u'Dave Bridges and New Author')
+        self.assertTrue(u'class="plain-link"' in publication.byline_html)
+
+    def test_list_does_not_load_authors(self):
+        '''This tests that the laboratory-papers list shows the byline without querying the author tables.'''
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/papers/')
+        self.assertContains(response, u'Greg Moorhead<sup title="Corresponding author">*</sup>')
+        self.assertFalse([query for query in queries if 'papers_authordetails' in query['sql']])
+
+@override_settings(SHARED_CACHE=True)
+class PublicationFeedTests(TestCase):
+    '''This class tests the conditional requests and caching of the paper feeds, see :class:`~lab_website.feeds.ConditionalFeed`.'''
+
+    fixtures = ['test_publication', 'test_publication_personnel']
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_feed_validators(self):
+        '''This tests that the feed has an ETag and Last-Modified header and returns 304 responses for them.'''
+        response = self.client.get('/feeds/lab-papers/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '14-3-3 proteins')
+        self.assertEqual(self.client.get('/feeds/lab-papers/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/feeds/lab-papers/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_unshared_cache(self):
+        '''This tests that with a cache local to each process the feed has no validators, so a change made by another process is never hidden.'''
+        with self.settings(SHARED_CACHE=None):
+            response = self.client.get('/feeds/lab-papers/')
+            self.assertFalse(response.has_header('ETag'))
+            Publication.objects.filter(pk=1).update(title='Renamed Elsewhere')
+            self.assertContains(self.client.get('/feeds/lab-papers/'), 'Renamed Elsewhere')
+            response = self.client.get('/api/v1/publications/1/?format=json')
+            self.assertContains(response, 'Renamed Elsewhere')
+            self.assertFalse(response.has_header('ETag'))
+
+    def test_poll_query_count(self):
+        '''This tests that polling a cached feed makes a single query, whether or not it has changed.'''
+        response = self.client.get('/feeds/lab-papers/')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/feeds/lab-papers/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/feeds/lab-papers/').content, response.content)
+
+    def test_invalidated_on_save(self):
+        '''This tests that saving, bulk importing or renaming an author changes the ETag and the cached content.'''
+        etag = self.client.get('/feeds/lab-papers/')['ETag']
+        publication = Publication.objects.get(pk=1)
+        publication.title = 'Renamed Paper'
+        publication.save()
+        response = self.client.get('/feeds/lab-papers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Renamed Paper')
+        bulk_upsert_publications([{'title': 'Imported Paper', 'laboratory_paper': True}])
+        self.assertContains(self.client.get('/feeds/lab-papers/', HTTP_IF_NONE_MATCH=response['ETag']), 'Imported Paper')
+        etag = self.client.get('/feeds/lab-papers/')['ETag']
+        person = Person.objects.get(pk=1)
+        person.save()
+        self.assertEqual(self.client.get('/feeds/lab-papers/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_commentary_feed_query_count(self):
+        '''This tests that the number of queries to render the commentary feed does not depend on the number of commentaries.'''
+        person = Person.objects.get(pk=1)
+        Commentary.objects.create(paper=Publication.objects.get(pk=1), author=person, comments='First commentary')
+        self.client.get('/feeds/commentaries/')
+        cache.clear()
+        with CaptureQueriesContext(connection) as initial_queries:
+            self.assertContains(self.client.get('/feeds/commentaries/'), 'First commentary')
+        for number in range(5):
+            Commentary.objects.create(paper=Publication.objects.get(pk=2), author=person if number % 2 else None, comments='Commentary %i' % number)
+        cache.clear()
+        with CaptureQueriesContext(connection) as final_queries:
+            response = self.client.get('/feeds/commentaries/')
+        self.assertEqual(response.content.count('<item>'), 6)
+        self.assertEqual(len(initial_queries), len(final_queries))
+
+    def test_feed_item_limit(self):
+        '''This tests that the feed has at most FEED_ITEM_LIMIT items and links to RFC 5005 archive pages of the older items.'''
+        for number in range(6):
+            Publication.objects.create(title='Feed Paper %i' % number, laboratory_paper=True, interesting_paper=False, preprint=False)
+        with self.settings(FEED_ITEM_LIMIT=2):
+            response = self.client.get('/feeds/lab-papers/')
+            self.assertEqual(response.content.count('<item>'), 3)
+            titles = etree.fromstring(response.content).xpath('//item/title/text()')
+            self.assertEqual(titles, ['Feed Paper 5', 'Feed Paper 4', 'Feed Paper 3'])
+            self.assertContains(response, '/feeds/lab-papers/archive/2" rel="prev-archive"></atom:link>')
+            self.assertNotContains(response, '<fh:archive>')
+            response = self.client.get('/feeds/lab-papers/archive/1/')
+            self.assertContains(response, '14-3-3 proteins')
+            self.assertContains(response, 'Feed Paper 0')
+            self.assertEqual(response.content.count('<item>'), 2)
+            self.assertContains(response, 'xmlns:fh="http://purl.org/syndication/history/1.0"')
+            self.assertContains(response, '<fh:archive></fh:archive>')
+            self.assertContains(response, 'rel="current"')
+            self.assertContains(response, 'archive/2" rel="next-archive"')
+            self.assertNotContains(response, 'prev-archive')
+            response = self.client.get('/feeds/lab-papers/archive/2/')
+            self.assertContains(response, 'archive/1" rel="prev-archive"')
+            self.assertNotContains(response, 'next-archive')
+            self.assertEqual(self.client.get('/feeds/lab-papers/archive/3/').status_code, 404)
+
+    def test_feed_archives_partition_items(self):
+        '''This tests that following the prev-archive links from the current feed finds every item exactly once, whatever the number of items.'''
+        for number in range(7):
+            with self.settings(FEED_ITEM_LIMIT=3):
+                titles = []
+                url = '/feeds/lab-papers/'
+                while url:
+                    feed = etree.fromstring(self.client.get(url).content)
+                    titles.extend(feed.xpath('//item/title/text()'))
+                    links = feed.xpath('//atom:link[@rel="prev-archive"]/@href', namespaces={'atom': 'http://www.w3.org/2005/Atom'})
+                    url = urlparse(links[0]).path if links else None
+            self.assertEqual(sorted(titles), sorted(Publication.objects.filter(laboratory_paper=True).values_list('title', flat=True)))
+            Publication.objects.create(title='Feed Paper %i' % number, laboratory_paper=True, interesting_paper=False, preprint=False)
+
+class PublicationIdentifierTests(TestCase):
+    '''This class tests the normalized identifiers of :class:`~papers.models.Publication` and the paper-identifier view.'''
+
+    fixtures = ['test_publication', 'test_publication_personnel']
+
+    def setUp(self):
+        '''The fixtures are loaded without calling save, so the doi_key is filled in as after an upgrade.'''
+        call_command('backfill_identifiers', stdout=io.BytesIO())
+        self.client = Client()
+
+    def test_normalize(self):
+        '''This tests that DOIs are case folded and stripped of resolver prefixes and PMCIDs are converted to integers.'''
+        self.assertEqual(normalize_doi(' https://dx.doi.org/10.1126/STKE.2962005RE10 '), '10.1126/stke.2962005re10')
+        self.assertEqual(normalize_doi('doi:10.1000/ABC'), '10.1000/abc')
+        self.assertEqual(normalize_doi(''), None)
+        self.assertEqual(normalize_pmcid('PMC12345'), 12345)
+        self.assertEqual(normalize_pmcid(12345), 12345)
+        self.assertEqual(normalize_pmcid('unknown'), None)
+        self.assertEqual(normalize_pmcid('PMC99999999999999999999999'), None)
+        self.assertEqual(normalize_pmid(' 16091624 '), 16091624)
+        self.assertEqual(normalize_pmid('99999999999999999999999'), None)
+
+    def test_doi_key_set_on_save(self):
+        '''This tests that the doi_key is updated when a publication is saved.'''
+        publication = Publication.objects.get(pk=1)
+        self.assertEqual(publication.doi_key, '10.1126/stke.2962005re10')
+        publication.doi = 'DOI:10.1000/NEW'
+        publication.save()
+        self.assertEqual(Publication.objects.get(pk=1).doi_key, '10.1000/new')
+
+    def test_resolve_identifiers(self):
+        '''This tests that DOI, PMID and PMCID urls redirect to the paper-details page in a single query.'''
+        Publication.objects.filter(pk=1).update(pmcid=1234567)
+        details = '/papers/14-3-3-proteins-a-number-of-functions-for-a-numbered-protein'
+        for path in ('/papers/id/doi/10.1126/STKE.2962005re10', '/papers/id/pmid/16091624/', '/papers/id/pmcid/PMC1234567'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response['Location'].endswith(details))
+            self.assertEqual(len(queries), 1)
+
+    def test_resolve_missing(self):
+        '''This tests that unknown or invalid identifiers return a 404.'''
+        for path in ('/papers/id/doi/10.1000/missing', '/papers/id/pmid/99', '/papers/id/pmid/abc', '/papers/id/pmcid/PMCx',
+                '/papers/id/pmid/99999999999999999999999', '/papers/id/pmcid/PMC99999999999999999999999'):
+            self.assertEqual(self.client.get(path).status_code, 404)
+
+    def test_import_matches_identifiers(self):
+        '''This tests that imported records match existing publications by DOI regardless of case, and by PMCID.'''
+        Publication.objects.filter(pk=2).update(pmcid=7654321)
+        stats = bulk_upsert_publications([
+            {'title': 'Renamed', 'doi': 'https://doi.org/10.1126/STKE.2962005RE10'},
+            {'title': 'Renamed Too', 'pmcid': 'PMC7654321'}])
+        self.assertEqual((stats.created, stats.updated), (0, 2))
+        self.assertEqual(Publication.objects.get(pk=1).title, 'Renamed')
+        self.assertEqual(Publication.objects.get(pk=2).title, 'Renamed Too')
+
 class PublicationViewTests(TestCase):
     '''This class tests the views for :class:`~papers.models.Publication` objects.'''
 
@@ -276,6 +1223,33 @@ class PublicationViewTests(TestCase):
         self.assertEqual(test_response.context['publication_list'][0].pk, 2)
         self.assertEqual(test_response.context['publication_list'][0].title, u"THE RELATION OF ADENOSINE-3', 5'-PHOSPHATE AND PHOSPHORYLASE TO THE ACTIONS OF CATECHOLAMINES AND OTHER HORMONES.")           
 
+    def test_lab_papers_list_query_count(self):
+        """This tests that the number of queries for the laboratory-papers view does not depend on the number of papers."""
+
+        Publication.objects.get(pk=1).authors.add(*AuthorDetails.objects.all())
+        with CaptureQueriesContext(connection) as initial_queries:
+            self.client.get('/papers/')
+        for number in range(5):
+            test_publication = Publication(title='Test Publication %i' % number, laboratory_paper=True, interesting_paper=False, preprint=False)
+            test_publication.save()
+            test_publication.authors.add(*AuthorDetails.objects.all())
+        with CaptureQueriesContext(connection) as final_queries:
+            test_response = self.client.get('/papers/')
+        self.assertEqual(len(test_response.context['publication_list']), 6)
+        self.assertEqual(len(initial_queries), len(final_queries))
+
+    def test_lab_papers_list_query_budget(self):
+        """This tests that the laboratory-papers view raises an error if it exceeds its query budget."""
+
+        with self.settings(ENFORCE_QUERY_BUDGETS=True):
+            self.client.get('/papers/')
+            original_budget = LaboratoryPaperList.query_budget
+            LaboratoryPaperList.query_budget = 0
+            try:
+                self.assertRaises(QueryBudgetExceeded, self.client.get, '/papers/')
+            finally:
+                LaboratoryPaperList.query_budget = original_budget
+
     def test_publication_view_create(self):
         """This tests the paper-new view, ensuring that templates are loaded correctly.  
 
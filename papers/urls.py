@@ -6,6 +6,10 @@ from papers import views
 
 urlpatterns = [
     url(r'^interesting/?$', views.InterestingPaperList.as_view(), name="interesting-papers"), 
+    url(r'^search/?$', views.PaperSearch.as_view(), name="paper-search"),
+    url(r'^export/(?P<scope>laboratory|interesting)\.(?P<format>bib|ris|json)$', views.PublicationExport.as_view(), name="paper-export"),
+    url(r'^export/(?P<scope>person|project)/(?P<slug>[-\w\d]+)\.(?P<format>bib|ris|json)$', views.PublicationExport.as_view(), name="paper-export-detail"),
+    url(r'^id/(?P<scheme>doi|pmid|pmcid)/(?P<value>.+?)/?$', views.PublicationIdentifierRedirect.as_view(), name="paper-identifier"),
     url(r'^new/?$', views.PaperCreate.as_view(), name="paper-new"),
     url(r'^commentaries/?$', views.CommentaryList.as_view(), name='commentary-list'), 
     url(r'^commentary/?$', views.CommentaryList.as_view(), name='commentary-list'),     
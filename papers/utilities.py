@@ -1,49 +1,357 @@
-'''This package contains useful scripts for the papers app which arent views, tests or urls'''
-from mendeley_client import MendeleyClient
+'''This package contains useful scripts for the papers app which arent views, tests or urls
+
+The import pipeline is :func:`~papers.utilities.bulk_upsert_publications`, which matches incoming records against the existing publications by DOI, PMID or Mendeley id.
+New publications and their authors are created in batches, existing publications are only updated if a field has changed, so re-running an import is nearly free.
+'''
+import datetime
+import unicodedata
+from collections import OrderedDict, namedtuple
 
 from django.conf import settings
+from django.db import connection, transaction
+from django.template.defaultfilters import slugify
+
+from papers.models import Publication, AuthorDetails, normalize_doi, normalize_pmid, normalize_pmcid
+from papers.mendeley_sync import KeepAliveMendeleyClient, MendeleySync
+from papers.search import index_publications
+from papers.bylines import update_bylines
+from lab_website.cache import bump_generation
+from personnel.models import Person
+
+#these are the Publication fields which can be set by an imported record
+UPSERT_FIELDS = ('title', 'mendeley_url', 'mendeley_id', 'doi', 'pmid', 'pmcid', 'journal', 'year', 'volume', 'issue', 'pages',
+    'abstract', 'type', 'laboratory_paper', 'interesting_paper', 'preprint', 'publication_date')
+
+#these are used for new publications if the record does not set them
+NEW_PUBLICATION_DEFAULTS = {'laboratory_paper': False, 'interesting_paper': False, 'preprint': False}
+
+#these are the columns inserted for new publications, the dates are set to the day of the import as Publication.save would
+NEW_PUBLICATION_FIELDS = UPSERT_FIELDS + ('title_slug', 'doi_key', 'date_last_modified', 'date_added')
+NEW_PUBLICATION_DATES = frozenset(['publication_date', 'date_last_modified', 'date_added'])
+
+#this keeps IN clauses below the SQLite limit on query parameters
+QUERY_CHUNK_SIZE = 500
 
-from papers.models import Publication
+UpsertStats = namedtuple('UpsertStats', ['created', 'updated', 'unchanged', 'skipped'])
 
 def get_mendeley_authored_documents():
     '''This function gets all of the authored documents in the authorized library.
-    
-    It will return a dictionary named documents with keys documentId and several fields from the Mendeley API.
+
+    It returns a tuple of documents, failures and stats.
+    documents is a dictionary with keys documentId and several fields from the Mendeley API.
+    The details are fetched concurrently over kept-alive connections, see :class:`~papers.mendeley_sync.MendeleySync`.
+    Documents which could not be fetched after retrying are left out of documents and are in failures, a dictionary of the last error keyed by documentId, so callers must check it.
+    stats is the :class:`~papers.mendeley_sync.SyncStats` of the sync.
     '''
-    mendeley = MendeleyClient(settings.MENDELEY_CONSUMER_KEY, settings.MENDELEY_SECRET_KEY)
+    mendeley = KeepAliveMendeleyClient(settings.MENDELEY_CONSUMER_KEY, settings.MENDELEY_SECRET_KEY,
+        getattr(settings, 'MENDELEY_API_OPTIONS', None))
 
     try:
         mendeley.load_keys()
     except IOError:
         mendeley.get_required_keys()
         mendeley.save_keys()
-    authored_document_list = {}
-    response = mendeley.documents_authored() #this get a list of all documents authored by the authorized user
-    for document in response['document_ids']: #this generates a list of all the details for each of these documents
-        details = mendeley.document_details(document)
-        authored_document_list[document] = details
-    return authored_document_list
-    
+    sync = MendeleySync(mendeley)
+    authored_document_list, failures = sync.fetch_authored()
+    return authored_document_list, failures, sync.stats
+
+def chunks(items, size=QUERY_CHUNK_SIZE):
+    '''Yields successive lists of at most size items.'''
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def normalize_name(first_name, last_name):
+    '''Returns a (first_name, last_name) key which ignores case, accents, full stops and extra whitespace.
+
+    This means that "Jose M. Garcia" and "jose m  garcia" resolve to the same person.
+    Accents are only stripped from names which are not ascii, as most names are.
+    '''
+    def normalize(name):
+        name = u'%s' % (name or u'')
+        try:
+            name.encode('ascii')
+        except UnicodeEncodeError:
+            name = unicodedata.normalize('NFKD', name)
+            name = u''.join(character for character in name if not unicodedata.combining(character))
+        return u' '.join(name.replace(u'.', u' ').lower().split())
+    return (normalize(first_name), normalize(last_name))
+
+def insert_rows(model, field_names, rows, return_pks=False):
+    '''Inserts a list of tuples of values for the named fields of a model, and returns their pks in order if return_pks is set.
+
+    This is used for the publications, people and authors of an import, as creating thousands of model instances for bulk_create is slow.
+    The values must already be in their database form, and no signals are sent.
+    Without return_pks the rows are inserted with a single executemany, otherwise each row is inserted on its own and its pk read back with last_insert_id, which only sees this connection's inserts.
+    '''
+    opts = model._meta
+    table = opts.db_table
+    columns = [connection.ops.quote_name(opts.get_field(name).column) for name in field_names]
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (connection.ops.quote_name(table), ', '.join(columns), ', '.join(['%s'] * len(columns)))
+    with connection.cursor() as cursor:
+        if not return_pks:
+            cursor.executemany(sql, rows)
+            return None
+        pk_column = opts.pk.column
+        pks = []
+        for row in rows:
+            cursor.execute(sql, row)
+            pks.append(connection.ops.last_insert_id(cursor, table, pk_column))
+        return pks
+
+def clean_record(record):
+    '''Returns a dictionary of Publication field values from an imported record.
+
+    Unknown keys are dropped, values are converted to the field type and strings are truncated to the field length.
+    The authors are kept as a list of (first_name, last_name) tuples.
+    '''
+    cleaned = {}
+    for name in UPSERT_FIELDS:
+        value = record.get(name)
+        if value in (None, ''):
+            continue
+        field = Publication._meta.get_field(name)
+        if name in ('pmid', 'pmcid'):
+            value = (normalize_pmid if name == 'pmid' else normalize_pmcid)(value)
+            if value is None:
+                continue
+        try:
+            value = field.to_python(value)
+        except Exception:
+            continue
+        if isinstance(value, basestring) and field.max_length:
+            value = value.strip()[:field.max_length]
+        cleaned[name] = value
+    if 'authors' in record:
+        cleaned['authors'] = [(first_name or '', last_name or '') for first_name, last_name in record['authors']]
+    return cleaned
+
+def record_from_mendeley(document):
+    '''Converts the details of a Mendeley document into a record for :func:`~papers.utilities.bulk_upsert_publications`.'''
+    identifiers = document.get('identifiers') or {}
+    return clean_record({
+        'mendeley_url': document.get('mendeley_url'),
+        'title': document.get('title'),
+        'journal': document.get('published_in'),
+        'mendeley_id': document.get('id'),
+        'doi': document.get('doi') or identifiers.get('doi'),
+        'pmid': document.get('pmid') or identifiers.get('pmid'),
+        'year': document.get('year'),
+        'volume': document.get('volume'),
+        'issue': document.get('issue'),
+        'pages': document.get('pages'),
+        'abstract': document.get('abstract'),
+        'type': document.get('type'),
+        'laboratory_paper': True,
+        'authors': [(author.get('forename'), author.get('surname')) for author in document.get('authors', [])],
+    })
+
+class PublicationIndex(object):
+    '''This is an in-memory index of publications by DOI, PMID, PMCID and Mendeley id, loaded with a single query.
+
+    The DOIs are indexed by the stored doi_key, so they match regardless of case or resolver prefix.
+    Each entry is a dictionary of the UPSERT_FIELDS of a publication, with its pk (None until it is created).
+    '''
+
+    def __init__(self):
+        self.doi = {}
+        self.pmid = {}
+        self.pmcid = {}
+        self.mendeley_id = {}
+        self.slugs = set()
+        for values in Publication.objects.values('pk', 'title_slug', 'doi_key', *UPSERT_FIELDS).iterator():
+            self.slugs.add(values.pop('title_slug'))
+            self.add(values)
+
+    def add(self, entry):
+        '''Adds an entry under each of its identifiers.'''
+        if entry.get('doi_key'):
+            self.doi[entry['doi_key']] = entry
+        for identifier in ('pmid', 'pmcid', 'mendeley_id'):
+            if entry.get(identifier):
+                getattr(self, identifier)[entry[identifier]] = entry
+
+    def match(self, record):
+        '''Returns the entry matching a record by DOI, then PMID, then PMCID, then Mendeley id, or None.'''
+        return (self.doi.get(normalize_doi(record.get('doi')))
+            or self.pmid.get(record.get('pmid'))
+            or self.pmcid.get(record.get('pmcid'))
+            or self.mendeley_id.get(record.get('mendeley_id')))
+
+    def unique_slug(self, title):
+        '''Returns a title_slug which is not used by any publication, in the way Publication.save would make it.'''
+        base = slugify(title)[:140] or 'publication'
+        slug = base
+        number = 1
+        while slug in self.slugs:
+            number += 1
+            slug = '%s-%i' % (base, number)
+        self.slugs.add(slug)
+        return slug
+
+def load_people(queryset=None):
+    '''Returns a dictionary of :class:`~personnel.models.Person` pks keyed by normalized name.
+
+    If two people have the same normalized name the first one is used.
+    '''
+    if queryset is None:
+        queryset = Person.objects.order_by('pk')
+    people = {}
+    for pk, first_name, last_name in queryset.values_list('pk', 'first_name', 'last_name').iterator():
+        people.setdefault(normalize_name(first_name, last_name), pk)
+    return people
+
+def resolve_people(names, people=None):
+    '''Returns the people index from :func:`~papers.utilities.load_people`, with any missing people created in one batch.
+
+    An index can be passed to reuse it between batches, it is updated with the new people.
+    The new people are inserted with :func:`~papers.utilities.insert_rows`, with the name_slug which Person.save would give them.
+    '''
+    if people is None:
+        people = load_people()
+    missing = OrderedDict()
+    for first_name, last_name in names:
+        key = normalize_name(first_name, last_name)
+        if key not in people and key not in missing:
+            first_name, last_name = first_name.strip(), last_name.strip()
+            missing[key] = (first_name, last_name, slugify(u'%s %s' % (first_name, last_name)))
+    if missing:
+        today = Person._meta.get_field('created').get_db_prep_save(datetime.date.today(), connection)
+        created_pks = insert_rows(Person, ('first_name', 'last_name', 'name_slug', 'alumni', 'current_lab_member', 'created', 'updated'),
+            [(first_name, last_name, name_slug, False, False, today, today) for first_name, last_name, name_slug in missing.values()], return_pks=True)
+        people.update(zip(missing.keys(), created_pks))
+    return people
+
+def create_author_details(author_lists, people=None):
+    '''Creates the ordered :class:`~papers.models.AuthorDetails` for each publication and links them in bulk.
+
+    author_lists is a dictionary of lists of (first_name, last_name) keyed by publication pk, people is an optional index for :func:`~papers.utilities.resolve_people`.
+    The rows are inserted with :func:`~papers.utilities.insert_rows`, taking the pk of each new row from its own insert, and the links are then inserted in one batch.
+    '''
+    keys = OrderedDict((name, normalize_name(*name)) for publication_id, names in sorted(author_lists.items()) for name in names)
+    people = resolve_people(keys.keys(), people)
+    details = []
+    for publication_id, names in sorted(author_lists.items()):
+        for order, name in enumerate(names, 1):
+            details.append((publication_id, (people[keys[name]], order, False, False)))
+    created_pks = insert_rows(AuthorDetails, ('author', 'order', 'corresponding_author', 'equal_contributors'),
+        [row for publication_id, row in details], return_pks=True)
+    insert_rows(Publication.authors.through, ('publication', 'authordetails'),
+        [(publication_id, pk) for (publication_id, row), pk in zip(details, created_pks)])
+
+def existing_author_names(publication_ids):
+    '''Returns a dictionary of the ordered author names of each publication, keyed by pk.'''
+    names = dict((publication_id, []) for publication_id in publication_ids)
+    for chunk in chunks(publication_ids):
+        rows = Publication.authors.through.objects.filter(publication__in=chunk).order_by(
+            'authordetails__order').values_list('publication_id', 'authordetails__author__first_name', 'authordetails__author__last_name')
+        for publication_id, first_name, last_name in rows:
+            names[publication_id].append(normalize_name(first_name, last_name))
+    return names
+
+@transaction.atomic
+def bulk_upsert_publications(records, index=None, people=None, update_search_index=True, changed=None):
+    '''Creates or updates a :class:`~papers.models.Publication` for each record, returning an UpsertStats of the counts.
+
+    A record is a dictionary of Publication fields, with an optional list of (first_name, last_name) authors.
+    Records are matched to existing publications (or earlier records) by DOI, then PMID, then Mendeley id.
+    Matched publications are only updated if a field in the record has a different value, empty values in a record never overwrite existing data.
+    Authors are replaced only if the names or order have changed, and are resolved to existing :class:`~personnel.models.Person` objects by name.
+    Records without a title which do not match an existing publication are skipped.
+    The whole import is done in one transaction with a fixed number of queries per 500 records, plus one per updated publication.
+    Bulk creation does not send signals, so the bylines are updated here for publications with new authors, and the search index for the changed publications unless update_search_index is False.
+    The cached feeds are invalidated by bumping the Publication generation, see :mod:`lab_website.cache`.
+    When importing in several batches, the same :class:`~papers.utilities.PublicationIndex` and people index (see :func:`~papers.utilities.load_people`) can be passed to each call.
+    If a set is passed as changed, the pks of the created and updated publications are added to it, so they can be indexed once all the batches are imported.
+    '''
+    if index is None:
+        index = PublicationIndex()
+    new_entries = []
+    new_authors = {}
+    updates = {}
+    incoming_authors = {}
+    unchanged = 0
+    skipped = 0
+    for record in records:
+        record = clean_record(record)
+        authors = record.pop('authors', None)
+        entry = index.match(record)
+        if entry is None and not record.get('title'):
+            skipped += 1
+            continue
+        if entry is None:
+            entry = dict(NEW_PUBLICATION_DEFAULTS, pk=None, **record)
+            entry['title_slug'] = index.unique_slug(entry['title'])
+            entry['doi_key'] = normalize_doi(entry.get('doi'))
+            new_entries.append(entry)
+            new_authors[entry['title_slug']] = authors or []
+            index.add(entry)
+            continue
+        changes = dict((name, value) for name, value in record.items() if entry.get(name) != value)
+        if 'doi' in changes:
+            changes['doi_key'] = normalize_doi(changes['doi'])
+        entry.update(changes)
+        if entry['pk'] is None:
+            if authors:
+                new_authors[entry['title_slug']] = authors
+            continue
+        if changes:
+            updates.setdefault(entry['pk'], {}).update(changes)
+        if authors is not None:
+            incoming_authors[entry['pk']] = authors
+        if not changes and authors is None:
+            unchanged += 1
+
+    today = datetime.date.today()
+    date_field = Publication._meta.get_field('publication_date')
+    for entry in new_entries:
+        entry['date_last_modified'] = entry['date_added'] = today
+    insert_rows(Publication, NEW_PUBLICATION_FIELDS, [tuple(date_field.get_db_prep_save(entry.get(name), connection) if name in NEW_PUBLICATION_DATES
+        else entry.get(name) for name in NEW_PUBLICATION_FIELDS) for entry in new_entries])
+    created = {}
+    for chunk in chunks(new_authors.keys()):
+        created.update(Publication.objects.filter(title_slug__in=chunk).values_list('title_slug', 'pk'))
+    for entry in new_entries:
+        entry['pk'] = created[entry.pop('title_slug')]
+        del entry['date_last_modified'], entry['date_added']
+    author_lists = dict((created[slug], authors) for slug, authors in new_authors.items() if authors)
+
+    current_authors = existing_author_names(incoming_authors.keys())
+    replaced = []
+    for publication_id, authors in incoming_authors.items():
+        if [normalize_name(*name) for name in authors] != current_authors[publication_id]:
+            replaced.append(publication_id)
+            author_lists[publication_id] = authors
+        elif publication_id not in updates:
+            unchanged += 1
+    for chunk in chunks(replaced):
+        through = Publication.authors.through.objects.filter(publication__in=chunk)
+        old_details = list(through.values_list('authordetails_id', flat=True))
+        through.delete()
+        AuthorDetails.objects.filter(pk__in=old_details, publication=None).delete()
+
+    for publication_id, changes in updates.items():
+        Publication.objects.filter(pk=publication_id).update(date_last_modified=today, **changes)
+    if author_lists:
+        create_author_details(author_lists, people)
+
+    for chunk in chunks(author_lists.keys()):
+        update_bylines(chunk)
+
+    changed_ids = set(created.values()) | set(updates.keys()) | set(replaced)
+    if changed_ids:
+        bump_generation('papers.Publication')
+    if changed is not None:
+        changed.update(changed_ids)
+    if update_search_index:
+        for chunk in chunks(changed_ids):
+            index_publications(chunk)
+    return UpsertStats(created=len(created), updated=len(set(updates.keys()) | set(replaced)), unchanged=unchanged, skipped=skipped)
+
 def write_mendeley_papers_to_database(documents):
     '''This function will take a document list and update the Publication model in the database.
-    
-    To call this you have to get a document list, for example from get_mendeley_authored_documents() 
-    the output of that function is then passed to this function.'''
-    for key in documents.keys():
-        document_dict = {'mendeley_url' : documents[key]['mendeley_url'],    
-        	'title' : documents[key]['title'], 
-        	'journal' : documents[key]['published_in'], 
-        	'id' : documents[key]['id'],
-        	'doi' : documents[key]['doi'],
-        	'pmid' : documents[key]['pmid'],
-        	'issn' : documents[key]['issn'],  
-        	'year' : documents[key]['year'],
-        	'volume' : documents[key]['volume'],
-            'issue' : documents[key]['issue'], 
-            'pages' : documents[key]['pages'],
-            'abstract' : documents[key]['abstract'],
-            'type' : documents[key]['type']}
-        paper = Publication(document_dict)
-        paper.save()
-        for author in documents[key]['authors']:
-            paper.author_set.add('first_name'=author['forename'], 'last_name'=[author]['surname'])
\ No newline at end of file
+
+    To call this you have to get a document list, for example from get_mendeley_authored_documents()
+    the output of that function is then passed to this function.
+    It returns the counts of created, updated and unchanged publications, see :func:`~papers.utilities.bulk_upsert_publications`.'''
+    return bulk_upsert_publications(record_from_mendeley(document) for document in documents.values())
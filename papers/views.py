@@ -1,27 +1,48 @@
 '''This app contains the views for the :mod`papers` app.
 
-There are three views for this app, :class:`~papers.views.LaboratoryPaperList`, :class:`~papers.views.InterestingPaperList` and :class:`~papers.views.PaperDetailView`
+There are four views for this app, :class:`~papers.views.LaboratoryPaperList`, :class:`~papers.views.InterestingPaperList`, :class:`~papers.views.PaperSearch` and :class:`~papers.views.PaperDetailView`
+Sets of papers can be downloaded with :class:`~papers.views.PublicationExport`.
+A paper can be found by its DOI, PMID or PMCID with :class:`~papers.views.PublicationIdentifierRedirect`.
 
 '''
+import datetime
+import hashlib
+
 from django.views.generic.detail import DetailView
 from django.views.generic.list import ListView
+from django.views.generic.base import TemplateView, View
 from django.template import RequestContext
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.core.urlresolvers import reverse_lazy
+from django.db.models import Count, Max, Q
+from django.db.models.query import prefetch_related_objects
+from django.http import StreamingHttpResponse, Http404
+from django.shortcuts import redirect
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
 
 from braces.views import LoginRequiredMixin, PermissionRequiredMixin
 
-from papers.models import Publication, Commentary
+from papers.models import Publication, Commentary, normalize_doi, normalize_pmid, normalize_pmcid
 from papers.context_processors import api_keys
 from papers.forms import PublicationForm
+from lab_website.mixins import QueryBudgetMixin
+from lab_website.pagination import KeysetPaginationMixin
+from papers.search import search
+from papers.export import EXPORT_FORMATS, export_publications
+from personnel.models import Person
+from projects.models import Project
 
-class LaboratoryPaperList(ListView):
+class LaboratoryPaperList(QueryBudgetMixin, KeysetPaginationMixin, ListView):
     '''This class generates the view for laboratory-papers located at **/papers**.
     
     This is filtered based on whether the :class:`~papers.models.Publication` is marked as laboratory_paper = True.
+    The authors are shown from the stored byline and the commentaries and metrics are prefetched, so the number of queries does not depend on the number of papers.
+    The papers are paginated by publication date, see :class:`~lab_website.pagination.KeysetPaginationMixin`.
     '''
-    queryset = Publication.objects.filter(laboratory_paper=True)
+    queryset = Publication.objects.filter(laboratory_paper=True).for_list()
     template_name = "paper-list.html"
+    query_budget = 8
     
     def get_context_data(self, **kwargs):
         '''This method adds to the context the paper-list-type  = interesting.'''
@@ -29,13 +50,16 @@ class LaboratoryPaperList(ListView):
         context['paper_list_type'] = "laboratory"
         return context           
     
-class InterestingPaperList(ListView):
+class InterestingPaperList(QueryBudgetMixin, KeysetPaginationMixin, ListView):
     '''This class generates the view for interesting-papers located at **/papers/interesting**.
     
     This is filtered based on whether the :class:`~papers.models.Publication` is marked as interesting_paper = True.
+    The authors are shown from the stored byline and the commentaries and metrics are prefetched, so the number of queries does not depend on the number of papers.
+    The papers are paginated by publication date, see :class:`~lab_website.pagination.KeysetPaginationMixin`.
     '''
-    queryset = Publication.objects.filter(interesting_paper=True)
+    queryset = Publication.objects.filter(interesting_paper=True).for_list()
     template_name = "paper-list.html"
+    query_budget = 8
     
     def get_context_data(self, **kwargs):
         '''This method adds to the context the paper-list-type  = interesting.'''
@@ -43,11 +67,106 @@ class InterestingPaperList(ListView):
         context['paper_list_type'] = "interesting"
         return context               
 
+class PaperSearch(TemplateView):
+    '''This class generates the search results for papers located at **/papers/search?q=<query>**.
+
+    The results are ranked by relevance, see :func:`~papers.search.search`.
+    '''
+    template_name = "paper-search.html"
+    result_limit = 20
+
+    def get_context_data(self, **kwargs):
+        '''This method adds the query and the list of results to the context.
+
+        The commentaries and metrics shown with each paper are prefetched, as they are in lists of papers.
+        '''
+        context = super(PaperSearch, self).get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        context['query'] = query
+        context['results'] = search(query, limit=self.result_limit)
+        prefetch_related_objects([result.publication for result in context['results']], ['commentary_set', 'metrics'])
+        return context
+
+class PublicationExport(View):
+    '''This class streams a set of papers as BibTeX, RIS or CSL-JSON, see :mod:`papers.export`.
+
+    The exports are located at **/papers/export/<scope>.<bib|ris|json>** where scope is laboratory or interesting,
+    and at **/papers/export/person/<name_slug>.<format>** or **/papers/export/project/<title_slug>.<format>**.
+    The ETag and Last-Modified headers are based on the number of papers and the latest date_last_modified, so unchanged exports return a 304 response.
+    As date_last_modified is a date, these headers are left out if a paper in the set was changed today.
+    '''
+
+    def get_queryset(self):
+        '''Returns the papers for the scope and slug of this request.'''
+        scope = self.kwargs['scope']
+        if scope == 'laboratory':
+            return Publication.objects.filter(laboratory_paper=True)
+        if scope == 'interesting':
+            return Publication.objects.filter(interesting_paper=True)
+        if scope == 'person':
+            person = get_object_or_404(Person, name_slug=self.kwargs['slug'])
+            return Publication.objects.filter(authors__author=person).distinct()
+        project = get_object_or_404(Project, title_slug=self.kwargs['slug'])
+        return Publication.objects.filter(Q(publications=project) | Q(other_publications=project)).distinct()
+
+    def get_state(self):
+        '''Returns the number of papers and the latest modification date, which are only queried once per request.'''
+        if not hasattr(self, '_state'):
+            self._state = self.get_queryset().aggregate(count=Count('pk', distinct=True), latest=Max('date_last_modified'))
+        return self._state
+
+    def last_modified(self, request, *args, **kwargs):
+        latest = self.get_state()['latest']
+        if latest is None or latest >= datetime.date.today():
+            return None
+        return datetime.datetime.combine(latest, datetime.time.min)
+
+    def etag(self, request, *args, **kwargs):
+        if self.last_modified(request) is None:
+            return None
+        state = self.get_state()
+        return hashlib.md5('%s/%s/%s/%i/%s' % (kwargs['scope'], kwargs.get('slug'), kwargs['format'], state['count'], state['latest'])).hexdigest()
+
+    def dispatch(self, request, *args, **kwargs):
+        '''Checks the request headers against the ETag and Last-Modified of the export before generating it.'''
+        view = condition(etag_func=self.etag, last_modified_func=self.last_modified)(super(PublicationExport, self).dispatch)
+        return view(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        export_format = EXPORT_FORMATS[kwargs['format']]
+        response = StreamingHttpResponse(export_publications(self.get_queryset(), kwargs['format']), content_type=export_format.content_type)
+        filename = '-'.join(part for part in (kwargs['scope'], kwargs.get('slug')) if part)
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (filename, kwargs['format'])
+        return response
+
+class PublicationIdentifierRedirect(View):
+    '''This class redirects from an identifier of a paper to its paper-details page.
+
+    The identifiers are located at **/papers/id/doi/<doi>**, **/papers/id/pmid/<pmid>** and **/papers/id/pmcid/<pmcid>**.
+    The value is normalized the same way as the stored doi_key, pmid and pmcid, so each lookup is a single indexed query.
+    A 404 is returned if no paper has that identifier, or it is not a valid (or is too large a) number for pmid and pmcid.
+    '''
+
+    def get(self, request, scheme, value):
+        if scheme == 'doi':
+            lookup = {'doi_key': normalize_doi(value)}
+        elif scheme == 'pmid':
+            lookup = {'pmid': normalize_pmid(value)}
+        else:
+            lookup = {'pmcid': normalize_pmcid(value)}
+        if None in lookup.values():
+            raise Http404
+        title_slug = Publication.objects.filter(**lookup).values_list('title_slug', flat=True).order_by('pk').first()
+        if title_slug is None:
+            raise Http404
+        return redirect('paper-details', title_slug=title_slug)
+
 class PaperDetailView(DetailView):
     '''This class generates the view for paper-details located at **/papers/<title_slug>**.
     
+    The authors, commentaries and stored metrics are prefetched.
     '''
-    model = Publication
+    queryset = Publication.objects.with_authors()
     slug_field = "title_slug"
     slug_url_kwarg = "title_slug"
     template_name = "paper-detail.html"
@@ -88,8 +207,10 @@ class PaperDelete(PermissionRequiredMixin, DeleteView):
     success_url = reverse_lazy('laboratory-papers')        
                    
     
-class CommentaryList(ListView):
+class CommentaryList(KeysetPaginationMixin, ListView):
     '''This class generates the view for commentaries located at **/papers/commentary**.
+
+    The commentaries are paginated by their creation date.
     '''
     model = Commentary
     template_name = "commentary-list.html"
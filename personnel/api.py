@@ -23,7 +23,7 @@ For a collection of personnel you can request::
     http://yourserver.org/api/v1/personnel/?format=json 
     
 This would return all current lab personnel in the database.  This would return the following json response with two JSON objects, meta and objects.
-The meta object contains fields for the limit, next, offset, previous and total_count for the series of objects requested.  The objects portion is an array of the returned personnel.  Note the id field of a publication.  This is used for retrieving a single person::
+The meta object contains fields for the limit, next and previous for the series of objects requested, where next and previous are the urls of the adjacent pages.  The objects portion is an array of the returned personnel.  Note the id field of a publication.  This is used for retrieving a single person::
 
     http://yourserver.org/api/v1/personnel/?format=json     
     http://yourserver.org/api/v1/publications/set/1;3/?format=json 
@@ -46,14 +46,18 @@ Reference
 Request Parameters
 ``````````````````
 
-The following are the potential request variables.  You must supply a format, but can also filter based on other parameters.  By default 20 items are returned but you can increase this to all by setting limit=0.
+The following are the potential request variables.  You must supply a format, but can also filter based on other parameters.  By default 20 items are returned, and up to 1000 can be requested with limit.  Further pages are requested with the after or before cursors given in the next and previous urls.
 
 +------------------+-----------------------------------------+
 | Parameter        | Potential Values                        |
 +==================+=========================================+
 | format           | **json** or **xml**                     |
 +------------------+-----------------------------------------+
-| limit            | **0** for all, any other number         |
+| limit            | any number up to **1000**               |
++------------------+-----------------------------------------+
+| after            | the cursor from a next url              |
++------------------+-----------------------------------------+
+| before           | the cursor from a previous url          |
 +------------------+-----------------------------------------+
 
 Response Values
@@ -105,14 +109,17 @@ The response (in either json or xml) provides the following fields for each obje
 
 from tastypie.resources import ModelResource
 
+from lab_website.api import CachedResourceMixin, CursorPaginator
 from personnel.models import Person
 
-class PersonnelResource(ModelResource):
+class PersonnelResource(CachedResourceMixin, ModelResource):
     '''This generates the API resource for :class:`~personnel.models.Person` objects.
     
     It returns all current lab personnel in the database.
     Currently this does not integrate any information about their role in the lab.
+    Responses are cached until a person changes, see :class:`~lab_website.api.CachedResourceMixin`.
     '''
+    depends_on = ('personnel.Person',)
     
     class Meta:
         '''The API serves only :class:`~personnel.models.Person` objects in the database, who are identified as current lab members.'''
@@ -120,6 +127,7 @@ class PersonnelResource(ModelResource):
         resource_name = 'personnel'
         list_allowed_methods = ['get']
         detail_allowed_methods = ['get'] 
+        paginator_class = CursorPaginator
         include_absolute_url = True   
         excludes = ['email', 'facebook_user_id', 'google_plus_user_id', 'phone']
                
@@ -14,6 +14,7 @@ class LabPersonnelSitemap(Sitemap):
 
     changefreq = 'yearly'
     priority = '0.5'
+    modified_fields = ('updated',)
     
     def items(self):
         '''Filters Person to show only laboratory papers.'''
@@ -6,16 +6,19 @@ from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
 
 from personnel.models import Person, JobPosting
+from lab_website.pagination import KeysetPaginationMixin
 
     
-class LaboratoryPersonnelList(ListView):
+class LaboratoryPersonnelList(KeysetPaginationMixin, ListView):
     '''This class generates the view for current laboratory personnel located at **/personnel**.
     
     This is filtered based on whether the ::class:`Personnel` object is marked as current_lab_member = True.
+    The personnel are paginated by the date they were added.
     '''
     queryset = Person.objects.filter(current_lab_member=True).order_by('created')
     template_name = "personnel_list.html"
     context_object_name = 'personnel'     
+    paginate_by = 50
     
     def get_context_data(self, **kwargs):
         '''This method adds to the context the personnel-type  = current.'''
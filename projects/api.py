@@ -23,7 +23,7 @@ For a collection of projects you can request::
     http://yourserver.org/api/v1/projects/?format=json 
     
 This would return all projects in the database.  
-The meta object contains fields for the limit, next, offset, previous and total_count for the series of objects requested.  The objects portion is an array of the returned publications.  Note the id field of a publication.  This is used for retrieving a single publication.  Collections can also be filtered based on type or year::
+The meta object contains fields for the limit, next and previous for the series of objects requested, where next and previous are the urls of the adjacent pages.  The objects portion is an array of the returned publications.  Note the id field of a publication.  This is used for retrieving a single publication.  Collections can also be filtered based on type or year::
 
     http://yourserver.org/api/v1/project/?format=json
     http://yourserver.org/api/v1/projects/set/1;3/?format=json 
@@ -46,7 +46,7 @@ Reference
 Request Parameters
 ``````````````````
 
-The following are the potential request variables.  You must supply a format, but can also filter based on other parameters.  By default 20 items are returned but you can increase this to all by setting limit=0.
+The following are the potential request variables.  You must supply a format, but can also filter based on other parameters.  By default 20 items are returned, and up to 1000 can be requested with limit.  Further pages are requested with the after or before cursors given in the next and previous urls.
 
 +------------------+-----------------------------------------+
 | Parameter        | Potential Values                        |
@@ -55,7 +55,11 @@ The following are the potential request variables.  You must supply a format, bu
 +------------------+-----------------------------------------+
 | start_date       | **2012-12-24**                          |
 +------------------+-----------------------------------------+
-| limit            | **0** for all, any other number         |
+| limit            | any number up to **1000**               |
++------------------+-----------------------------------------+
+| after            | the cursor from a next url              |
++------------------+-----------------------------------------+
+| before           | the cursor from a previous url          |
 +------------------+-----------------------------------------+
 
 Response Values
@@ -91,14 +95,17 @@ The response (in either json or xml) provides the following fields for each obje
 
 from tastypie.resources import ModelResource
 
+from lab_website.api import CachedResourceMixin, CursorPaginator
 from projects.models import Project
 
-class ProjectResource(ModelResource):
+class ProjectResource(CachedResourceMixin, ModelResource):
     '''This generates the API resource for :class:`~projects.models.Project` objects.
     
     It returns all projects in the database.
     There are no direct links from this to either Personnel or Publication objects.
+    Responses are cached until a project changes, see :class:`~lab_website.api.CachedResourceMixin`.
     '''
+    depends_on = ('projects.Project',)
     
     class Meta:
         '''The API serves all :class:`~projects.models.Project` objects in the database..'''
@@ -106,6 +113,7 @@ class ProjectResource(ModelResource):
         resource_name = 'projects'
         list_allowed_methods = ['get']
         detail_allowed_methods = ['get'] 
+        paginator_class = CursorPaginator
         include_absolute_url = True
         filtering = {
             "start_date": ('exact', 'contains')
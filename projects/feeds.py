@@ -9,22 +9,25 @@ The available feeds are as follows:
 +--------------------+---------------------------+---------------------------------------------+
 
 A main page describing all feeds is available at **/feeds**.
+The feed answers conditional requests, is cached and contains the latest projects, with older projects in archives at **/feeds/projects/archive/<page>**, see :class:`~lab_website.feeds.ConditionalFeed`.
 '''
 
-from django.contrib.syndication.views import Feed
 from django.conf import settings
 
+from lab_website.feeds import ConditionalFeed
 from projects.models import Project
 
-class ProjectsFeed(Feed):
+class ProjectsFeed(ConditionalFeed):
     '''This is the main class for all feeds related to :class:`~papers.models.Publication`.'''
+
+    depends_on = ('projects.Project',)
+    modified_fields = ('date_last_modified',)
     
     title = "Projects In the %s" % settings.LAB_NAME
     link = "/feeds/projects"
     description = "This feed contains projects being worked on by members of the %s." % settings.LAB_NAME    
-    
-    def items(self):
-        return Project.objects.all()
+    url_name = 'projects-feed'
+    queryset = Project.objects.all()
 
     def item_title(self, item):
         '''The feed item title is the title of the paper.'''
@@ -14,6 +14,7 @@ class ProjectsSitemap(Sitemap):
 
     changefreq = 'monthly'
     priority = '0.7'
+    modified_fields = ('date_last_modified',)
     
     def items(self):
         '''Filters :class:`~papers.models.Publication` to show only laboratory papers.'''
@@ -30,6 +31,7 @@ class FundingSitemap(Sitemap):
 
     changefreq = 'monthly'
     priority = '0.6'
+    modified_fields = ('date_last_modified',)
     
     def items(self):
         '''Filters :class:`~papers.models.Publication` to show only laboratory papers.'''
@@ -19,11 +19,12 @@ from braces.views import LoginRequiredMixin, PermissionRequiredMixin
 
 from projects.models import Project, Funding
 from papers.context_processors import api_keys
+from lab_website.pagination import KeysetPaginationMixin
 
-class ProjectList(ListView):
+class ProjectList(KeysetPaginationMixin, ListView):
     '''This class generates the view for project-list located at **/projects**.
     
-    It includes all projects.
+    It includes all projects, paginated by priority.
     '''
     
     model = Project